@@ -2,6 +2,13 @@
 ASGI config for BugTracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides the Django application it serves the ticket event stream
+(/api/user/project/<id>/events/) and async versions of the hot read endpoints
+(Users/async_api.py). The web process of the Procfile serves it with
+
+    gunicorn -k uvicorn.workers.UvicornWorker BugTracker.asgi
+
+and `uvicorn BugTracker.asgi:application` runs it locally.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -13,4 +20,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BugTracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from Users.async_api import match_route, read_api    # noqa: E402, needs the apps loaded
+from Users.sse import EVENTS_PATH, ticket_events     # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        match = EVENTS_PATH.match(scope['path'])
+        if match:
+            return await ticket_events(scope, receive, send, int(match.group('project_id')))
+        route = match_route(scope)
+        if route and await read_api(scope, receive, send, route):
+            return
+    return await django_application(scope, receive, send)
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
+import dj_database_url
 import django_heroku
 
 
@@ -47,6 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Users.metrics.MetricsMiddleware',
+    'Users.routers.ReplicaMiddleware',
+    'Users.audit.AuditMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -58,9 +63,125 @@ MIDDLEWARE = [
 ]
 
 REST_FRAMEWORK = {
-    'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler'
+    'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'Users.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication'
+    ]
 }
 
+# Per view request metrics, exposed on /metrics to 'Authorization: Bearer <METRICS_TOKEN>'.
+# Without a token /metrics is only served when DEBUG is on
+METRICS_ENABLED = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Log requests slower than this to the 'Users.slow_requests' logger, with their slowest SQL (None disables it)
+SLOW_REQUEST_THRESHOLD_MS = 1000
+SLOW_REQUEST_LOG_QUERIES = 10
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Token authentication cache: a small per process LRU in front of a Django cache. Logging out deletes the token
+# from the cache of the process handling it, other processes keep accepting it until their entries expire:
+# for AUTH_TOKEN_LOCAL_CACHE_TTL seconds if AUTH_TOKEN_CACHE is a shared backend (database, file, memcached,
+# redis...). A process local AUTH_TOKEN_CACHE (locmem, the default) is not shared, its entries are then kept
+# for AUTH_TOKEN_LOCAL_CACHE_TTL seconds at most instead of AUTH_TOKEN_CACHE_TTL.
+AUTH_TOKEN_CACHE = 'default'
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+AUTH_TOKEN_LOCAL_CACHE_TTL = 5
+
+# Ticket list pagination (?cursor=...&page_size=...) and streaming (?stream=true)
+TICKETS_PAGE_SIZE = 100
+TICKETS_MAX_PAGE_SIZE = 1000
+TICKETS_STREAM_CHUNK_SIZE = 500
+
+# Delta sync (/ticket/changes/): `python manage.py prune_ticket_changes` deletes changes older than
+# TICKET_CHANGES_RETENTION_DAYS (None keeps everything). Clients whose cursor is older get a 410 and sync again
+TICKET_CHANGES_RETENTION_DAYS = 30
+
+# Most user ids of one /api/user/lookup?ids=... request
+USERS_LOOKUP_MAX_IDS = 1000
+
+# Ticket search index: 'auto' uses SQLite FTS5 when available, 'terms' always uses the TicketSearchTerm table
+TICKET_SEARCH_BACKEND = 'auto'
+TICKETS_SEARCH_PAGE_SIZE = 20
+
+# Near duplicate tickets: minimum Jaccard similarity of the words (and word pairs) of title + description,
+# and how many LSH candidates are compared at most per lookup
+SIMILAR_TICKETS_THRESHOLD = 0.5
+SIMILAR_TICKETS_MAX_CANDIDATES = 200
+SIMILAR_TICKETS_LIMIT = 5
+
+# Maximum number of creates + updates + deletes in one /ticket/bulk/ request
+TICKETS_BULK_MAX_ITEMS = 10000
+
+# Audit log of ticket and membership writes (see Users/audit.py): `python manage.py compact_audit_log` deletes
+# entries older than AUDIT_LOG_RETENTION_DAYS and merges the consecutive updates of an object by the same
+# user once they are older than AUDIT_LOG_COMPACT_AFTER_DAYS (None keeps everything / never merges)
+AUDIT_LOG_RETENTION_DAYS = 365
+AUDIT_LOG_COMPACT_AFTER_DAYS = 30
+
+# Project archives (export_project/import_project commands, /export/ and /import/ endpoints): rows read per
+# query on export, records written per transaction on import (an interrupted import resumes after the last one)
+PROJECT_ARCHIVE_CHUNK_SIZE = 1000
+
+# Read ticket counts (?count=true&by=...) from the TicketRollup table instead of grouping Tickets
+# (run `python manage.py rebuild_ticket_rollup` after turning this on for an existing database)
+TICKET_ROLLUP_ENABLED = True
+
+# Per process cache of user -> {project: role}, used for all permission checks.
+# Changes made by another process become visible after at most MEMBERSHIP_CACHE_TTL seconds.
+MEMBERSHIP_CACHE_SIZE = 10000
+MEMBERSHIP_CACHE_TTL = 30
+
+# Ticket event stream, served by BugTracker/asgi.py on /api/user/project/<id>/events/ (server-sent events).
+# InMemoryBroker only reaches clients connected to the same process, use DatabaseBroker when running
+# several processes: it goes through the TicketEvent table, polled every TICKET_EVENTS_POLL_INTERVAL seconds.
+TICKET_EVENTS_BROKER = 'Users.events.InMemoryBroker'
+TICKET_EVENTS_QUEUE_SIZE = 1000     # events buffered per client, a client that falls behind is disconnected
+TICKET_EVENTS_MAX_SUBSCRIBERS = 10000
+TICKET_EVENTS_KEEPALIVE = 15
+TICKET_EVENTS_ROLE_CHECK_INTERVAL = 30   # seconds between two checks that a client is still in the project
+TICKET_EVENTS_POLL_INTERVAL = 1
+TICKET_EVENTS_RETENTION = 300
+
+# Public ticket intake (/api/intake/<ticket_form_key>/): token bucket rate limits (requests per second and
+# burst) per form key and per client IP, also applied to anonymous tickets of /api/user/project/<id>/ticket/,
+# and batched writes every INTAKE_FLUSH_INTERVAL_MS or INTAKE_BATCH_SIZE reports. All of it is per process.
+# With INTAKE_BUFFERED = False every report is written by its request. Batches that fail are kept for the next
+# flush, up to INTAKE_MAX_BUFFERED reports (the oldest are dropped).
+# The client IP is read from X-Forwarded-For: INTAKE_TRUSTED_PROXIES is the number of proxies in front of the
+# app that append to it (1 for the Heroku router), 0 uses the address of the connection.
+INTAKE_RATE_PER_FORM_KEY = 20
+INTAKE_BURST_PER_FORM_KEY = 100
+INTAKE_RATE_PER_IP = 0.2
+INTAKE_BURST_PER_IP = 5
+INTAKE_BUFFERED = True
+INTAKE_FLUSH_INTERVAL_MS = 500
+INTAKE_BATCH_SIZE = 500
+INTAKE_MAX_BUFFERED = 10000
+INTAKE_TRUSTED_PROXIES = 1
+INTAKE_FORM_KEY_CACHE_SIZE = 10000
+INTAKE_FORM_KEY_CACHE_TTL = 300
+
+# Background jobs, run by `python manage.py run_jobs` (the worker process of the Procfile).
+# With JOBS_ALWAYS_EAGER jobs run right away in the request that queues them, no worker needed.
+JOBS_ALWAYS_EAGER = False
+JOBS_WORKER_THREADS = 4
+JOBS_RETRY_DELAY = 10   # seconds before the first retry, doubled for every further attempt
+JOBS_TIMEOUT = 300      # a job running for longer is considered lost and run again
+# done and failed jobs are deleted after this many days (None keeps them), by the workers and by
+# `python manage.py prune_jobs`
+JOBS_RETENTION_DAYS = 7
+
+# Serve token authenticated GETs of projects and tickets from Users/async_api.py when running under ASGI
+ASYNC_READ_API_ENABLED = True
+
 ROOT_URLCONF = 'BugTracker.urls'
 
 TEMPLATES = [
@@ -131,4 +252,31 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-django_heroku.settings(locals())
\ No newline at end of file
+django_heroku.settings(locals())
+
+# Database connections are reused for DATABASE_CONN_MAX_AGE seconds ('none' keeps them open forever,
+# 0 closes them at the end of every request). For a pooler such as PgBouncer point DATABASE_URL at it.
+DATABASE_CONN_MAX_AGE = os.environ.get('DATABASE_CONN_MAX_AGE', '600')
+DATABASE_CONN_MAX_AGE = None if DATABASE_CONN_MAX_AGE.lower() == 'none' else int(DATABASE_CONN_MAX_AGE)
+
+# Read replicas, REPLICA_DATABASE_URLS is a comma separated list of database URLs. Locally two SQLite files
+# can stand in for them, the replica being a copy of the primary:
+#   DATABASE_URL=sqlite:////tmp/primary.sqlite3 REPLICA_DATABASE_URLS=sqlite:////tmp/replica.sqlite3
+# The reads of GET requests go to a random replica (Users/routers.py), except for clients that wrote
+# in the last REPLICA_STICKY_SECONDS, so they read their own writes despite the replication lag.
+# REPLICA_STICKY_CACHE has to be shared by the processes (database, memcached, redis...), with a process
+# local cache like the default locmem only anonymous requests read from the replicas.
+# In tests the replicas mirror the primary's test database, they only see the rows that were committed.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('REPLICA_DATABASE_URLS', '').split(','))):
+    DATABASES['replica_%d' % index] = dj_database_url.parse(url.strip())
+    DATABASES['replica_%d' % index]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append('replica_%d' % index)
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        # django_heroku asks for SSL, which SQLite (DATABASE_URL=sqlite:///primary.sqlite3) does not take
+        database.get('OPTIONS', {}).pop('sslmode', None)
+DATABASE_ROUTERS = ['Users.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_CACHE = 'default'
@@ -2,13 +2,34 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import Projects, ProjectUserRelation, Tickets
-from .serializers import UserSerializer, ProjectSerializer, TicketSerializer
+from .models import PRIORITIES, STATUSES, TICKET_TYPES, AuditEntry, Job, Projects, ProjectUserRelation, TicketChange, \
+    Tickets
+from .serializers import UserSerializer, ProjectSerializer, UserProjectSerializer, TicketSerializer, \
+    render_json, serialize_ticket_values, ticket_values, user_summaries, user_values
 from rest_framework.exceptions import APIException, PermissionDenied, NotFound
-from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authentication import BasicAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.models import Token
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from uuid import uuid4
+from .pagination import InvalidCursor, get_page_size, keyset_page, stream_ndjson
+from .authentication import CachedTokenAuthentication
+from .filters import InvalidFilter, ordering_value, split, ticket_filters, ticket_ordering
+from .conditional import bump_project_version, make_etag, not_modified, project_version, set_validators
+from .archive import InvalidArchive, export_project, import_project
+from .audit import audit_values, serialize_audit_entry
+from .bulk import bulk_write_tickets
+from .intake import project_for_form_key, rate_limit, submit_report
+from .jobs import enqueue
+from .membership import get_role
+from .search import search_tickets
+from .similar import similar_tickets
+from .stats import count_tickets, count_project_tickets, open_tickets_count, project_stats, rollup_enabled
+from .sync import changes_cursor, changes_since, cursor_expired, latest_change_id, read_changes_cursor
 
 
 TICKETS_SORTED_BY = {
@@ -21,31 +42,92 @@ TICKETS_SORTED_BY = {
 def validate_ticket(data):
     title = data.get('title', None)
     description = data.get('description', None)
-    priority = {v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data.get('priority', None))
-    status = {v: k for k, v in Tickets.STATUS_CHOICES}.get(data.get('status', None))
-    type = {v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data.get('type', None))
+    priority = PRIORITIES.get(data.get('priority', None))
+    status = STATUSES.get(data.get('status', None))
+    type = TICKET_TYPES.get(data.get('type', None))
 
     if title and description and priority and status and type:
         return True
     return False
 
 
-def user_exists(user_id):
-    try:
-        user = User.objects.get(id=user_id)
-        return True
-    except User.DoesNotExist:
-        return False
+def parse_group_by(value):
+    # ?by=priority,status -> ['priority', 'status'], None if any of them can not be grouped by
+    by = [field.strip() for field in (value or '').split(',') if field.strip()]
+    if not by or any(field not in TICKETS_SORTED_BY for field in by):
+        return None
+    return list(dict.fromkeys(by))
+
+
+# ordering used for cursor pagination of ticket lists
+TICKETS_PAGE_ORDERING = ('CreatedDate', 'id')
+
 
+def assignee_summaries(rows):
+    return user_summaries(sorted({row['users'] for row in rows if row['users'] is not None}))
 
-def isAdmin(user_id, project_id):
-    if user_exists(user_id):
+
+def ticket_list_response(request, tickets, ordering=TICKETS_PAGE_ORDERING):
+    # ?stream=true -> newline delimited json, serialized in chunks
+    # ?cursor=... or ?page_size=... -> one page of tickets and the cursor of the next page
+    # otherwise -> all tickets (old behaviour, in the ?ordering if there is one)
+    # ?include=assignees adds the summaries of the assigned users ('assignees'), read with one query, the
+    # list then comes in 'results'. Streams do not side-load
+    # tickets are read with values() and serialized by the fast path of serializers.py
+    params = request.query_params
+    include = split(params.get('include', ''))
+    if any(name != 'assignees' for name in include):
+        return Response({"msg": "'include' can only be assignees"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if params.get('stream', '').lower() in ('1', 'true'):
+        tickets = ticket_values(tickets.order_by(*ordering))
+        return StreamingHttpResponse(stream_ndjson(tickets, lambda row: serialize_ticket_values([row])[0]),
+                                     content_type='application/x-ndjson')
+
+    if 'cursor' in params or 'page_size' in params:
         try:
-            relation = ProjectUserRelation.objects.get(user_id=user_id, project_id=project_id)
-            return relation.user_role == "Admin"
-        except ProjectUserRelation.DoesNotExist:
-            raise NotFound("Data you are looking is not found !!")
-    raise PermissionDenied("Permission Denied")
+            page, next_cursor = keyset_page(ticket_values(tickets), ordering, params.get('cursor'),
+                                            get_page_size(request), value=ordering_value)
+        except InvalidCursor as e:
+            return Response({"msg": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = {'results': serialize_ticket_values(page), 'next': next_cursor}
+        if include:
+            data['assignees'] = assignee_summaries(page)
+        return json_response(request, data)
+
+    if params.get('ordering'):
+        tickets = tickets.order_by(*ordering)
+    rows = serialize_ticket_values(ticket_values(tickets))
+    if include:
+        return json_response(request, {'results': rows, 'assignees': assignee_summaries(rows)})
+    return json_response(request, rows)
+
+
+def json_response(request, data):
+    # already serialized data is rendered directly, unless the client negotiated another renderer
+    # (the browsable API)
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is not None and renderer.format != 'json':
+        return Response(data, status=status.HTTP_200_OK)
+    return HttpResponse(render_json(data), content_type='application/json', status=status.HTTP_200_OK)
+
+
+def ticket_count_response(by, groups):
+    return Response({
+        'by': by,
+        'total': sum(group['count'] for group in groups),
+        'groups': groups
+    }, status=status.HTTP_200_OK)
+
+
+def isAdmin(user_id, project_id, request=None):
+    # role comes from the cached membership map, so this normally costs no query
+    if user_id is None:
+        raise PermissionDenied("Permission Denied")
+    role = get_role(user_id, project_id, request)
+    if role is None:
+        raise NotFound("Data you are looking is not found !!")
+    return role == "Admin"
 
 
 class SignUP(APIView):
@@ -92,7 +174,7 @@ class Login(APIView):
 
 
 class LogOut(APIView):
-    authentication_classes = [TokenAuthentication, BasicAuthentication]
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -102,26 +184,51 @@ class LogOut(APIView):
 
 # /api/user
 # Only For Website Admin
+# ?stream=true -> newline delimited json, read in chunks
+# ?cursor=... or ?page_size=... -> one page of users by id and the cursor of the next page
+# otherwise -> all users (old behaviour)
 class UsersView(APIView):
     def get(self, request):
-        if request.user.is_superuser:
-            users = User.objects.all()
-            result = []
-            for user in users:
-                result.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'email': user.email
-                })
-            return Response(result, status=status.HTTP_200_OK)
-        return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        if not request.user.is_superuser:
+            return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+        users = user_values(User.objects.order_by('id'))
+        params = request.query_params
+        if params.get('stream', '').lower() in ('1', 'true'):
+            return StreamingHttpResponse(stream_ndjson(users, lambda row: row), content_type='application/x-ndjson')
+        if 'cursor' in params or 'page_size' in params:
+            try:
+                page, next_cursor = keyset_page(users, ('id',), params.get('cursor'), get_page_size(request))
+            except InvalidCursor as e:
+                return Response({"msg": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return json_response(request, {'results': page, 'next': next_cursor})
+        return json_response(request, list(users))
+
+
+# /api/user/lookup?ids=<user_id>,<user_id>,...
+# summaries of several users in one query, e.g. of the assignees of a ticket list, in the order of ids.
+# Unknown ids are left out
+class UserLookupView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            ids = [int(value) for value in split(request.query_params.get('ids', ''))]
+        except ValueError:
+            ids = None
+        if not ids:
+            return Response({"msg": "'ids' should be a comma separated list of user ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.USERS_LOOKUP_MAX_IDS:
+            return Response({"msg": "At most %d ids per request" % settings.USERS_LOOKUP_MAX_IDS},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return json_response(request, {'results': user_summaries(ids)})
 
 
 # /api/user/<user_id>
 class UserView(APIView):
-    authentication_classes = [TokenAuthentication, BasicAuthentication]
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, user_id):
@@ -136,40 +243,34 @@ class UserView(APIView):
 # /api/user/project
 # Returns all projects linked to a user
 class UserProjects(APIView):
-    authentication_classes = [TokenAuthentication, BasicAuthentication]
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user_id = request.user.id
-        try:
-            # find all project with <user_id> in the M-N Relation Table
-            projects = ProjectUserRelation.objects.filter(user_id=user_id)
 
-            result = []
-            for project in projects:
-                # Find all projects with Project Id as found above in variable projects
-                result.append(Projects.objects.get(id=str(project.project_id)))
+        # all projects with <user_id> in the M-N Relation Table, together with the user's role
+        # and the number of open tickets, in a single query
+        projects = Projects.objects.filter(projectuserrelation__user_id=user_id).annotate(
+            user_role=F('projectuserrelation__user_role'),
+            open_tickets=open_tickets_count()
+        ).order_by('id')
 
-            # return all project details linked to this user
-            serializer = ProjectSerializer(result, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Projects.DoesNotExist:
-            return Response({}, status=status.HTTP_204_NO_CONTENT)
-        except ProjectUserRelation.DoesNotExist:
-            return Response({}, status=status.HTTP_204_NO_CONTENT)
+        # return all project details linked to this user
+        serializer = UserProjectSerializer(projects, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
         user_id = request.user.id
         # checking if project data is valid
         serializer = ProjectSerializer(data=request.data)
         if serializer.is_valid():
-            project = Projects.objects.create(name=serializer.data['name'], description=serializer.data['description'],
-                                              ticket_form_key=uuid4().hex[:10])
-            project.project_users.add(request.user)
-            relation = ProjectUserRelation.objects.get(user_id=user_id, project_id=project.id)
-            # change this default Admin value for all users
-            relation.user_role = {v: k for k, v in ProjectUserRelation.ROLE_CHOICES}.get('Admin')
-            relation.save()
+            # the project and the creator's Admin relation in two inserts, in one transaction
+            with transaction.atomic():
+                project = Projects.objects.create(name=serializer.data['name'],
+                                                  description=serializer.data['description'],
+                                                  ticket_form_key=uuid4().hex[:10])
+                ProjectUserRelation.objects.create(user_id_id=user_id, project_id=project, user_role='Admin')
             return Response({
                 'id': project.id,
                 'name': project.name,
@@ -182,27 +283,30 @@ class UserProjects(APIView):
 # /api/user/project/<project_id>
 # get Specific Project with project id
 class UserProjectID(APIView):
-    authentication_classes = [TokenAuthentication, BasicAuthentication]
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, project_id):
         user_id = request.user.id
 
+        # check if this project is assigned to this user or not
+        role = get_role(user_id, project_id, request)
+        if role is None:
+            return Response({}, status=status.HTTP_204_NO_CONTENT)
+
+        version = project_version(project_id)
+        etag = make_etag('project', project_id, version.version, role)
+        response = not_modified(request, etag, version.modified_at)
+        if response is not None:
+            return response
+
         try:
             # find the project with <project_id>
             project = Projects.objects.get(id=project_id)
-
-            # check if this project is assigned to this user or not
-            assigned = ProjectUserRelation.objects.get(user_id=user_id, project_id=project_id)
-            if assigned:
-                serializer = ProjectSerializer(project)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response({}, status=status.HTTP_403_FORBIDDEN)
+            serializer = ProjectSerializer(project)
+            return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, version.modified_at)
         except Projects.DoesNotExist:
             return Response({}, status=status.HTTP_204_NO_CONTENT)
-        except ProjectUserRelation.DoesNotExist:
-            return Response({}, status=status.HTTP_204_NO_CONTENT)
 
     def put(self, request, project_id):
         # Only Admin can Update the Project
@@ -210,7 +314,7 @@ class UserProjectID(APIView):
 
         try:
             project = Projects.objects.get(id=project_id)
-            isadmin = isAdmin(user_id, project_id)
+            isadmin = isAdmin(user_id, project_id, request)
             if isadmin == 403 or isadmin is False:
                 return Response({}, status=status.HTTP_403_FORBIDDEN)
             elif isadmin == 204:
@@ -228,6 +332,7 @@ class UserProjectID(APIView):
             serializer = ProjectSerializer(project, request.data)
             if serializer.is_valid():
                 serializer.save()
+                bump_project_version(project.id)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
         except Projects.DoesNotExist:
@@ -237,7 +342,7 @@ class UserProjectID(APIView):
         user_id = request.user.id
         try:
             project = Projects.objects.get(id=project_id)
-            isadmin = isAdmin(user_id, project_id)
+            isadmin = isAdmin(user_id, project_id, request)
             if isadmin == 403 or isadmin is False:
                 return Response({}, status=status.HTTP_403_FORBIDDEN)
             elif isadmin == 204:
@@ -251,44 +356,68 @@ class UserProjectID(APIView):
 # /api/user/project/<project_id>/ticket
 # 3rd party user/admin can also open a ticket
 class TicketView(APIView):
+    # no permission_classes, anonymous users can open a ticket (see post)
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+
     def get(self, request, project_id):
-        try:
-            token = request.META['HTTP_AUTHORIZATION'].split()[1]
-            user_id = Token.objects.get(key=token).user.id
-
-            # get headers with get request
-
-            count = self.request.query_params.get('count', False)
-            by = self.request.query_params.get('by', None)
-            sorted_by = TICKETS_SORTED_BY.get(by, None)
-
-            # check if user is Admin or Developer
-            admin = ProjectUserRelation.objects.get(user_id=user_id, project_id=project_id)
-            admin = True if admin.user_role == "Admin" else False
-
-            # if admin show all tickets, else show tickets assigned to the developer only
-            if admin:
-                tickets = Tickets.objects.filter(project=project_id)
-                if count is True and sorted_by:
-                    pass
-                serializer = TicketSerializer(tickets, many=True)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                # if developer -> show only those tickets to which developer is assigned
-                # show only those tickets, which are assigned to this developer only for this project
-                tickets = Tickets.objects.filter(user_id=user_id, project_id=project_id)
-                serializer = TicketSerializer(tickets, many=True)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-        except KeyError:
-            return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
-        except Token.DoesNotExist:
+        if not request.user.is_authenticated:
             return Response({"msg": "Please Login/Register"}, status=status.HTTP_403_FORBIDDEN)
-        except User.DoesNotExist:
-            return Response({"msg": "User does not exist"}, status=status.HTTP_403_FORBIDDEN)
-        except ProjectUserRelation.DoesNotExist:
+        user_id = request.user.id
+
+        # get headers with get request
+
+        count = self.request.query_params.get('count', '').lower() in ('1', 'true')
+        by = self.request.query_params.get('by', None)
+        sorted_by = parse_group_by(by)
+        if count and not sorted_by:
+            return Response({"msg": "'by' should be a comma separated list of " + ', '.join(TICKETS_SORTED_BY)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # check if user is Admin or Developer
+        role = get_role(user_id, project_id, request)
+        if role is None:
             return Response({"msg": "No Project Exists"}, status=status.HTTP_204_NO_CONTENT)
-        except Tickets.DoesNotExist:
-            return Response({"msg": "No Ticket Exists"}, status=status.HTTP_204_NO_CONTENT)
+        admin = role == "Admin"
+
+        # nothing in the project changed since the client's copy -> 304 without touching the tickets
+        version = project_version(project_id)
+        etag = make_etag('tickets', project_id, version.version, role, user_id, request.get_full_path())
+        response = not_modified(request, etag, version.modified_at)
+        if response is not None:
+            return response
+        return set_validators(self.list_tickets(request, project_id, user_id, admin, count, sorted_by),
+                              etag, version.modified_at)
+
+    def list_tickets(self, request, project_id, user_id, admin, count, sorted_by):
+        # ?status=, ?priority=, ?type=, ?assignee=, ?created_after=, ... and ?ordering=, see filters.py
+        try:
+            filters = ticket_filters(request.query_params)
+            ordering = ticket_ordering(request.query_params.get('ordering'), TICKETS_PAGE_ORDERING)
+        except InvalidFilter as e:
+            return Response({"msg": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # if admin show all tickets, else show tickets assigned to the developer only
+        if admin:
+            tickets = Tickets.objects.filter(project=project_id)
+            if count:
+                # the rollup only has the counts of unfiltered lists
+                if rollup_enabled() and not filters:
+                    groups = count_project_tickets(project_id, sorted_by)
+                else:
+                    groups = count_tickets(tickets.filter(filters), sorted_by)
+                return ticket_count_response(sorted_by, groups)
+            return ticket_list_response(request, tickets.filter(filters), ordering)
+        else:
+            # if developer -> show only those tickets to which developer is assigned
+            # show only those tickets, which are assigned to this developer only for this project
+            tickets = Tickets.objects.filter(users=user_id, project_id=project_id)
+            if count:
+                if rollup_enabled() and not filters:
+                    groups = count_project_tickets(project_id, sorted_by, user_id=user_id)
+                else:
+                    groups = count_tickets(tickets.filter(filters), sorted_by)
+                return ticket_count_response(sorted_by, groups)
+            return ticket_list_response(request, tickets.filter(filters), ordering)
 
     def post(self, request, project_id):
         # Find the project in which ticket need to be opened
@@ -297,74 +426,76 @@ class TicketView(APIView):
         except Projects.DoesNotExist:
             return Response({}, status=status.HTTP_204_NO_CONTENT)
 
-        try:
-            # if user is Admin then only he can open a Proper Ticket, else others can only write title and description
-            # for the ticket
-            user_id = request.user.id
-            user = User.objects.get(id=user_id)
-
-            # check if user is Admin or Developer
-            admin = ProjectUserRelation.objects.get(user_id=user_id, project_id=project_id)
-            admin = True if admin.user_role == "Admin" else False
-
-            # if user is admin then he can open the proper ticket
-            if admin:
-                data = request.data
-                title = data.get('title', None)
-                description = data.get('description', None)
-                priority = {v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data.get('priority', None))
-                status_ = {v: k for k, v in Tickets.STATUS_CHOICES}.get(data.get('status', None))
-                type = {v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data.get('type', None))
-                developer_to_be_assigned_id = data.get('users', None)
-                print("Admin creating ticket")
-                ticket = Tickets.objects.create(
-                    title=title,
-                    description=description,
-                    priority=priority,
-                    status=status_,
-                    type=type,
-                    project=project,
-                    users=developer_to_be_assigned_id
-                )
-                serializer = TicketSerializer(ticket)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-                # check if all fields except developer assignment are NOT NULL
-                # if validate_ticket(data):
-                #     # now check if we need to assign user to ticket or not
-                #     developer_to_be_assigned_id = data.get('users', None)
-                #     if developer_to_be_assigned_id:
-                #         # assign developer
-                #         try:
-                #             user = User.objects.get(id=developer_to_be_assigned_id)
-                #             ticket = Tickets.objects.create(
-                #                 title=data['title'],
-                #                 description=data['description'],
-                #                 priority={v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data['priority']),
-                #                 status={v: k for k, v in Tickets.STATUS_CHOICES}.get(data['status']),
-                #                 type={v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data['type']),
-                #                 project=project,
-                #                 users=user
-                #             )
-                #             serializer = TicketSerializer(ticket)
-                #             return Response(serializer.data, status=status.HTTP_201_CREATED)
-                #         except User.DoesNotExist:
-                #             return Response({}, status=status.HTTP_204_NO_CONTENT)
-                #     else:
-                #         ticket = Tickets.objects.create(
-                #             title=data['title'],
-                #             description=data['description'],
-                #             priority={v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data['priority']),
-                #             status={v: k for k, v in Tickets.STATUS_CHOICES}.get(data['status']),
-                #             type={v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data['type']),
-                #             project=project
-                #         )
-                #         serializer = TicketSerializer(ticket)
-                #         return Response(serializer.data, status=status.HTTP_201_CREATED)
-                # else:
-                #     return Response({}, status=status.HTTP_206_PARTIAL_CONTENT)
+        # if user is Admin then only he can open a Proper Ticket, else others can only write title and description
+        # for the ticket
+        user_id = request.user.id
 
-        except User.DoesNotExist:
-            pass
+        # check if user is Admin or Developer (anonymous users have no role)
+        admin = get_role(user_id, project_id, request) == "Admin"
+
+        # if user is admin then he can open the proper ticket
+        if admin:
+            data = request.data
+            title = data.get('title', None)
+            description = data.get('description', None)
+            priority = PRIORITIES.get(data.get('priority', None))
+            status_ = STATUSES.get(data.get('status', None))
+            type = TICKET_TYPES.get(data.get('type', None))
+            developer_to_be_assigned_id = data.get('users', None)
+            ticket = Tickets.objects.create(
+                title=title,
+                description=description,
+                priority=priority,
+                status=status_,
+                type=type,
+                project=project,
+                users_id=developer_to_be_assigned_id or None
+            )
+            data = TicketSerializer(ticket).data
+            # likely duplicates, for the admin to merge or close the new ticket
+            data['similar'] = [{'id': ticket_id, 'title': title, 'similarity': similarity}
+                               for ticket_id, title, similarity in similar_ticket_titles(ticket)]
+            return Response(data, status=status.HTTP_201_CREATED)
+            # check if all fields except developer assignment are NOT NULL
+            # if validate_ticket(data):
+            #     # now check if we need to assign user to ticket or not
+            #     developer_to_be_assigned_id = data.get('users', None)
+            #     if developer_to_be_assigned_id:
+            #         # assign developer
+            #         try:
+            #             user = User.objects.get(id=developer_to_be_assigned_id)
+            #             ticket = Tickets.objects.create(
+            #                 title=data['title'],
+            #                 description=data['description'],
+            #                 priority={v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data['priority']),
+            #                 status={v: k for k, v in Tickets.STATUS_CHOICES}.get(data['status']),
+            #                 type={v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data['type']),
+            #                 project=project,
+            #                 users=user
+            #             )
+            #             serializer = TicketSerializer(ticket)
+            #             return Response(serializer.data, status=status.HTTP_201_CREATED)
+            #         except User.DoesNotExist:
+            #             return Response({}, status=status.HTTP_204_NO_CONTENT)
+            #     else:
+            #         ticket = Tickets.objects.create(
+            #             title=data['title'],
+            #             description=data['description'],
+            #             priority={v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data['priority']),
+            #             status={v: k for k, v in Tickets.STATUS_CHOICES}.get(data['status']),
+            #             type={v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data['type']),
+            #             project=project
+            #         )
+            #         serializer = TicketSerializer(ticket)
+            #         return Response(serializer.data, status=status.HTTP_201_CREATED)
+            # else:
+            #     return Response({}, status=status.HTTP_206_PARTIAL_CONTENT)
+
+        # anonymous tickets share the limits of the project's public intake
+        if not request.user.is_authenticated:
+            wait = rate_limit(project.ticket_form_key or project.id, request)
+            if wait:
+                return too_many_reports(wait)
         data = request.data
         title = data.get('title', None)
         description = data.get('description', None)
@@ -379,35 +510,117 @@ class TicketView(APIView):
         return Response({"msg": "Ticket Title is required"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def too_many_reports(wait):
+    response = Response({"msg": "Too many reports, try again later"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(int(wait) + 1)
+    return response
+
+
+# /api/user/project/<project_id>/stats
+# ticket counts for dashboards (see stats.project_stats), read from the rollup table.
+# Developers only get the counts of the tickets assigned to them
+class ProjectStatsView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id):
+        user_id = request.user.id
+        admin = isAdmin(user_id, project_id, request)
+
+        version = project_version(project_id)
+        etag = make_etag('stats', project_id, version.version, admin, user_id)
+        response = not_modified(request, etag, version.modified_at)
+        if response is not None:
+            return response
+        stats = project_stats(project_id, user_id=None if admin else user_id)
+        return set_validators(Response(stats, status=status.HTTP_200_OK), etag, version.modified_at)
+
+
+# /api/user/project/<project_id>/export
+# the project, its members and its tickets as a gzip compressed archive (see archive.py), streamed. Admin only
+class ProjectExportView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id):
+        if not isAdmin(request.user.id, project_id, request):
+            return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        response = StreamingHttpResponse(export_project(project_id), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="project-%s.ndjson.gz"' % project_id
+        return response
+
+
+# /api/user/project/import
+# multipart upload of an archive in 'archive', imported as a new project of which the user is an Admin.
+# An import that failed half way is continued by uploading the same archive with 'resume' = its import id.
+# With 'members' = true (superusers only) the members of the archive are added to the project too
+class ProjectImportView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        archive = request.FILES.get('archive')
+        if archive is None:
+            return Response({"msg": "Upload the archive as 'archive'"}, status=status.HTTP_400_BAD_REQUEST)
+        resume = request.data.get('resume')
+        if resume is not None and not str(resume).isdigit():
+            return Response({"msg": "'resume' should be an import id"}, status=status.HTTP_400_BAD_REQUEST)
+        # members are matched to any user here by email and keep their role, Admin included
+        members = str(request.data.get('members', '')).lower() in ('1', 'true')
+        if members and not request.user.is_superuser:
+            return Response({"msg": "Only superusers can import the members of an archive"},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            checkpoint = import_project(archive, user_id=request.user.id, resume=resume and int(resume),
+                                        members=members)
+        except InvalidArchive as e:
+            return Response({"msg": str(e), "import": e.checkpoint.id if e.checkpoint else None},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'import': checkpoint.id,
+            'project': checkpoint.project_id,
+            'members': checkpoint.members,
+            'tickets': checkpoint.tickets
+        }, status=status.HTTP_201_CREATED)
+
+
 # /api/user/project/<project_id>/ticket/<ticket_id>
 class ListTicketView(APIView):
-    authentication_classes = [TokenAuthentication, BasicAuthentication]
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, project_id, ticket_id):
         user_id = request.user.id
 
+        # check if user is admin or not.
+        # If Admin -> can see ticket
+        # If not admin -< then can see ticket only if assigned to the ticket
+        isadmin = isAdmin(user_id, project_id, request)
+
+        # nothing in the project changed since the client's copy -> 304 without loading the ticket
+        version = project_version(project_id)
+        etag = make_etag('ticket', project_id, ticket_id, version.version, isadmin, user_id)
+        response = not_modified(request, etag, version.modified_at)
+        if response is not None:
+            return response
+
         try:
             # check if ticket exists for this project_id
             ticket = Tickets.objects.get(id=ticket_id, project_id=project_id)
 
             # since ticket exists, now check if user has permission to view the ticket
-
-            # check if user is admin or not.
-            # If Admin -> can see ticket
-            # If not admin -< then can see ticket only if assigned to the ticket
-
-            isadmin = isAdmin(user_id, project_id)
             if not isadmin:
                 # so user is developer, so check if ticket is assigned to this developer or not
-                if ticket.user.id == user_id:
+                if ticket.users_id == user_id:
                     serializer = TicketSerializer(ticket)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
+                    return set_validators(Response(serializer.data, status=status.HTTP_200_OK),
+                                          etag, version.modified_at)
                 else:
                     return Response({}, status=status.HTTP_403_FORBIDDEN)
             else:
                 serializer = TicketSerializer(ticket)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, version.modified_at)
         except Tickets.DoesNotExist:
             return Response({}, status=status.HTTP_204_NO_CONTENT)
 
@@ -421,7 +634,7 @@ class ListTicketView(APIView):
             return Response({"msg": "Project Does Not Exist"}, status=status.HTTP_204_NO_CONTENT)
 
         # check if admin or not
-        isadmin = isAdmin(user_id, project_id)
+        isadmin = isAdmin(user_id, project_id, request)
         if not isadmin:
             return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
         else:
@@ -445,51 +658,41 @@ class ListTicketView(APIView):
                 data = request.data
                 ticket.title = data.get('title', None)
                 ticket.description = data.get('description', None)
-                ticket.priority = {v: k for k, v in Tickets.PRIORITY_CHOICES}.get(data.get('priority', None))
-                ticket.status = {v: k for k, v in Tickets.STATUS_CHOICES}.get(data.get('status', None))
-                ticket.type = {v: k for k, v in Tickets.TICKET_TYPE_CHOICES}.get(data.get('type', None))
+                ticket.priority = PRIORITIES.get(data.get('priority', None))
+                ticket.status = STATUSES.get(data.get('status', None))
+                ticket.type = TICKET_TYPES.get(data.get('type', None))
 
                 # This part could be complicated,
                 # Suppose Assigned Developer needs to be changed
                 new_assigned_developer_object = None
-                try:
-                    # developer to be assigned
-                    developer_to_be_assigned = data.get('users', None)
-
-                    # checking if there was any other developer assigned to the ticket already
-                    # If assigned, then removing the Project-User Relation from the UserProject Table
-                    old_developer = ticket.users
-                    if old_developer:
-                        # first check count of tickets of old_developer in this project
-                        # if count of tickets of old_developer >= 2
-                            # don't delete the Project-User Relation
-                        # elif count of ticktes of old_developer == 1
-                            # delete the Project-User Relation if the User is not Admin
-
-                        count = Tickets.objects.filter(users=old_developer.id).count()
-                        if count == 1:
-                            # remove relation of this old developer
-                            try:
-                                relation = ProjectUserRelation.objects.get(user_id=old_developer.id, project_id=project_id)
-                                if relation.user_role != "Admin":
-                                    relation.delete()
-                            except ProjectUserRelation.DoesNotExist:
-                                pass
-
-                    # now checking if developer_to_be_assigned is a valid User
-                    if developer_to_be_assigned:
-                        new_assigned_developer_object = User.objects.get(id=developer_to_be_assigned)
-
-                        # create a relation for the user and project as Developer
-                        relation, created = ProjectUserRelation.objects.get_or_create(user_id=new_assigned_developer_object,
-                                                                                      project_id=project)
-                        if relation.user_role != "Admin":
-                            relation.user_role = {v: k for k, v in ProjectUserRelation.ROLE_CHOICES}.get("Developer")
-                            relation.save()
-                except User.DoesNotExist:
-                    return Response({"error": "User Does not Exist"}, status=status.HTTP_400_BAD_REQUEST)
-                ticket.users = new_assigned_developer_object
-                ticket.save()
+                old_developer_id = ticket.users_id
+                # the membership, the ticket and their audit entries are written together or not at all
+                with transaction.atomic():
+                    try:
+                        # developer to be assigned
+                        developer_to_be_assigned = data.get('users', None)
+
+                        # now checking if developer_to_be_assigned is a valid User
+                        if developer_to_be_assigned:
+                            new_assigned_developer_object = User.objects.get(id=developer_to_be_assigned)
+
+                            # create a relation for the user and project as Developer
+                            relation, created = ProjectUserRelation.objects.get_or_create(
+                                user_id=new_assigned_developer_object, project_id=project,
+                                defaults={'user_role': 'Developer'})
+                            if relation.user_role != "Admin":
+                                relation.user_role = {v: k for k, v in ProjectUserRelation.ROLE_CHOICES}.get(
+                                    "Developer")
+                                relation.save()
+                    except User.DoesNotExist:
+                        return Response({"error": "User Does not Exist"}, status=status.HTTP_400_BAD_REQUEST)
+                    ticket.users = new_assigned_developer_object
+                    ticket.save()
+
+                    # If another developer was assigned before, the Project-User Relation of that developer is
+                    # removed (unless Admin) once he has no ticket left in this project, in the background
+                    if old_developer_id and old_developer_id != ticket.users_id:
+                        enqueue('release_developers', project.id, [old_developer_id], user_id=user_id)
                 response = {
                     'id': ticket.id,
                     'title': ticket.title,
@@ -508,7 +711,7 @@ class ListTicketView(APIView):
         user_id = request.user.id
 
         # check if user is admin
-        if isAdmin(user_id, project_id):
+        if isAdmin(user_id, project_id, request):
             try:
                 ticket = Tickets.objects.get(id=ticket_id)
                 ticket.delete()
@@ -516,3 +719,251 @@ class ListTicketView(APIView):
             except Tickets.DoesNotExist:
                 return Response({"msg": "Ticket Does Not Exist"}, status=status.HTTP_204_NO_CONTENT)
         return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+
+# /api/user/project/<project_id>/ticket/bulk
+# create, update and delete many tickets in one transaction, only Admin can do this
+class BulkTicketView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, project_id):
+        user_id = request.user.id
+
+        try:
+            project = Projects.objects.get(id=project_id)
+        except Projects.DoesNotExist:
+            return Response({"msg": "Project Does Not Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not isAdmin(user_id, project_id, request):
+            return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+
+        # expects json: {"create": [{ticket}, ...], "update": [{"id": .., changed fields}, ...], "delete": [id, ...]}
+        data = request.data
+        creates = data.get('create', [])
+        updates = data.get('update', [])
+        deletes = data.get('delete', [])
+        atomic = data.get('atomic', True) not in (False, 'false', '0')
+        if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+            return Response({"msg": "create, update and delete should be lists"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(creates) + len(updates) + len(deletes) > settings.TICKETS_BULK_MAX_ITEMS:
+            return Response({"msg": "At most %d items per request" % settings.TICKETS_BULK_MAX_ITEMS},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        ok, results = bulk_write_tickets(project, creates, updates, deletes, atomic=atomic, user_id=user_id)
+        return Response(results, status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST)
+
+
+# /api/user/project/<project_id>/ticket/search?q=<words>&page=<n>&page_size=<n>
+# Admin searches all tickets of the project, Developer only the tickets assigned to him
+class TicketSearchView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id):
+        user_id = request.user.id
+        admin = isAdmin(user_id, project_id, request)
+
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"msg": "Search query (q) is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+        except ValueError:
+            page = 1
+        page_size = get_page_size(request, default=settings.TICKETS_SEARCH_PAGE_SIZE)
+
+        # one extra hit to know if there is a next page
+        hits = search_tickets(project_id, query, user_id=None if admin else user_id,
+                              offset=(page - 1) * page_size, limit=page_size + 1)
+        next_page = page + 1 if len(hits) > page_size else None
+        hits = hits[:page_size]
+
+        tickets = Tickets.objects.in_bulk([ticket_id for ticket_id, score, snippet in hits])
+        results = []
+        for ticket_id, score, snippet in hits:
+            if ticket_id in tickets:
+                results.append({
+                    'ticket': TicketSerializer(tickets[ticket_id]).data,
+                    'score': score,
+                    'snippet': snippet
+                })
+        return Response({'results': results, 'page': page, 'next_page': next_page}, status=status.HTTP_200_OK)
+
+
+def similar_ticket_titles(ticket, user_id=None, limit=None):
+    # (id, title, similarity) of the likely duplicates of ticket
+    hits = similar_tickets(ticket.project_id, ticket.title, ticket.description, exclude=ticket.id, user_id=user_id,
+                           limit=limit or settings.SIMILAR_TICKETS_LIMIT)
+    titles = dict(Tickets.objects.filter(id__in=[ticket_id for ticket_id, _ in hits]).values_list('id', 'title'))
+    return [(ticket_id, titles[ticket_id], similarity) for ticket_id, similarity in hits if ticket_id in titles]
+
+
+# /api/user/project/<project_id>/ticket/<ticket_id>/similar?page_size=<n>
+# likely duplicates of a ticket, most similar first. Developers can only use it on the tickets
+# assigned to them, and only get their own tickets back
+class SimilarTicketsView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id, ticket_id):
+        user_id = request.user.id
+        admin = isAdmin(user_id, project_id, request)
+        try:
+            ticket = Tickets.objects.only('id', 'title', 'description', 'project_id', 'users_id') \
+                .get(id=ticket_id, project_id=project_id)
+        except Tickets.DoesNotExist:
+            return Response({"msg": "Ticket Does Not Exist"}, status=status.HTTP_404_NOT_FOUND)
+        if not admin and ticket.users_id != user_id:
+            return Response({}, status=status.HTTP_403_FORBIDDEN)
+
+        hits = similar_tickets(int(project_id), ticket.title, ticket.description, exclude=ticket.id,
+                               user_id=None if admin else user_id,
+                               limit=get_page_size(request, default=settings.SIMILAR_TICKETS_LIMIT))
+        tickets = Tickets.objects.in_bulk([ticket_id for ticket_id, similarity in hits])
+        results = [{'ticket': TicketSerializer(tickets[ticket_id]).data, 'similarity': similarity}
+                   for ticket_id, similarity in hits if ticket_id in tickets]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+# /api/user/project/<project_id>/ticket/changes?cursor=<cursor>&page_size=<n>
+# Without a cursor pages through every ticket visible to the user (has_more until the last page), then the
+# cursor only returns the tickets created, updated or deleted since. Developers only see tickets assigned
+# to them, a ticket of theirs reassigned to someone else is reported as deleted. A cursor older than
+# TICKET_CHANGES_RETENTION_DAYS gets a 410, the client then syncs again without a cursor.
+class TicketChangesView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id):
+        user_id = request.user.id
+        admin = isAdmin(user_id, project_id, request)
+        tickets = Tickets.objects.filter(project=project_id)
+        if not admin:
+            tickets = tickets.filter(users=user_id)
+        limit = get_page_size(request, default=settings.TICKETS_PAGE_SIZE)
+
+        cursor = request.query_params.get('cursor')
+        if not cursor:
+            # the change cursor is read first, so changes made while paging the tickets are sent again next time
+            since = timezone.now()
+            return self.snapshot_page(request, tickets, latest_change_id(project_id), since, 0, limit)
+        try:
+            after_id, since, after_ticket_id = read_changes_cursor(cursor)
+        except InvalidCursor:
+            return Response({"msg": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        if cursor_expired(since):
+            return Response({"msg": "Cursor expired, sync again without a cursor"}, status=status.HTTP_410_GONE)
+        if after_ticket_id is not None:
+            return self.snapshot_page(request, tickets, after_id, since, after_ticket_id, limit)
+
+        latest, previous_users, last_id, since, has_more = changes_since(project_id, after_id, limit)
+        changed = serialize_ticket_values(ticket_values(tickets.filter(
+            id__in=[ticket_id for ticket_id, action in latest.items() if action != TicketChange.DELETED]
+        ).order_by('id')))
+        visible = {ticket['id'] for ticket in changed}
+        # a developer is only told about the tickets that were assigned to him before
+        deleted = sorted(ticket_id for ticket_id in latest if ticket_id not in visible and
+                         (admin or user_id in previous_users[ticket_id]))
+        return json_response(request, {'changed': changed, 'deleted': deleted,
+                                       'cursor': changes_cursor(last_id, since), 'has_more': has_more})
+
+    def snapshot_page(self, request, tickets, last_id, since, after_ticket_id, limit):
+        # tickets by id after after_ticket_id; the last page hands over to the change cursor
+        rows = list(ticket_values(tickets.filter(id__gt=after_ticket_id).order_by('id'))[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = changes_cursor(last_id, since, rows[-1]['id'] if has_more else None)
+        return json_response(request, {'changed': serialize_ticket_values(rows), 'deleted': [], 'cursor': cursor,
+                                       'has_more': has_more})
+
+
+def audit_page_response(request, entries):
+    # newest entries first, ?cursor= is the next page
+    try:
+        page, next_cursor = keyset_page(audit_values(entries), ('-id',), request.query_params.get('cursor'),
+                                        get_page_size(request))
+    except InvalidCursor as e:
+        return Response({"msg": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': [serialize_audit_entry(row) for row in page], 'next': next_cursor},
+                    status=status.HTTP_200_OK)
+
+
+# /api/user/project/<project_id>/ticket/<ticket_id>/history?cursor=<cursor>&page_size=<n>
+# who changed what on a ticket (see audit.py), newest first. Developers can only read the history of
+# the tickets assigned to them, Admins also the history of deleted tickets
+class TicketHistoryView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id, ticket_id):
+        user_id = request.user.id
+        if not isAdmin(user_id, project_id, request) and \
+                not Tickets.objects.filter(id=ticket_id, project_id=project_id, users=user_id).exists():
+            return Response({}, status=status.HTTP_403_FORBIDDEN)
+        return audit_page_response(request, AuditEntry.objects.filter(
+            project_id=project_id, target=AuditEntry.TICKET, object_id=ticket_id))
+
+
+# /api/user/project/<project_id>/activity?cursor=<cursor>&page_size=<n>
+# every ticket and membership change of the project, newest first, Admin only
+class ProjectActivityView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, project_id):
+        if not isAdmin(request.user.id, project_id, request):
+            return Response({"msg": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        return audit_page_response(request, AuditEntry.objects.filter(project_id=project_id))
+
+
+# /api/jobs/<job_id>
+# status of a background job, visible to the user who queued it
+class JobView(APIView):
+    authentication_classes = [CachedTokenAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = Job.objects.get(id=job_id)
+        except Job.DoesNotExist:
+            return Response({"msg": "Job Does Not Exist"}, status=status.HTTP_404_NOT_FOUND)
+        if job.user_id != request.user.id and not request.user.is_superuser:
+            return Response({"msg": "Job Does Not Exist"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'id': job.id,
+            'name': job.name,
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': job.max_attempts,
+            'last_error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+            'result': job.result,
+            'created_at': job.created_at,
+            'updated_at': job.updated_at
+        }, status=status.HTTP_200_OK)
+
+
+# /api/intake/<ticket_form_key>
+# public error reports of the reportError form: no authentication, rate limited, written in batches
+class TicketIntakeView(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    def post(self, request, ticket_form_key):
+        project_id = project_for_form_key(ticket_form_key)
+        if project_id is None:
+            return Response({"msg": "Project Does Not Exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        wait = rate_limit(ticket_form_key, request)
+        if wait:
+            return too_many_reports(wait)
+
+        data = request.data
+        # hidden field of the form, only bots fill it in; they are told the report was accepted
+        if data.get('website'):
+            return Response({"msg": "Thank You for reporting the Error"}, status=status.HTTP_202_ACCEPTED)
+        title = (data.get('title') or '').strip()
+        if not title:
+            return Response({"msg": "Ticket Title is required"}, status=status.HTTP_400_BAD_REQUEST)
+        submit_report(project_id, title, data.get('description'))
+        return Response({"msg": "Thank You for reporting the Error"}, status=status.HTTP_202_ACCEPTED)
@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class UsersConfig(AppConfig):
     name = 'Users'
+
+    def ready(self):
+        # connect signal handlers
+        from . import signals  # noqa: F401
+        # register the background jobs
+        from . import tasks  # noqa: F401
+        # replica reads need a sticky cache shared by the processes
+        from .routers import check_sticky_cache
+        checks.register(check_sticky_cache)
@@ -0,0 +1,254 @@
+import gzip
+import io
+import json
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.encoders import JSONEncoder
+
+from .audit import member_changes, record_audit, ticket_changes
+from .bulk import apply_rollup_deltas, clean_ticket, insert_tickets
+from .conditional import bump_project_version
+from .jobs import enqueue
+from .membership import invalidate_memberships
+from .models import AuditEntry, ProjectImport, Projects, ProjectUserRelation, TicketChange, Tickets
+from .stats import rollup_key
+from .sync import record_changes
+
+# Project archives: gzip compressed newline delimited json. The first line is a header with the project,
+# then one line per membership ({"record": "member", ...}) and one per ticket ({"record": "ticket", ...}).
+# Both directions stream, chunk by chunk, so memory does not grow with the size of the project.
+# Choice fields are written as their labels and users as their email, so an archive can be imported
+# into another deployment: ids are remapped on import.
+
+ARCHIVE_FORMAT = 'bugtracker-project'
+ARCHIVE_VERSION = 1
+TICKET_FIELDS = ('id', 'title', 'description', 'priority', 'status', 'type', 'users', 'CreatedDate', 'updated_at',
+                 'content_hash', 'occurrences')
+ROLES = dict(ProjectUserRelation.ROLE_CHOICES)
+MAX_OCCURRENCES = 2 ** 31 - 1
+
+
+class InvalidArchive(ValueError):
+    def __init__(self, message, checkpoint=None):
+        super().__init__(message)
+        self.checkpoint = checkpoint    # ProjectImport of a partly written import, it can be resumed
+
+
+# Export
+
+def export_project(project_id, chunk_size=None):
+    # yields the compressed archive of the project, reading chunk_size rows at a time
+    chunk_size = chunk_size or settings.PROJECT_ARCHIVE_CHUNK_SIZE
+    project = Projects.objects.values('id', 'name', 'description', 'ticket_form_key').get(id=project_id)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)     # 31: gzip container
+
+    def compress(records):
+        data = ''.join(json.dumps(record, cls=JSONEncoder) + '\n' for record in records)
+        return compressor.compress(data.encode('utf-8'))
+
+    yield compress([{'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION, 'export_id': uuid4().hex,
+                     'exported_at': timezone.now(), 'project': project}])
+
+    members = ProjectUserRelation.objects.filter(project_id=project_id).order_by('id') \
+        .values_list('user_id', 'user_id__email', 'user_role')
+    yield compress({'record': 'member', 'user': user_id, 'email': email, 'role': role}
+                   for user_id, email, role in members.iterator(chunk_size=chunk_size))
+
+    tickets = Tickets.objects.filter(project_id=project_id).order_by('id').values_list(*TICKET_FIELDS)
+    chunk = []
+    for row in tickets.iterator(chunk_size=chunk_size):
+        chunk.append(dict(zip(TICKET_FIELDS, row), record='ticket'))
+        if len(chunk) >= chunk_size:
+            data = compress(chunk)
+            chunk = []
+            if data:
+                yield data
+    yield compress(chunk) + compressor.flush()
+
+
+# Import
+
+def read_records(fileobj):
+    # yields the records of an archive, one line at a time
+    try:
+        with io.TextIOWrapper(gzip.GzipFile(fileobj=fileobj, mode='rb'), encoding='utf-8') as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+    except (OSError, EOFError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise InvalidArchive('Not a readable project archive: %s' % e)
+
+
+@contextmanager
+def rejected_records():
+    # values of the archive the database does not take (too long, out of range, ...), once the
+    # transaction writing them is rolled back
+    try:
+        yield
+    except (DataError, IntegrityError) as e:
+        raise InvalidArchive('Invalid record in the archive: %s' % e)
+
+
+def start_import(header, user_id, members):
+    project = header.get('project')
+    if not isinstance(project, dict) or not isinstance(header.get('export_id'), str) or \
+            not all(isinstance(project.get(field) or '', str) for field in ('name', 'description', 'ticket_form_key')):
+        raise InvalidArchive('Invalid archive header')
+    with rejected_records(), transaction.atomic():
+        # the form key moves with the project, unless a project here already uses it
+        form_key = project.get('ticket_form_key')
+        if not form_key or Projects.objects.filter(ticket_form_key=form_key).exists():
+            form_key = uuid4().hex[:10]
+        new = Projects.objects.create(name=project.get('name') or '', description=project.get('description') or '',
+                                      ticket_form_key=form_key)
+        if user_id is not None:
+            ProjectUserRelation.objects.create(user_id_id=user_id, project_id=new, user_role='Admin')
+        return ProjectImport.objects.create(export_id=header['export_id'][:32], project=new, user_id=user_id,
+                                            with_members=members)
+
+
+def import_members(checkpoint, records):
+    # members are matched to the users here by email, members without a user here are skipped
+    for record in records:
+        if not isinstance(record.get('role'), str) or record['role'] not in ROLES or \
+                not isinstance(record.get('email') or '', str):
+            raise InvalidArchive('Invalid member %s' % record.get('user'))
+    emails = {record.get('email') for record in records if record.get('email')}
+    users = {}
+    for user_id, email in User.objects.filter(email__in=emails).order_by('-id').values_list('id', 'email'):
+        users[email] = user_id      # the oldest user of an email wins
+    existing = set(ProjectUserRelation.objects.filter(project_id=checkpoint.project_id)
+                   .values_list('user_id', flat=True))
+
+    new = []
+    for record in records:
+        user_id = users.get(record.get('email'))
+        if user_id is None:
+            continue
+        checkpoint.user_map[str(record.get('user'))] = user_id
+        if user_id not in existing:
+            existing.add(user_id)
+            new.append(ProjectUserRelation(user_id_id=user_id, project_id_id=checkpoint.project_id,
+                                           user_role=record['role']))
+    ProjectUserRelation.objects.bulk_create(new)
+    record_audit(checkpoint.project_id, AuditEntry.MEMBER, AuditEntry.CREATED,
+                 [(relation.user_id_id, member_changes(None, relation.user_role)) for relation in new],
+                 checkpoint.user_id)
+    invalidate_memberships(*[relation.user_id_id for relation in new])
+    checkpoint.members += len(new)
+
+
+def archived_date(value):
+    try:
+        return parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+
+def import_tickets(checkpoint, records):
+    # tickets assigned to a user that was not matched are imported unassigned
+    tickets, dates = [], []
+    for record in records:
+        values, errors = clean_ticket(dict(record, users=checkpoint.user_map.get(str(record.get('users')))))
+        if errors:
+            raise InvalidArchive('Invalid ticket %s: %s' % (record.get('id'), errors))
+        content_hash, occurrences = record.get('content_hash'), record.get('occurrences')
+        if not isinstance(content_hash, str) or len(content_hash) > Tickets._meta.get_field('content_hash').max_length:
+            content_hash = None
+        if not isinstance(occurrences, int) or isinstance(occurrences, bool) or \
+                not 0 < occurrences <= MAX_OCCURRENCES:
+            occurrences = 1
+        tickets.append(Tickets(project_id=checkpoint.project_id, content_hash=content_hash, occurrences=occurrences,
+                               **values))
+        dates.append((archived_date(record.get('CreatedDate')), archived_date(record.get('updated_at'))))
+
+    insert_tickets(tickets)
+    # bulk_create sets auto_now(_add) dates to now, bulk_update keeps the dates of the archive
+    for ticket, (created, updated) in zip(tickets, dates):
+        ticket.CreatedDate = created or ticket.CreatedDate
+        ticket.updated_at = updated or ticket.updated_at
+    Tickets.objects.bulk_update([ticket for ticket in tickets if ticket.id], ['CreatedDate', 'updated_at'],
+                                batch_size=500)
+
+    # bulk inserts do not send signals, the side effects of ticket_saved are applied here
+    ticket_ids = [ticket.id for ticket in tickets if ticket.id]
+    apply_rollup_deltas(checkpoint.project_id, Counter(rollup_key(ticket.__dict__) for ticket in tickets))
+    record_changes(checkpoint.project_id, ticket_ids, TicketChange.CREATED)
+    record_audit(checkpoint.project_id, AuditEntry.TICKET, AuditEntry.CREATED,
+                 [(ticket.id, ticket_changes({}, ticket.__dict__)) for ticket in tickets if ticket.id],
+                 checkpoint.user_id)
+    enqueue('index_tickets', ticket_ids)
+    checkpoint.tickets += len(tickets)
+
+
+def write_chunk(checkpoint, records, done=False):
+    with rejected_records(), transaction.atomic():
+        members = [record for record in records if record.get('record') == 'member']
+        tickets = [record for record in records if record.get('record') == 'ticket']
+        if len(members) + len(tickets) != len(records):
+            raise InvalidArchive('Unknown record in the archive')
+        if members and checkpoint.with_members:
+            import_members(checkpoint, members)
+        if tickets:
+            import_tickets(checkpoint, tickets)
+        checkpoint.records += len(records)
+        checkpoint.done = done
+        checkpoint.save()
+        bump_project_version(checkpoint.project_id)
+
+
+def import_project(fileobj, user_id=None, resume=None, chunk_size=None, members=False):
+    """
+    Imports an archive of export_project() as a new project and returns its ProjectImport.
+    The archive is read as a stream and written chunk_size records per transaction. user_id becomes an
+    Admin of the project. The members of the archive are only imported with members=True: any user here
+    with their email joins the project with their role, Admin included, so only for trusted callers.
+    Without them tickets are imported unassigned.
+    With resume=<ProjectImport id>, an interrupted import of the same archive (started by the same user_id)
+    continues after its last written chunk, with or without members as it started. Raises InvalidArchive.
+    """
+    chunk_size = chunk_size or settings.PROJECT_ARCHIVE_CHUNK_SIZE
+    records = read_records(fileobj)
+    header = next(records, None)
+    if not isinstance(header, dict) or header.get('format') != ARCHIVE_FORMAT:
+        raise InvalidArchive('Not a project archive')
+    if header.get('version') != ARCHIVE_VERSION:
+        raise InvalidArchive('Unsupported archive version %s' % header.get('version'))
+
+    if resume is not None:
+        checkpoints = ProjectImport.objects.filter(id=resume, export_id=header.get('export_id'), project__isnull=False)
+        if user_id is not None:
+            checkpoints = checkpoints.filter(user_id=user_id)
+        checkpoint = checkpoints.first()
+        if checkpoint is None:
+            raise InvalidArchive('No import of this archive to resume')
+    else:
+        checkpoint = start_import(header, user_id, members)
+    if checkpoint.done:
+        return checkpoint
+
+    try:
+        chunk = []
+        for position, record in enumerate(records):
+            if position < checkpoint.records:
+                continue
+            if not isinstance(record, dict):
+                raise InvalidArchive('Invalid record in the archive')
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                write_chunk(checkpoint, chunk)
+                chunk = []
+        write_chunk(checkpoint, chunk, done=True)
+    except InvalidArchive as e:
+        # the chunks written so far stay, the import can be resumed from the database's checkpoint
+        checkpoint.refresh_from_db()
+        raise InvalidArchive(str(e), checkpoint)
+    return checkpoint
@@ -0,0 +1,197 @@
+import asyncio
+import io
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .api import TICKETS_SORTED_BY, TicketView, parse_group_by
+from .authentication import CachedTokenAuthentication
+from .conditional import make_etag, not_modified, project_version, set_validators
+from .membership import get_role
+from .metrics import registry
+from .models import Projects, Tickets
+from .routers import client_key, reads_from_replica, use_replica
+from .serializers import ProjectSerializer, TicketSerializer, UserProjectSerializer
+from .stats import open_tickets_count
+
+# Async versions of the read endpoints, served by BugTracker/asgi.py in front of Django.
+# Only token authenticated GET requests for JSON are handled here, anything else (other methods,
+# basic/session auth, ?stream=true, the browsable API) falls through to the DRF views.
+
+
+def run(func, *args):
+    # ORM calls leave the event loop for the thread pool, each thread with its own connection
+    def call():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+def authenticate(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(authorization) != 2 or authorization[0].lower() != 'token':
+        return None
+    user, _ = CachedTokenAuthentication().authenticate_credentials(authorization[1])
+    return user
+
+
+# Handlers, each returns a DRF Response or an HttpResponse
+
+async def user_projects(request, user):
+    # same as UserProjects.get
+    def load():
+        projects = Projects.objects.filter(projectuserrelation__user_id=user.id).annotate(
+            user_role=F('projectuserrelation__user_role'),
+            open_tickets=open_tickets_count()
+        ).order_by('id')
+        return UserProjectSerializer(projects, many=True).data
+    return Response(await run(load), status=status.HTTP_200_OK)
+
+
+async def project_detail(request, user, project_id):
+    # same as UserProjectID.get, role, version and project are fetched concurrently
+    def load_project():
+        project = Projects.objects.filter(id=project_id).first()
+        return ProjectSerializer(project).data if project is not None else None
+
+    role, version, project = await asyncio.gather(
+        run(get_role, user.id, project_id), run(project_version, project_id), run(load_project))
+    if role is None or project is None:
+        return Response({}, status=status.HTTP_204_NO_CONTENT)
+
+    etag = make_etag('project', project_id, version.version, role)
+    response = not_modified(request, etag, version.modified_at)
+    if response is not None:
+        return response
+    return set_validators(Response(project, status=status.HTTP_200_OK), etag, version.modified_at)
+
+
+async def project_tickets(request, user, project_id):
+    # same as TicketView.get; role and version are fetched concurrently, the tickets once they are known
+    count = request.query_params.get('count', '').lower() in ('1', 'true')
+    sorted_by = parse_group_by(request.query_params.get('by', None))
+    if count and not sorted_by:
+        return Response({"msg": "'by' should be a comma separated list of " + ', '.join(TICKETS_SORTED_BY)},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    role, version = await asyncio.gather(run(get_role, user.id, project_id), run(project_version, project_id))
+    if role is None:
+        return Response({"msg": "No Project Exists"}, status=status.HTTP_204_NO_CONTENT)
+
+    etag = make_etag('tickets', project_id, version.version, role, user.id, request.get_full_path())
+    response = not_modified(request, etag, version.modified_at)
+    if response is not None:
+        return response
+
+    tickets = await run(TicketView().list_tickets, request, project_id, user.id, role == 'Admin', count, sorted_by)
+    return set_validators(tickets, etag, version.modified_at)
+
+
+async def project_ticket(request, user, project_id, ticket_id):
+    # same as ListTicketView.get, role, version and ticket are fetched concurrently
+    def load_ticket():
+        ticket = Tickets.objects.filter(id=ticket_id, project_id=project_id).first()
+        return (ticket.users_id, TicketSerializer(ticket).data) if ticket is not None else None
+
+    role, version, ticket = await asyncio.gather(
+        run(get_role, user.id, project_id), run(project_version, project_id), run(load_ticket))
+    if role is None:
+        return Response({'detail': 'Data you are looking is not found !!'}, status=status.HTTP_404_NOT_FOUND)
+    admin = role == 'Admin'
+
+    etag = make_etag('ticket', project_id, ticket_id, version.version, admin, user.id)
+    response = not_modified(request, etag, version.modified_at)
+    if response is not None:
+        return response
+    if ticket is None:
+        return Response({}, status=status.HTTP_204_NO_CONTENT)
+    if not admin and ticket[0] != user.id:
+        return Response({}, status=status.HTTP_403_FORBIDDEN)
+    return set_validators(Response(ticket[1], status=status.HTTP_200_OK), etag, version.modified_at)
+
+
+# (path, handler, view label used by the request metrics)
+ROUTES = [
+    (re.compile(r'^/api/user/project$'), user_projects, 'UserProjects'),
+    (re.compile(r'^/api/user/project/(?P<project_id>\d+)/$'), project_detail, 'UserProjectID'),
+    (re.compile(r'^/api/user/project/(?P<project_id>\d+)/ticket/$'), project_tickets, 'TicketView'),
+    (re.compile(r'^/api/user/project/(?P<project_id>\d+)/ticket/(?P<ticket_id>\d+)/$'), project_ticket,
+     'ListTicketView'),
+]
+
+
+def match_route(scope):
+    if not settings.ASYNC_READ_API_ENABLED or scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+        return None
+    for pattern, handler, label in ROUTES:
+        match = pattern.match(scope['path'])
+        if match:
+            return handler, label, {name: int(value) for name, value in match.groupdict().items()}
+    return None
+
+
+def cors_headers(request):
+    if settings.CORS_ORIGIN_ALLOW_ALL and 'HTTP_ORIGIN' in request.META:
+        return [(b'access-control-allow-origin', b'*')]
+    return []
+
+
+def render(response):
+    if isinstance(response, Response):
+        body = JSONRenderer().render(response.data)
+        response['Content-Type'] = 'application/json'
+    else:
+        body = response.content
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.items()]
+    return response.status_code, headers, body
+
+
+async def read_api(scope, receive, send, route):
+    """
+    Serves a request matched by match_route(). Returns False without sending anything when the request
+    should be handled by Django instead.
+    """
+    handler, label, kwargs = route
+    request = Request(ASGIRequest(scope, io.BytesIO()))
+    if 'text/html' in request.META.get('HTTP_ACCEPT', '') or 'stream' in request.query_params:
+        return False
+
+    start = time.perf_counter()
+    # the reads go to a replica unless the client wrote recently, like ReplicaMiddleware does for Django
+    key = client_key(request.META.get('HTTP_AUTHORIZATION'), None)
+    try:
+        user, replica = await asyncio.gather(run(authenticate, request), run(use_replica, scope['method'], key))
+        if user is None:
+            return False
+        token = reads_from_replica.set(replica)
+        try:
+            response = await handler(request, user, **kwargs)
+        finally:
+            reads_from_replica.reset(token)
+    except AuthenticationFailed as e:
+        response = Response({'detail': e.detail}, status=status.HTTP_401_UNAUTHORIZED,
+                            headers={'WWW-Authenticate': 'Token'})
+
+    status_code, headers, body = render(response)
+    await send({'type': 'http.response.start', 'status': status_code, 'headers': headers + cors_headers(request)})
+    await send({'type': 'http.response.body', 'body': body if scope['method'] != 'HEAD' else b''})
+
+    if settings.METRICS_ENABLED:
+        labels = (('view', label), ('method', scope['method']))
+        registry.increment('bugtracker_requests_total', labels + (('status', status_code),))
+        registry.observe('bugtracker_request_duration_seconds', labels, time.perf_counter() - start)
+        registry.observe('bugtracker_response_size_bytes', labels, len(body))
+    return True
@@ -0,0 +1,176 @@
+import contextvars
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AuditEntry
+from .pagination import keyset_filter
+
+# Audit log of ticket and membership writes. Every write adds one AuditEntry, in the transaction of the
+# write, holding only the fields it changed as {field: [old, new]} (creates are [None, new] of the fields
+# that are set, deletes [old, None]). The signal handlers (signals.py) log single writes, the bulk paths
+# that bypass the signals (bulk.py, intake.py, archive.py) log their batches themselves.
+# The actor is the authenticated user of the request (AuditMiddleware), or the user a job runs for.
+
+# Tickets field -> its name in the log, the name of the API
+TICKET_FIELDS = {'title': 'title', 'description': 'description', 'priority': 'priority', 'status': 'status',
+                 'type': 'type', 'users_id': 'users', 'project_id': 'project'}
+# order of the compaction scan, one object's entries after the other
+COMPACTION_ORDERING = ('project_id', 'target', 'object_id', 'id')
+
+current_request = contextvars.ContextVar('audit_request', default=None)
+current_user_id = contextvars.ContextVar('audit_user_id', default=None)
+
+
+class AuditMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # DRF authenticates in the view and sets request.user then, the actor is read when an entry is written
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+
+@contextmanager
+def acting_as(user_id):
+    # writes outside of requests (jobs, commands) are logged as made by user_id
+    token = current_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        current_user_id.reset(token)
+
+
+def current_actor():
+    user_id = current_user_id.get()
+    if user_id is not None:
+        return user_id
+    user = getattr(current_request.get(), 'user', None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
+def ticket_changes(old, new):
+    # old is {} for a create, new is {} for a delete; fields that were not loaded are not compared
+    changes = {name: [old.get(field), new.get(field)] for field, name in TICKET_FIELDS.items()
+               if (field in old or not old) and old.get(field) != new.get(field)}
+    if not old or not new:
+        changes.pop('project', None)    # the project of the entry
+    return changes
+
+
+def member_changes(old_role, new_role):
+    return {'role': [old_role, new_role]} if old_role != new_role else {}
+
+
+def record_audit(project_id, target, action, changes, actor_id=None):
+    """
+    Logs one entry per (object id, changes) pair of changes, made by actor_id (the current actor by default).
+    Updates that changed nothing are not logged.
+    """
+    actor_id = current_actor() if actor_id is None else actor_id
+    AuditEntry.objects.bulk_create([
+        AuditEntry(project_id=project_id, target=target, object_id=object_id, action=action, actor_id=actor_id,
+                   changes=fields)
+        for object_id, fields in changes if fields or action != AuditEntry.UPDATED
+    ], batch_size=1000)
+
+
+def audit_values(entries):
+    return entries.values('id', 'target', 'object_id', 'action', 'actor_id', 'changes', 'created_at')
+
+
+def serialize_audit_entry(row):
+    return {
+        'id': row['id'],
+        'target': row['target'],
+        'object': row['object_id'],
+        'action': row['action'],
+        'actor': row['actor_id'],
+        'changes': row['changes'],
+        'created_at': row['created_at']
+    }
+
+
+# Retention and compaction
+
+def merge_changes(entries):
+    # the first old and the last new value of every field, fields back to their old value are dropped
+    merged = {}
+    for entry in entries:
+        for field, (old, new) in entry.changes.items():
+            merged[field] = [merged[field][0] if field in merged else old, new]
+    return {field: values for field, values in merged.items() if values[0] != values[1]}
+
+
+def same_run(previous, entry):
+    return entry.action == AuditEntry.UPDATED and \
+        (previous.project_id, previous.target, previous.object_id, previous.actor_id) == \
+        (entry.project_id, entry.target, entry.object_id, entry.actor_id)
+
+
+def close_run(run, merged, deleted):
+    # a run of updates becomes its last entry, with the merged changes (or nothing if they cancel out)
+    if len(run) > 1:
+        run[-1].changes = merge_changes(run)
+        (merged if run[-1].changes else deleted).append(run[-1])
+        deleted.extend(run[:-1])
+
+
+def compact_updates(before, batch_size):
+    # runs of consecutive updates of an object by the same actor, logged before `before`, are merged.
+    # Returns the number of entries removed
+    entries = AuditEntry.objects.filter(created_at__lt=before).order_by(*COMPACTION_ORDERING)
+    removed, run, last = 0, [], None
+    while True:
+        page = list((entries.filter(keyset_filter(COMPACTION_ORDERING, last)) if last else entries)[:batch_size])
+        merged, deleted = [], []
+        for entry in page:
+            if run and not same_run(run[-1], entry):
+                close_run(run, merged, deleted)
+                run = []
+            if entry.action == AuditEntry.UPDATED:
+                run.append(entry)
+        if len(page) < batch_size:
+            close_run(run, merged, deleted)
+        # a run still open at the end of the page continues on the next one
+        with transaction.atomic():
+            AuditEntry.objects.bulk_update(merged, ['changes'])
+            AuditEntry.objects.filter(id__in=[entry.id for entry in deleted]).delete()
+        removed += len(deleted)
+        if len(page) < batch_size:
+            return removed
+        last = [getattr(page[-1], field) for field in COMPACTION_ORDERING]
+
+
+def delete_entries(entries, batch_size):
+    deleted = 0
+    while True:
+        ids = list(entries.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += AuditEntry.objects.filter(id__in=ids).delete()[0]
+
+
+def compact_audit_log(retention_days=None, compact_after_days=None, batch_size=1000):
+    """
+    Deletes the entries older than retention_days, then merges the consecutive updates of an object by the
+    same actor older than compact_after_days into one entry. None uses the AUDIT_LOG_* settings, and a
+    setting of None keeps everything. Returns (deleted, merged away) entry counts.
+    """
+    retention_days = settings.AUDIT_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    compact_after_days = settings.AUDIT_LOG_COMPACT_AFTER_DAYS if compact_after_days is None else compact_after_days
+    now = timezone.now()
+    deleted = merged = 0
+    if retention_days is not None:
+        deleted = delete_entries(AuditEntry.objects.filter(created_at__lt=now - timedelta(days=retention_days)),
+                                 batch_size)
+    if compact_after_days is not None:
+        merged = compact_updates(now - timedelta(days=compact_after_days), batch_size)
+    return deleted, merged
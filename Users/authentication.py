@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import LRUCache, is_shared_cache
+
+# fields of the user kept in the cache, everything else is loaded lazily if a view needs it
+USER_SNAPSHOT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff',
+                        'is_superuser')
+
+# token key -> user snapshot, in front of the shared cache (settings.AUTH_TOKEN_CACHE)
+local_tokens = LRUCache(maxsize=settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, ttl=settings.AUTH_TOKEN_LOCAL_CACHE_TTL)
+
+
+def shared_cache():
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def shared_cache_ttl():
+    # a process local AUTH_TOKEN_CACHE can not be invalidated from the process that deletes a token (logout),
+    # so its entries are kept no longer than the local ones
+    if is_shared_cache(settings.AUTH_TOKEN_CACHE):
+        return settings.AUTH_TOKEN_CACHE_TTL
+    return min(settings.AUTH_TOKEN_CACHE_TTL, settings.AUTH_TOKEN_LOCAL_CACHE_TTL)
+
+
+def cache_key(key):
+    return 'auth-token:' + key
+
+
+def user_snapshot(user):
+    return {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+
+
+def snapshot_user(snapshot):
+    # a User with only the snapshot fields loaded, saving it only writes those fields back
+    # (from_db expects the values in the model's field order)
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in snapshot]
+    return User.from_db('default', fields, [snapshot[field] for field in fields])
+
+
+def invalidate_token(key):
+    local_tokens.delete(key)
+    shared_cache().delete(cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that caches token key -> user, so authenticating a request
+    normally does not query the database.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = local_tokens.get(key)
+        if snapshot is None:
+            snapshot = shared_cache().get(cache_key(key))
+            if snapshot is None:
+                try:
+                    # from the primary: a token created a moment ago may not be on the replicas yet
+                    token = Token.objects.using(DEFAULT_DB_ALIAS).select_related('user').get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed('Invalid token.')
+                snapshot = user_snapshot(token.user)
+                shared_cache().set(cache_key(key), snapshot, shared_cache_ttl())
+            local_tokens.set(key, snapshot)
+
+        user = snapshot_user(snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        token = Token(key=key, user=user)
+        token._state.adding = False
+        return user, token
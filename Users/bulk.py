@@ -0,0 +1,252 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .audit import member_changes, record_audit, ticket_changes
+from .conditional import bump_project_version
+from .events import publish_ticket_events, ticket_event
+from .membership import invalidate_memberships
+from .jobs import enqueue
+from .models import PRIORITIES, STATUSES, TICKET_TYPES, AuditEntry, ProjectUserRelation, TicketChange, Tickets
+from .stats import apply_rollup_delta, assigned_users, rollup_key
+from .sync import record_changes
+
+CHOICE_VALUES = {'priority': PRIORITIES, 'status': STATUSES, 'type': TICKET_TYPES}
+EDITABLE_FIELDS = ('title', 'description', 'priority', 'status', 'type', 'users')
+BATCH_SIZE = 500
+
+
+def max_length(field):
+    return Tickets._meta.get_field(field).max_length
+
+
+def clean_ticket(item, partial=False):
+    # returns (values, errors) for one create/update item, values use model attnames
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ['Expected an object']}
+
+    values, errors = {}, {}
+    for field in EDITABLE_FIELDS:
+        if field not in item:
+            continue
+        value = item[field]
+        if field in CHOICE_VALUES:
+            if value in (None, ''):
+                values[field] = None
+            elif isinstance(value, str) and value in CHOICE_VALUES[field]:
+                values[field] = CHOICE_VALUES[field][value]
+            else:
+                errors[field] = ['"%s" is not a valid choice' % value]
+        elif field == 'users':
+            if value in (None, ''):
+                values['users_id'] = None
+            else:
+                try:
+                    values['users_id'] = int(value)
+                except (TypeError, ValueError):
+                    errors[field] = ['Expected a user id']
+        else:
+            if value is not None and not isinstance(value, str):
+                errors[field] = ['Expected a string']
+            elif value and len(value) > max_length(field):
+                errors[field] = ['Ensure this field has no more than %d characters' % max_length(field)]
+            else:
+                values[field] = value
+
+    if not partial and not item.get('title'):
+        errors['title'] = ['This field is required']
+    if partial and 'title' in values and not values['title']:
+        errors['title'] = ['This field may not be blank']
+    return values, errors
+
+
+def insert_tickets(tickets):
+    # bulk_create, making sure the created tickets get their ids
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Tickets.objects.bulk_create(tickets, batch_size=BATCH_SIZE)
+
+    # sqlite does not return ids from a bulk insert. Its inserts take the database's write lock until the
+    # transaction ends, so no other connection can insert after them: the tickets are the last len(tickets) rows
+    with transaction.atomic():
+        Tickets.objects.bulk_create(tickets, batch_size=BATCH_SIZE)
+        ids = sorted(Tickets.objects.order_by('-id').values_list('id', flat=True)[:len(tickets)])
+    if len(ids) != len(tickets):
+        raise DatabaseError('Inserted %d tickets but found %d new ids' % (len(tickets), len(ids)))
+    for ticket, id in zip(tickets, ids):
+        ticket.id = id
+    return tickets
+
+
+def assign_developers(project, user_ids, actor_id=None):
+    # same as ListTicketView.put: assigned users become Developers of the project unless already members
+    existing = set(ProjectUserRelation.objects.filter(project_id=project, user_id__in=user_ids)
+                   .values_list('user_id', flat=True))
+    new = [user_id for user_id in user_ids if user_id not in existing]
+    ProjectUserRelation.objects.bulk_create([
+        ProjectUserRelation(user_id_id=user_id, project_id=project, user_role='Developer') for user_id in new
+    ])
+    record_audit(project.id, AuditEntry.MEMBER, AuditEntry.CREATED,
+                 [(user_id, member_changes(None, 'Developer')) for user_id in new], actor_id)
+    invalidate_memberships(*new)
+
+
+def release_developers(project, user_ids):
+    # developers who no longer have a ticket in the project are removed from it
+    still_assigned = assigned_users(project, user_ids)
+    released = [user_id for user_id in user_ids if user_id not in still_assigned]
+    ProjectUserRelation.objects.filter(project_id=project, user_id__in=released) \
+        .exclude(user_role='Admin').delete()
+
+
+def apply_rollup_deltas(project_id, deltas):
+    for key, delta in deltas.items():
+        apply_rollup_delta(project_id, key, delta)
+
+
+def ticket_events(to_create, to_update, previous_users):
+    events = [ticket_event('created', ticket) for index, ticket in to_create if ticket.id]
+    for ticket, values in to_update:
+        previous = previous_users[ticket.id]
+        events.append(ticket_event('updated', ticket, previous_users=previous))
+        if previous != ticket.users_id:
+            events.append(ticket_event('assigned', ticket, previous_users=previous))
+    return events
+
+
+def is_ticket_id(value):
+    # ids come from JSON: lists and objects are not hashable, true and false are ints in Python
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def bulk_write_tickets(project, creates, updates, deletes, atomic=True, user_id=None):
+    """
+    Validates and writes a batch of ticket creates, updates (each with an 'id') and deletes (ids)
+    in a single transaction.
+    Returns (ok, results) where results has one entry per item of each list. With atomic=True nothing is
+    written if any item is invalid, otherwise invalid items are skipped.
+    results['jobs'] has the ids of the background jobs queued for the written batch, on behalf of user_id.
+    """
+    results = {'create': [], 'update': [], 'delete': []}
+
+    cleaned_creates = [clean_ticket(item) for item in creates]
+    cleaned_updates = [clean_ticket(item, partial=True) for item in updates]
+
+    update_ids = [item.get('id') for item in updates if isinstance(item, dict)]
+    existing = {ticket.id: ticket for ticket in
+                Tickets.objects.filter(project=project, id__in=[i for i in update_ids if is_ticket_id(i)])}
+    delete_ids = set(Tickets.objects.filter(project=project, id__in=[i for i in deletes if is_ticket_id(i)])
+                     .values_list('id', flat=True))
+
+    # every assigned user is checked with a single query
+    user_ids = {values['users_id'] for values, errors in cleaned_creates + cleaned_updates
+                if values and values.get('users_id') is not None}
+    known_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    def check_user(values, errors):
+        if values and values.get('users_id') is not None and values['users_id'] not in known_users:
+            errors['users'] = ['User Does not Exist']
+
+    for values, errors in cleaned_creates:
+        check_user(values, errors)
+    for item, (values, errors) in zip(updates, cleaned_updates):
+        check_user(values, errors)
+        if values is None:
+            continue
+        if not is_ticket_id(item.get('id')):
+            errors['id'] = ['Invalid id']
+        elif item['id'] not in existing:
+            errors['id'] = ['Ticket does not exist']
+    for ticket_id in deletes:
+        if not is_ticket_id(ticket_id):
+            results['delete'].append({'id': ticket_id, 'status': 400, 'errors': {'id': ['Invalid id']}})
+        elif ticket_id not in delete_ids:
+            results['delete'].append({'id': ticket_id, 'status': 404, 'errors': {'id': ['Ticket does not exist']}})
+        else:
+            results['delete'].append({'id': ticket_id, 'status': 200})
+
+    invalid = any(errors for values, errors in cleaned_creates + cleaned_updates) or \
+        any(result['status'] != 200 for result in results['delete'])
+
+    to_create, to_update = [], []
+    for index, (values, errors) in enumerate(cleaned_creates):
+        if errors:
+            results['create'].append({'index': index, 'status': 400, 'errors': errors})
+        else:
+            results['create'].append({'index': index, 'status': 201})
+            to_create.append((index, Tickets(project=project, **values)))
+    for index, (item, (values, errors)) in enumerate(zip(updates, cleaned_updates)):
+        if errors:
+            ticket_id = item.get('id') if isinstance(item, dict) else None
+            results['update'].append({'index': index, 'id': ticket_id, 'status': 400, 'errors': errors})
+        else:
+            results['update'].append({'index': index, 'id': item['id'], 'status': 200})
+            to_update.append((existing[item['id']], values))
+
+    if invalid and atomic:
+        for result in results['create'] + results['update'] + results['delete']:
+            if result['status'] < 300:
+                result['status'] = 424     # not written because another item failed
+        return False, results
+
+    deltas = Counter()
+    assigned, released = set(), set()
+    previous_users = {}
+    audited = []
+    with transaction.atomic():
+        if to_create:
+            insert_tickets([ticket for index, ticket in to_create])
+            for (index, ticket) in to_create:
+                results['create'][index]['id'] = ticket.id
+                deltas[rollup_key(ticket.__dict__)] += 1
+                if ticket.users_id:
+                    assigned.add(ticket.users_id)
+
+        if to_update:
+            # bulk_update does not apply auto_now
+            now = timezone.now()
+            fields = {'updated_at'}
+            for ticket, values in to_update:
+                deltas[rollup_key(ticket.__dict__)] -= 1
+                previous_users[ticket.id] = ticket.users_id
+                old = {name: getattr(ticket, name) for name in Tickets.TRACKED_FIELDS}
+                if 'users_id' in values and values['users_id'] != ticket.users_id:
+                    if ticket.users_id:
+                        released.add(ticket.users_id)
+                    if values['users_id']:
+                        assigned.add(values['users_id'])
+                for field, value in values.items():
+                    setattr(ticket, field, value)
+                ticket.updated_at = now
+                fields.update(values)
+                deltas[rollup_key(ticket.__dict__)] += 1
+                ticket._loaded_values = {name: getattr(ticket, name) for name in Tickets.TRACKED_FIELDS}
+                audited.append((ticket.id, ticket_changes(old, ticket._loaded_values)))
+            Tickets.objects.bulk_update([ticket for ticket, values in to_update], list(fields),
+                                        batch_size=BATCH_SIZE)
+
+        apply_rollup_deltas(project.id, deltas)
+        record_changes(project.id, [ticket.id for index, ticket in to_create if ticket.id], TicketChange.CREATED)
+        record_changes(project.id, [ticket.id for ticket, values in to_update], TicketChange.UPDATED, previous_users)
+        record_audit(project.id, AuditEntry.TICKET, AuditEntry.CREATED,
+                     [(ticket.id, ticket_changes({}, ticket.__dict__)) for index, ticket in to_create if ticket.id],
+                     user_id)
+        record_audit(project.id, AuditEntry.TICKET, AuditEntry.UPDATED, audited, user_id)
+        # search indexing and relation cleanup run in the background
+        indexed = [ticket.id for index, ticket in to_create if ticket.id] + [ticket.id for ticket, values in to_update]
+        jobs = [enqueue('index_tickets', indexed, user_id=user_id)] if indexed else []
+        publish_ticket_events(project.id, lambda: ticket_events(to_create, to_update, previous_users))
+
+        if delete_ids:
+            released.update(Tickets.objects.filter(id__in=delete_ids, users__isnull=False)
+                            .values_list('users_id', flat=True))
+            # deletes go through the post_delete signal handlers, which keep the rollup up to date
+            Tickets.objects.filter(id__in=delete_ids).delete()
+        bump_project_version(project.id)
+        if assigned:
+            assign_developers(project, assigned, user_id)
+        if released - assigned:
+            jobs.append(enqueue('release_developers', project.id, sorted(released - assigned), user_id=user_id))
+    results['jobs'] = [job.id for job in jobs]
+    return True, results
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Django cache backends that live in the memory of one process
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                          'django.core.cache.backends.dummy.DummyCache')
+
+
+def is_shared_cache(alias):
+    # whether every process sees the writes to the Django cache `alias` (database, file, memcached, redis...)
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+class LRUCache:
+    """
+    Small thread safe in-process cache, least recently used entries are evicted
+    once maxsize is reached and entries expire ttl seconds after being set.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
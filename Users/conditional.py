@@ -0,0 +1,41 @@
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import ProjectVersion
+
+
+def bump_project_version(*project_ids):
+    # rows are created with the project, a project being deleted simply has nothing to update
+    ProjectVersion.objects.filter(project_id__in=project_ids).update(version=F('version') + 1,
+                                                                     modified_at=timezone.now())
+
+
+def project_version(project_id):
+    # read only: the row is created with the project (signals.py), a project deleted meanwhile gets version 0
+    version = ProjectVersion.objects.filter(project_id=project_id).first()
+    return version if version is not None else ProjectVersion(project_id=project_id)
+
+
+def make_etag(*parts):
+    # strong ETag from everything the response depends on
+    return '"%s"' % hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def not_modified(request, etag, last_modified):
+    # 304 response if the client's If-None-Match / If-Modified-Since is still valid, None otherwise
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified.timestamp())
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code not in (200, 304):
+        return response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
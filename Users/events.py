@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import TicketEvent
+from .serializers import TicketSerializer
+
+logger = logging.getLogger('Users.events')
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """
+    Events of one project for one client, in a bounded queue. Events are pushed from any thread and
+    read from the event loop the subscription was created in. A client that does not keep up and
+    fills its queue is marked as overflowed and gets no more events; it is expected to reconnect
+    and catch up through the changes endpoint.
+    """
+
+    def __init__(self, project_id, user_id, admin, maxsize, loop):
+        self.project_id = project_id
+        self.user_id = user_id
+        self.admin = admin
+        self.maxsize = maxsize
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.events = deque()
+        self.overflowed = False
+        self.wakeup = asyncio.Event()
+
+    def wants(self, event):
+        # developers only get the events of tickets assigned to them, now or before the change
+        return self.admin or self.user_id in (event.get('users'), event.get('previous_users'))
+
+    def push(self, event):
+        with self.lock:
+            if self.overflowed:
+                return
+            if len(self.events) >= self.maxsize:
+                self.overflowed = True
+            else:
+                self.events.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            pass    # the loop of the client is closed
+
+    async def next_events(self):
+        # waits for events and returns all the queued ones
+        await self.wakeup.wait()
+        self.wakeup.clear()
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
+
+
+class Broker:
+    """
+    Delivers ticket events published by the writers to the subscribed clients.
+    publish() is called from request threads once the write is committed, subscribe() and
+    unsubscribe() from the event loop serving the clients.
+    """
+
+    def publish(self, project_id, event):
+        raise NotImplementedError
+
+    def has_subscribers(self, project_id):
+        # False lets the writers skip building events nobody would get
+        return True
+
+    def subscribe(self, project_id, user_id, admin):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InMemoryBroker(Broker):
+    # fan-out to the subscribers of this process only
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}     # project_id -> set of subscriptions
+        self.count = 0
+
+    def publish(self, project_id, event):
+        self.dispatch(project_id, [event])
+
+    def dispatch(self, project_id, events):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(project_id, ()))
+        for subscription in subscriptions:
+            for event in events:
+                if subscription.wants(event):
+                    subscription.push(event)
+
+    def has_subscribers(self, project_id):
+        return project_id in self.subscriptions
+
+    def subscribe(self, project_id, user_id, admin):
+        subscription = Subscription(project_id, user_id, admin, settings.TICKET_EVENTS_QUEUE_SIZE,
+                                    asyncio.get_event_loop())
+        with self.lock:
+            if self.count >= settings.TICKET_EVENTS_MAX_SUBSCRIBERS:
+                raise TooManySubscribers()
+            self.subscriptions.setdefault(project_id, set()).add(subscription)
+            self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.project_id, set())
+            if subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self.count -= 1
+            if not subscriptions:
+                self.subscriptions.pop(subscription.project_id, None)
+
+
+class DatabaseBroker(InMemoryBroker):
+    """
+    Events go through the TicketEvent table, so clients get the events published by every process.
+    One thread per process polls the table for the projects that have subscribers here.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.poller = None
+        self.last_id = None
+
+    def publish(self, project_id, event):
+        TicketEvent.objects.create(project_id=project_id, payload=json.dumps(event, cls=JSONEncoder))
+
+    def has_subscribers(self, project_id):
+        return True     # possibly in another process
+
+    def subscribe(self, project_id, user_id, admin):
+        subscription = super().subscribe(project_id, user_id, admin)
+        with self.lock:
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, name='ticket-events', daemon=True)
+                self.poller.start()
+        return subscription
+
+    def poll(self):
+        pruned = 0
+        while True:
+            try:
+                close_old_connections()
+                if self.last_id is None:
+                    self.last_id = TicketEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+                self.poll_once()
+                if time.monotonic() - pruned > settings.TICKET_EVENTS_RETENTION:
+                    cutoff = timezone.now() - timedelta(seconds=settings.TICKET_EVENTS_RETENTION)
+                    TicketEvent.objects.filter(created_at__lt=cutoff).delete()
+                    pruned = time.monotonic()
+            except Exception:
+                logger.exception('Could not poll ticket events')
+                close_old_connections()
+            time.sleep(settings.TICKET_EVENTS_POLL_INTERVAL)
+
+    def poll_once(self):
+        with self.lock:
+            projects = set(self.subscriptions)
+        rows = TicketEvent.objects.filter(id__gt=self.last_id).order_by('id') \
+            .values_list('id', 'project_id', 'payload')
+        events = {}
+        for event_id, project_id, payload in rows.iterator():
+            self.last_id = event_id
+            if project_id in projects:
+                events.setdefault(project_id, []).append(json.loads(payload))
+        for project_id, project_events in events.items():
+            self.dispatch(project_id, project_events)
+
+
+brokers = {}
+
+
+def get_broker():
+    path = settings.TICKET_EVENTS_BROKER
+    if path not in brokers:
+        brokers[path] = import_string(path)()
+    return brokers[path]
+
+
+def ticket_event(type, ticket, previous_users=None):
+    return {
+        'type': type,
+        'project': ticket.project_id,
+        'ticket': ticket.id,
+        'users': ticket.users_id,
+        'previous_users': previous_users,
+        'data': TicketSerializer(ticket).data if type != 'deleted' else None,
+    }
+
+
+def publish_ticket_events(project_id, make_events):
+    """
+    Publishes the events returned by make_events() once the current transaction commits.
+    make_events is only called when the project has subscribers.
+    """
+    broker = get_broker()
+    if not broker.has_subscribers(project_id):
+        return
+    events = make_events()
+
+    def publish():
+        for event in events:
+            broker.publish(project_id, event)
+    transaction.on_commit(publish)
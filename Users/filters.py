@@ -0,0 +1,117 @@
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import PRIORITIES, STATUSES, TICKET_TYPES, Tickets
+
+# Query language of the ticket list endpoints:
+#   ?status=Open,Closed  ?priority=High  ?type=Bug/Error   any of the values, 'none' for tickets without one
+#   ?assignee=12,15  ?assignee=none                        assigned developer ids, or unassigned
+#   ?created_after=2020-10-01  ?created_before=2020-10-08T12:00:00Z   (also updated_after/updated_before),
+#                                                          after is inclusive, before exclusive
+#   ?ordering=-priority,created                            comma separated, '-' for descending
+# Every filter is a plain comparison on a Tickets column, so they combine with the indexes of the model.
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+# filter name -> (field, label -> choice value)
+CHOICE_FILTERS = {
+    'status': ('status', STATUSES),
+    'priority': ('priority', PRIORITIES),
+    'type': ('type', TICKET_TYPES),
+}
+
+# filter name -> lookup
+DATE_FILTERS = {
+    'created_after': 'CreatedDate__gte',
+    'created_before': 'CreatedDate__lt',
+    'updated_after': 'updated_at__gte',
+    'updated_before': 'updated_at__lt',
+}
+
+# ?ordering names -> ordering field. Choice fields are stored as the position of their choice
+# (see fields.py), so they are ordered by rank (Low < Medium < High), not alphabetically;
+# tickets without a value come first.
+TICKET_ORDERINGS = {
+    'created': 'CreatedDate',
+    'updated': 'updated_at',
+    'priority': 'priority',
+    'status': 'status',
+    'type': 'type',
+    'id': 'id',
+}
+
+
+def split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_moment(name, value):
+    try:
+        # well formed but out of range values (2020-02-30) raise ValueError
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        moment = day = None
+    if moment is None:
+        if day is None:
+            raise InvalidFilter("'%s' should be a date or a date and time (ISO 8601)" % name)
+        moment = timezone.datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def ticket_filters(params):
+    # Q of all the filters in the query params, raises InvalidFilter
+    condition = Q()
+    for name, (field, stored) in CHOICE_FILTERS.items():
+        if name not in params:
+            continue
+        values = split(params[name])
+        unknown = [value for value in values if value not in stored and value != 'none']
+        if unknown or not values:
+            raise InvalidFilter("'%s' should be a comma separated list of %s or none" % (name, ', '.join(stored)))
+        condition &= Q(**{field + '__in': [stored.get(value) for value in values]})
+
+    if 'assignee' in params:
+        values = split(params['assignee'])
+        if not values or not all(value == 'none' or value.isdigit() for value in values):
+            raise InvalidFilter("'assignee' should be a comma separated list of user ids or none")
+        match = Q(users__in=[int(value) for value in values if value != 'none'])
+        if 'none' in values:
+            match |= Q(users__isnull=True)
+        condition &= match
+
+    for name, lookup in DATE_FILTERS.items():
+        if params.get(name):
+            condition &= Q(**{lookup: parse_moment(name, params[name])})
+    return condition
+
+
+def ticket_ordering(value, default):
+    # ?ordering=-priority,created -> ('-priority', 'CreatedDate', 'id'), id keeps the order unique
+    if not value:
+        return default
+    ordering = []
+    for name in split(value):
+        if name.lstrip('-') not in TICKET_ORDERINGS:
+            raise InvalidFilter("'ordering' should be a comma separated list of %s, '-' for descending"
+                                % ', '.join(TICKET_ORDERINGS))
+        field = TICKET_ORDERINGS[name.lstrip('-')]
+        if field not in [existing.lstrip('-') for existing in ordering]:
+            ordering.append('-' + field if name.startswith('-') else field)
+    if 'id' not in [field.lstrip('-') for field in ordering]:
+        ordering.append('id')
+    return tuple(ordering)
+
+
+def ordering_value(row, field):
+    # value of an ordering field for a values() row, for the keyset pagination cursor:
+    # choice fields are compared by their stored integer, None included
+    if field in CHOICE_FILTERS:
+        return Tickets._meta.get_field(field).get_prep_value(row[field])
+    return row[field]
@@ -0,0 +1,226 @@
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .audit import record_audit, ticket_changes
+from .bulk import apply_rollup_deltas, insert_tickets
+from .cache import LRUCache
+from .conditional import bump_project_version
+from .events import publish_ticket_events, ticket_event
+from .jobs import enqueue
+from .models import AuditEntry, Projects, TicketChange, Tickets
+from .stats import rollup_key
+from .sync import record_changes
+
+logger = logging.getLogger('Users.intake')
+
+# Public ticket intake (/api/intake/<ticket_form_key>/, posted by the reportError form).
+# Reports are rate limited per form key and per client IP, buffered in memory and written in batches;
+# identical open reports of a project are collapsed into one ticket whose occurrences are counted.
+# Rate limits and buffers are per process.
+
+# ticket_form_key -> project id (None for unknown keys)
+form_keys = LRUCache(maxsize=settings.INTAKE_FORM_KEY_CACHE_SIZE, ttl=settings.INTAKE_FORM_KEY_CACHE_TTL)
+
+
+def project_for_form_key(ticket_form_key):
+    project_id = form_keys.get(ticket_form_key, 0)
+    if project_id == 0:
+        project_id = Projects.objects.filter(ticket_form_key=ticket_form_key).values_list('id', flat=True).first()
+        form_keys.set(ticket_form_key, project_id)
+    return project_id
+
+
+class RateLimiter:
+    """
+    Token buckets: every key may do <burst> requests at once and gets <rate> more per second.
+    Only the most recently used maxsize keys are remembered.
+    """
+
+    def __init__(self, rate, burst, maxsize=100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()    # key -> (tokens, time of the last update)
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        # returns 0 when allowed, otherwise the seconds to wait for the next token
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            self.buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+            if len(self.buckets) > self.maxsize:
+                self.buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+key_limiter = RateLimiter(settings.INTAKE_RATE_PER_FORM_KEY, settings.INTAKE_BURST_PER_FORM_KEY)
+ip_limiter = RateLimiter(settings.INTAKE_RATE_PER_IP, settings.INTAKE_BURST_PER_IP)
+
+
+def client_ip(request):
+    # each of the INTAKE_TRUSTED_PROXIES proxies appends the address it was connected from to X-Forwarded-For,
+    # so the client is the address seen by the first of them; the addresses before it are whatever the client sent
+    proxies = settings.INTAKE_TRUSTED_PROXIES
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    forwarded = [address for address in forwarded if address]
+    if proxies and forwarded:
+        return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def rate_limit(form_key, request):
+    # 0 when the report is allowed, otherwise the seconds to wait. The form key is public, so the per IP
+    # limit is applied per form key too
+    return key_limiter.allow(form_key) or ip_limiter.allow((form_key, client_ip(request)))
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def content_hash(project_id, title, description):
+    text = '%d\n%s\n%s' % (project_id, normalize(title), normalize(description))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def write_reports(reports):
+    """
+    Writes a batch of (project_id, title, description) reports: one ticket per distinct report,
+    or one more occurrence for a report that already has an open ticket.
+    Returns (created, collapsed) counts.
+    """
+    counts, first = Counter(), {}
+    for project_id, title, description in reports:
+        key = (project_id, content_hash(project_id, title, description))
+        counts[key] += 1
+        first.setdefault(key, (title, description))
+
+    with transaction.atomic():
+        # projects deleted since their form key was cached are dropped
+        projects = set(Projects.objects.filter(id__in={project_id for project_id, _ in counts})
+                       .values_list('id', flat=True))
+        existing = {}
+        for ticket_id, project_id, hash in Tickets.objects.filter(
+                project_id__in=projects, content_hash__in={hash for _, hash in counts}) \
+                .exclude(status='Closed').order_by('id').values_list('id', 'project_id', 'content_hash'):
+            existing.setdefault((project_id, hash), ticket_id)
+
+        now = timezone.now()
+        created, updated = [], {}
+        for (project_id, hash), count in counts.items():
+            if project_id not in projects:
+                continue
+            if (project_id, hash) in existing:
+                ticket_id = existing[(project_id, hash)]
+                Tickets.objects.filter(id=ticket_id).update(occurrences=F('occurrences') + count, updated_at=now)
+                updated.setdefault(project_id, []).append(ticket_id)
+            else:
+                title, description = first[(project_id, hash)]
+                created.append(Tickets(title=title, description=description, project_id=project_id,
+                                       content_hash=hash, occurrences=count))
+
+        # bulk inserts do not send signals, the side effects of ticket_saved are applied here
+        by_project = {}
+        for ticket in created:
+            by_project.setdefault(ticket.project_id, []).append(ticket)
+        for project_id, tickets in by_project.items():
+            insert_tickets(tickets)
+            apply_rollup_deltas(project_id, Counter(rollup_key(ticket.__dict__) for ticket in tickets))
+            record_changes(project_id, [ticket.id for ticket in tickets if ticket.id], TicketChange.CREATED)
+            record_audit(project_id, AuditEntry.TICKET, AuditEntry.CREATED,
+                         [(ticket.id, ticket_changes({}, ticket.__dict__)) for ticket in tickets if ticket.id])
+            enqueue('index_tickets', [ticket.id for ticket in tickets if ticket.id])
+            publish_ticket_events(project_id, lambda tickets=tickets: [ticket_event('created', ticket)
+                                                                       for ticket in tickets])
+        for project_id, ticket_ids in updated.items():
+            record_changes(project_id, ticket_ids, TicketChange.UPDATED)
+        bump_project_version(*(set(by_project) | set(updated)))
+    return len(created), sum(len(ticket_ids) for ticket_ids in updated.values())
+
+
+class IntakeBuffer:
+    """
+    Collects reports and writes them with write_reports() from a background thread, every
+    INTAKE_FLUSH_INTERVAL_MS or as soon as INTAKE_BATCH_SIZE reports are waiting.
+    Reports that could not be written go back into the buffer, which keeps at most INTAKE_MAX_BUFFERED.
+    Reports still in the buffer when the process dies are lost.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reports = []
+        self.full = threading.Event()
+        self.thread = None
+
+    def add(self, report):
+        with self.lock:
+            self.reports.append(report)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='ticket-intake', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+            if len(self.reports) >= settings.INTAKE_BATCH_SIZE:
+                self.full.set()
+
+    def flush(self):
+        with self.lock:
+            reports, self.reports = self.reports, []
+            self.full.clear()
+        if not reports:
+            return 0
+        for start in range(0, len(reports), settings.INTAKE_BATCH_SIZE):
+            try:
+                write_reports(reports[start:start + settings.INTAKE_BATCH_SIZE])
+            except Exception:
+                self.requeue(reports[start:])
+                raise
+        return len(reports)
+
+    def requeue(self, reports):
+        # in front of the reports that came in meanwhile, the oldest are dropped when the buffer is full
+        with self.lock:
+            self.reports[:0] = reports
+            dropped = len(self.reports) - settings.INTAKE_MAX_BUFFERED
+            if dropped > 0:
+                del self.reports[:dropped]
+        if dropped > 0:
+            logger.error('Dropped %d ticket reports, the buffer is full', dropped)
+
+    def run(self):
+        while True:
+            self.full.wait(settings.INTAKE_FLUSH_INTERVAL_MS / 1000.0)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('Could not write ticket reports')
+            finally:
+                close_old_connections()
+
+
+intake_buffer = IntakeBuffer()
+
+
+def submit_report(project_id, title, description):
+    report = (project_id, title[:Tickets._meta.get_field('title').max_length],
+              (description or '')[:Tickets._meta.get_field('description').max_length] or None)
+    if settings.INTAKE_BUFFERED:
+        intake_buffer.add(report)
+    else:
+        write_reports([report])
@@ -0,0 +1,166 @@
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .audit import acting_as
+from .models import Job
+
+logger = logging.getLogger('Users.jobs')
+
+# job name -> function, filled by the @job decorator (see tasks.py)
+registry = {}
+
+# seconds between two prunings of the finished jobs by a worker
+PRUNE_INTERVAL = 3600
+
+
+def job(name=None, max_attempts=3):
+    def register(function):
+        registry[name or function.__name__] = (function, max_attempts)
+        return function
+    return register
+
+
+def enqueue(name, *args, key=None, coalesce=False, delay=0, user_id=None, **kwargs):
+    """
+    Queues the job <name>(*args, **kwargs) and returns its Job row. Inside a transaction the job
+    only becomes visible to the workers when the transaction commits.
+    With an idempotency key, queueing a job whose key already exists returns the existing job.
+    With coalesce=True the key only holds until a worker starts the job: the same job queued again
+    in the meantime is folded into the queued one, once started it is queued anew.
+    With JOBS_ALWAYS_EAGER the job runs right away, in the calling thread.
+    """
+    if name not in registry:
+        raise KeyError('Unknown job %r' % name)
+    values = dict(name=name, args=list(args), kwargs=kwargs, max_attempts=registry[name][1], user_id=user_id,
+                  run_at=timezone.now() + timedelta(seconds=delay), coalesce=coalesce)
+    job = None
+    if key is not None:
+        try:
+            with transaction.atomic():
+                job, created = Job.objects.get_or_create(key=key, defaults=values)
+        except IntegrityError:
+            # queued at the same time elsewhere, a coalesced job may have started since
+            job, created = Job.objects.filter(key=key).first(), False
+        if job is not None and not created:
+            return job
+    if job is None:
+        job = Job.objects.create(**values)
+
+    if settings.JOBS_ALWAYS_EAGER:
+        Job.objects.filter(id=job.id).update(status=Job.RUNNING, attempts=F('attempts') + 1,
+                                             key=release_key(), updated_at=timezone.now())
+        job.refresh_from_db()
+        run_job(job)
+        job.refresh_from_db()
+    return job
+
+
+def release_key():
+    # the key of a coalesced job, for the update that starts it
+    return Case(When(coalesce=True, then=Value(None)), default=F('key'))
+
+
+def claim_jobs(limit):
+    # queued jobs that are due, and running jobs whose worker died; the conditional update makes sure
+    # every job is claimed by a single worker, on every database
+    now = timezone.now()
+    timed_out = Q(status=Job.RUNNING, locked_until__lt=now)
+    # a job whose worker died during its last attempt is not run again
+    Job.objects.filter(timed_out, attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error='Timed out after JOBS_TIMEOUT seconds', locked_until=None, updated_at=now)
+    due = Q(status=Job.QUEUED, run_at__lte=now) | (timed_out & Q(attempts__lt=F('max_attempts')))
+    claimed = []
+    for job in Job.objects.filter(due).order_by('run_at', 'id')[:limit]:
+        locked_until = now + timedelta(seconds=settings.JOBS_TIMEOUT)
+        updated = Job.objects.filter(due, id=job.id, attempts=job.attempts).update(
+            status=Job.RUNNING, locked_until=locked_until, attempts=F('attempts') + 1, key=release_key(),
+            updated_at=now)
+        if updated:
+            job.status, job.locked_until, job.attempts = Job.RUNNING, locked_until, job.attempts + 1
+            claimed.append(job)
+    return claimed
+
+
+def run_job(job):
+    function, _ = registry[job.name]
+    try:
+        # writes of the job are logged as made by the user who queued it
+        with acting_as(job.user_id):
+            result = function(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            # exponential backoff: JOBS_RETRY_DELAY, then twice that, ...
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(id=job.id).update(status=Job.QUEUED, last_error=error, locked_until=None,
+                                                 run_at=timezone.now() + timedelta(seconds=delay),
+                                                 updated_at=timezone.now())
+            logger.warning('Job %d (%s) failed, retrying in %ss\n%s', job.id, job.name, delay, error)
+        else:
+            Job.objects.filter(id=job.id).update(status=Job.FAILED, last_error=error, locked_until=None,
+                                                 updated_at=timezone.now())
+            logger.error('Job %d (%s) failed after %d attempts\n%s', job.id, job.name, job.attempts, error)
+        return False
+    Job.objects.filter(id=job.id).update(status=Job.DONE, result=result, locked_until=None,
+                                         updated_at=timezone.now())
+    return True
+
+
+def prune_jobs(retention_days=None, batch_size=1000):
+    """
+    Deletes the done and failed jobs last updated more than retention_days ago (JOBS_RETENTION_DAYS by
+    default, None keeps everything). Their idempotency keys go with them. Returns the number of jobs deleted.
+    """
+    retention_days = settings.JOBS_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days is None:
+        return 0
+    finished = Job.objects.filter(status__in=(Job.DONE, Job.FAILED),
+                                  updated_at__lt=timezone.now() - timedelta(days=retention_days))
+    deleted = 0
+    while True:
+        ids = list(finished.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(id__in=ids).delete()[0]
+
+
+def run_in_thread(job):
+    close_old_connections()
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def work(threads=4, once=False, poll_interval=1.0, stdout=None):
+    """
+    Runs jobs on a pool of threads until interrupted, or until nothing is due with once=True.
+    Returns the number of jobs run.
+    """
+    count, pruned_at = 0, None
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool:
+        while True:
+            if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                pruned_at = time.monotonic()
+                pruned = prune_jobs()
+                if pruned and stdout is not None:
+                    stdout.write('Deleted %d finished jobs' % pruned)
+            jobs = claim_jobs(threads * 2)
+            if jobs:
+                for job, ok in zip(jobs, pool.map(run_in_thread, jobs)):
+                    count += 1
+                    if stdout is not None:
+                        stdout.write('%s job %d (%s)' % ('Ran' if ok else 'Failed', job.id, job.name))
+                continue
+            if once:
+                return count
+            close_old_connections()
+            time.sleep(poll_interval)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from Users.audit import compact_audit_log
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired audit log entries and merges the old consecutive updates of an object into one entry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='delete entries older than this (default: AUDIT_LOG_RETENTION_DAYS)')
+        parser.add_argument('--compact-after-days', type=int, default=None,
+                            help='merge updates older than this (default: AUDIT_LOG_COMPACT_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='entries read and written at a time')
+
+    def handle(self, *args, **options):
+        deleted, merged = compact_audit_log(options['retention_days'], options['compact_after_days'],
+                                            options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Deleted %d expired entries, merged away %d entries' % (deleted, merged)))
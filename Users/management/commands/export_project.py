@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Users.archive import export_project
+from Users.models import Projects
+
+
+class Command(BaseCommand):
+    help = 'Writes a project, its members and its tickets to a gzip compressed archive (see Users/archive.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int)
+        parser.add_argument('--output', '-o', default='-', help='archive file, - for stdout')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not Projects.objects.filter(id=options['project']).exists():
+            raise CommandError('Project %d does not exist' % options['project'])
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for data in export_project(options['project'], chunk_size=options['chunk_size']):
+                output.write(data)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS('Exported project %d to %s' % (options['project'], options['output'])))
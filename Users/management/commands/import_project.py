@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from Users.archive import InvalidArchive, import_project
+
+
+class Command(BaseCommand):
+    help = 'Imports an archive written by export_project as a new project'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive')
+        parser.add_argument('--admin', help='email of a user who becomes an Admin of the project (not with --resume)')
+        parser.add_argument('--resume', type=int, default=None,
+                            help='id of an interrupted import of the same archive, to continue it')
+        parser.add_argument('--members', action='store_true',
+                            help='also add the members of the archive, with their roles, to the users with their email')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options['admin'] and options['resume'] is None:
+            user_id = User.objects.filter(email=options['admin']).order_by('id').values_list('id', flat=True).first()
+            if user_id is None:
+                raise CommandError('No user with the email %s' % options['admin'])
+        try:
+            with open(options['archive'], 'rb') as archive:
+                checkpoint = import_project(archive, user_id=user_id, resume=options['resume'],
+                                            chunk_size=options['chunk_size'], members=options['members'])
+        except InvalidArchive as e:
+            if e.checkpoint is not None:
+                raise CommandError('%s (resume with --resume %d)' % (e, e.checkpoint.id))
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS('Imported project %d: %d members, %d tickets (import %d)' % (
+            checkpoint.project_id, checkpoint.members, checkpoint.tickets, checkpoint.id)))
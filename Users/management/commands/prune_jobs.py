@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from Users.jobs import prune_jobs
+
+
+class Command(BaseCommand):
+    help = 'Deletes the done and failed background jobs that are older than the retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='delete finished jobs older than this (default: JOBS_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='jobs deleted at a time')
+
+    def handle(self, *args, **options):
+        deleted = prune_jobs(options['retention_days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Deleted %d finished jobs' % deleted))
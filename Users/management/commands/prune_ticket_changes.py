@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from Users.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = 'Deletes the ticket changes of the delta sync log that are older than the retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='delete changes older than this (default: TICKET_CHANGES_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='changes deleted at a time')
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options['retention_days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Deleted %d expired changes' % deleted))
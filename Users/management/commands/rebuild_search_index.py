@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from Users.search import rebuild_index
+from Users.similar import rebuild_signatures
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ticket search index and the near duplicate keys from the Tickets table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None, help='only rebuild this project')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(options['project'], chunk_size=options['chunk_size'])
+        rebuild_signatures(options['project'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS('Indexed %d tickets' % count))
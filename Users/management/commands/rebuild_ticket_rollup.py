@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from Users.stats import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Recounts the TicketRollup table from the Tickets table and repairs the counts that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, default=None, help='only rebuild this project')
+        parser.add_argument('--dry-run', action='store_true', help='only report the drifted counts')
+
+    def handle(self, *args, **options):
+        drift = rebuild_rollup(options['project'], dry_run=options['dry_run'])
+        for project_id, priority, status, type, users_id, stored, actual in drift:
+            self.stdout.write('project %s, priority %s, status %s, type %s, developer %s: %d instead of %d' % (
+                project_id, priority, status, type, users_id, stored, actual))
+        self.stdout.write(self.style.SUCCESS('%s %d drifted rollup rows' % (
+            'Found' if options['dry_run'] else 'Repaired', len(drift))))
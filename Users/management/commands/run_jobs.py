@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Users.jobs import work
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued background jobs (relation cleanup, search indexing...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.JOBS_WORKER_THREADS)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds between polls when idle')
+        parser.add_argument('--once', action='store_true', help='exit once no job is due')
+
+    def handle(self, *args, **options):
+        count = work(options['threads'], options['once'], options['poll_interval'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Ran %d jobs' % count))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from Users.seeding import seed_data
+
+
+class Command(BaseCommand):
+    help = 'Inserts a reproducible synthetic data set (users, projects, memberships, tickets)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--projects', type=int, default=10)
+        parser.add_argument('--members', type=int, default=5, help='developers per project')
+        parser.add_argument('--tickets', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='same seed gives the same data, use another seed to add a second data set')
+
+    def handle(self, *args, **options):
+        seed_data(users=options['users'], projects=options['projects'], members=options['members'],
+                  tickets=options['tickets'], seed=options['seed'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Done'))
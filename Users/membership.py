@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import LRUCache
+from .models import ProjectUserRelation
+
+# user_id -> {project_id: user_role}, shared by all requests handled by this process.
+# Entries are dropped by the signal handlers whenever a ProjectUserRelation row of the user changes,
+# other processes see the change once their entry expires.
+memberships_cache = LRUCache(maxsize=settings.MEMBERSHIP_CACHE_SIZE, ttl=settings.MEMBERSHIP_CACHE_TTL)
+
+
+def load_memberships(user_id):
+    # from the primary, a lagging replica would put a stale entry in the cache
+    return dict(ProjectUserRelation.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+                .values_list('project_id', 'user_role'))
+
+
+def get_memberships(user_id, request=None):
+    # per request cache first, then the process cache, then the database
+    request_cache = getattr(request, '_memberships', None) if request is not None else None
+    if request_cache is not None and user_id in request_cache:
+        return request_cache[user_id]
+
+    roles = memberships_cache.get(user_id)
+    if roles is None:
+        roles = load_memberships(user_id)
+        memberships_cache.set(user_id, roles)
+
+    if request is not None:
+        if request_cache is None:
+            request_cache = {}
+            request._memberships = request_cache
+        request_cache[user_id] = roles
+    return roles
+
+
+def get_role(user_id, project_id, request=None):
+    # role of the user in the project, None if the user is not part of the project
+    if user_id is None:
+        return None
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return None
+    return get_memberships(user_id, request).get(project_id)
+
+
+def invalidate_memberships(*user_ids):
+    for user_id in user_ids:
+        memberships_cache.delete(user_id)
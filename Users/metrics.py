@@ -0,0 +1,191 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+slow_request_logger = logging.getLogger('Users.slow_requests')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    In-process metrics, one histogram/counter per (metric, labels).
+    Every worker process has its own registry.
+    """
+
+    HISTOGRAMS = {
+        'bugtracker_request_duration_seconds': ('Wall time of a request', DURATION_BUCKETS),
+        'bugtracker_request_sql_queries': ('SQL queries run by a request', QUERY_COUNT_BUCKETS),
+        'bugtracker_request_sql_duration_seconds': ('Time spent in SQL by a request', DURATION_BUCKETS),
+        'bugtracker_request_serializer_duration_seconds': ('Time spent serializing by a request', DURATION_BUCKETS),
+        'bugtracker_response_size_bytes': ('Size of the response body', SIZE_BUCKETS),
+    }
+    COUNTERS = {
+        'bugtracker_requests_total': 'Requests by view, method and status code',
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.HISTOGRAMS[name][1])
+            self.histograms[key].observe(value)
+
+    def increment(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets) in self.HISTOGRAMS.items():
+                lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s histogram' % name]
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append('%s_bucket%s %d' % (name, format_labels(labels + (('le', bound),)), cumulative))
+                    lines.append('%s_sum%s %s' % (name, format_labels(labels), repr(float(histogram.sum))))
+                    lines.append('%s_count%s %d' % (name, format_labels(labels), histogram.count))
+            for name, help_text in self.COUNTERS.items():
+                lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name]
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append('%s%s %d' % (name, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{%s}' % ','.join('%s="%s"' % (key, value) for (key, _), value in zip(labels, escaped))
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []   # (sql, seconds)
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+
+
+current_request = contextvars.ContextVar('current_request_metrics', default=None)
+
+
+@contextmanager
+def timed_serialization():
+    # adds the time spent in the block to the serializer time of the current request
+    metrics = current_request.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serializer_time += time.perf_counter() - start
+
+
+def sql_recorder(metrics):
+    def wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            took = time.perf_counter() - start
+            metrics.sql_time += took
+            metrics.queries.append((sql, took))
+    return wrapper
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return getattr(match.func, '__name__', None) or match.url_name or match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Records wall time, SQL query count and time, serializer time and response size of every request,
+    labelled with the view that handled it. Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged
+    to the 'Users.slow_requests' logger together with their slowest SQL statements.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sql_recorder(metrics)))
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - start
+
+        view = view_label(request)
+        if view == 'metrics':
+            return response
+        labels = (('view', view), ('method', request.method))
+        registry.increment('bugtracker_requests_total', labels + (('status', response.status_code),))
+        registry.observe('bugtracker_request_duration_seconds', labels, duration)
+        registry.observe('bugtracker_request_sql_queries', labels, len(metrics.queries))
+        registry.observe('bugtracker_request_sql_duration_seconds', labels, metrics.sql_time)
+        registry.observe('bugtracker_request_serializer_duration_seconds', labels, metrics.serializer_time)
+        if not response.streaming:
+            registry.observe('bugtracker_response_size_bytes', labels, len(response.content))
+
+        threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+        if threshold is not None and duration * 1000 >= threshold:
+            slowest = sorted(metrics.queries, key=lambda query: -query[1])[:settings.SLOW_REQUEST_LOG_QUERIES]
+            slow_request_logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries (%.1f ms), serializer %.1f ms\n%s',
+                request.method, request.get_full_path(), view, duration * 1000, len(metrics.queries),
+                metrics.sql_time * 1000, metrics.serializer_time * 1000,
+                '\n'.join('  %.1f ms: %s' % (took * 1000, sql) for sql, took in slowest)
+            )
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_rollup(apps, schema_editor):
+    Tickets = apps.get_model('Users', 'Tickets')
+    TicketRollup = apps.get_model('Users', 'TicketRollup')
+    rows = Tickets.objects.order_by().values('project_id', 'priority', 'status', 'type') \
+        .annotate(count=models.Count('id'))
+    TicketRollup.objects.bulk_create([TicketRollup(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0016_projects_ticket_form_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.CharField(blank=True, choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], max_length=20, null=True)),
+                ('status', models.CharField(blank=True, choices=[('Open', 'Open'), ('Closed', 'Closed')], max_length=20, null=True)),
+                ('type', models.CharField(blank=True, choices=[('Feature/Request', 'Feature/Request'), ('Bug/Error', 'Bug/Error'), ('Others', 'Others')], max_length=20, null=True)),
+                ('count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Users.projects')),
+            ],
+            options={
+                'unique_together': {('project', 'priority', 'status', 'type')},
+            },
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
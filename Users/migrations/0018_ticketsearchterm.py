@@ -0,0 +1,51 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # SQLite only: full text index of ticket title/description, rowid is the ticket id.
+    # Other databases use the TicketSearchTerm table, fill it with `python manage.py rebuild_search_index`.
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE Users_ticket_fts USING fts5("
+                           "title, description, project_id UNINDEXED, tokenize='unicode61')")
+        except Exception:
+            # sqlite built without FTS5
+            return
+        cursor.execute("INSERT INTO Users_ticket_fts (rowid, title, description, project_id) "
+                       "SELECT id, title, COALESCE(description, ''), project_id FROM Users_tickets")
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS Users_ticket_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0017_ticketrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.IntegerField(default=1)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Users.projects')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Users.tickets')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ticketsearchterm',
+            index=models.Index(fields=['project', 'term'], name='Users_ticke_project_616e97_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
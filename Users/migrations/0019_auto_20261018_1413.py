@@ -0,0 +1,29 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0018_ticketsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectuserrelation',
+            index=models.Index(fields=['user_id', 'user_role'], name='Users_proje_user_id_376d62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tickets',
+            index=models.Index(fields=['project', 'status', 'priority'], name='Users_ticke_project_526e82_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tickets',
+            index=models.Index(fields=['project', 'users'], name='Users_ticke_project_f9163a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tickets',
+            index=models.Index(fields=['project', 'CreatedDate', 'id'], name='Users_ticke_project_0e1348_idx'),
+        ),
+    ]
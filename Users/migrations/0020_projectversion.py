@@ -0,0 +1,32 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_versions(apps, schema_editor):
+    Projects = apps.get_model('Users', 'Projects')
+    ProjectVersion = apps.get_model('Users', 'ProjectVersion')
+    ProjectVersion.objects.bulk_create([ProjectVersion(project_id=project_id)
+                                        for project_id in Projects.objects.values_list('id', flat=True)],
+                                       batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0019_auto_20261018_1413'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectVersion',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version', serialize=False, to='Users.projects')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    Tickets = apps.get_model('Users', 'Tickets')
+    Tickets.objects.update(updated_at=models.F('CreatedDate'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0020_projectversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('project_id', models.IntegerField()),
+                ('ticket_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tickets',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ticketchange',
+            index=models.Index(fields=['project_id', 'id'], name='Users_ticke_project_235754_idx'),
+        ),
+    ]
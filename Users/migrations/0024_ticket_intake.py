@@ -0,0 +1,27 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0023_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickets',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='tickets',
+            name='occurrences',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='tickets',
+            index=models.Index(fields=['project', 'content_hash'], name='Users_ticke_project_ff6df7_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0024_ticket_intake'),
+    ]
+
+    # existing tickets are indexed by `python manage.py rebuild_search_index`
+    operations = [
+        migrations.CreateModel(
+            name='TicketSimilarityKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Users.projects')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Users.tickets')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ticketsimilaritykey',
+            index=models.Index(fields=['project', 'key'], name='Users_ticke_project_2eb440_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def recount(apps, fields):
+    Tickets = apps.get_model('Users', 'Tickets')
+    TicketRollup = apps.get_model('Users', 'TicketRollup')
+    TicketRollup.objects.all().delete()
+    rows = Tickets.objects.order_by().values(*fields).annotate(count=models.Count('id'))
+    TicketRollup.objects.bulk_create([TicketRollup(**row) for row in rows], batch_size=500)
+
+
+def recount_per_developer(apps, schema_editor):
+    # the existing rows have no developer
+    recount(apps, ('project_id', 'users_id', 'priority', 'status', 'type'))
+
+
+def recount_per_project(apps, schema_editor):
+    recount(apps, ('project_id', 'priority', 'status', 'type'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('Users', '0025_ticketsimilaritykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketrollup',
+            name='users',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ticketrollup',
+            unique_together={('project', 'users', 'priority', 'status', 'type')},
+        ),
+        migrations.RunPython(recount_per_developer, recount_per_project),
+    ]
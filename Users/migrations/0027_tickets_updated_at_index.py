@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0026_ticketrollup_users'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tickets',
+            index=models.Index(fields=['project', 'updated_at', 'id'], name='Users_ticke_project_86d5d1_idx'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 3.1.2 on 2026-10-18 14:53
+
+import Users.fields
+from django.db import migrations, models
+
+# stored value of every choice, NULL becomes 0
+CODES = {
+    'priority': {'Low': 1, 'Medium': 2, 'High': 3},
+    'status': {'Open': 1, 'Closed': 2},
+    'type': {'Feature/Request': 1, 'Bug/Error': 2, 'Others': 3},
+}
+
+
+def encode(apps, schema_editor):
+    # the varchar columns get the codes as text, the type change below casts them to integers
+    Tickets = apps.get_model('Users', 'Tickets')
+    for field, codes in CODES.items():
+        for value, code in codes.items():
+            Tickets.objects.filter(**{field: value}).update(**{field: str(code)})
+        Tickets.objects.filter(**{field + '__isnull': True}).update(**{field: '0'})
+        # anything else was never a valid choice
+        Tickets.objects.exclude(**{field + '__in': [str(code) for code in codes.values()] + ['0']}) \
+            .update(**{field: '0'})
+    # the counters are recounted once the columns are integers
+    apps.get_model('Users', 'TicketRollup').objects.all().delete()
+
+
+def decode(apps, schema_editor):
+    Tickets = apps.get_model('Users', 'Tickets')
+    for field, codes in CODES.items():
+        for value, code in codes.items():
+            Tickets.objects.filter(**{field: str(code)}).update(**{field: value})
+        Tickets.objects.filter(**{field: '0'}).update(**{field: None})
+    recount(apps, schema_editor)
+
+
+def recount(apps, schema_editor):
+    Tickets = apps.get_model('Users', 'Tickets')
+    TicketRollup = apps.get_model('Users', 'TicketRollup')
+    TicketRollup.objects.all().delete()
+    rows = Tickets.objects.order_by().values('project_id', 'users_id', 'priority', 'status', 'type') \
+        .annotate(count=models.Count('id'))
+    TicketRollup.objects.bulk_create([TicketRollup(**row) for row in rows], batch_size=500)
+
+
+def clear_rollup(apps, schema_editor):
+    apps.get_model('Users', 'TicketRollup').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0027_tickets_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(encode, decode),
+        migrations.AlterField(
+            model_name='ticketrollup',
+            name='priority',
+            field=Users.fields.EnumField(blank=True, choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='ticketrollup',
+            name='status',
+            field=Users.fields.EnumField(blank=True, choices=[('Open', 'Open'), ('Closed', 'Closed')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='ticketrollup',
+            name='type',
+            field=Users.fields.EnumField(blank=True, choices=[('Feature/Request', 'Feature/Request'), ('Bug/Error', 'Bug/Error'), ('Others', 'Others')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickets',
+            name='priority',
+            field=Users.fields.EnumField(blank=True, choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickets',
+            name='status',
+            field=Users.fields.EnumField(blank=True, choices=[('Open', 'Open'), ('Closed', 'Closed')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='tickets',
+            name='type',
+            field=Users.fields.EnumField(blank=True, choices=[('Feature/Request', 'Feature/Request'), ('Bug/Error', 'Bug/Error'), ('Others', 'Others')], null=True),
+        ),
+        migrations.RunPython(recount, clear_rollup),
+        migrations.AddIndex(
+            model_name='tickets',
+            index=models.Index(fields=['project', 'priority', 'CreatedDate', 'id'], name='Users_ticke_project_f9e6ab_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('Users', '0028_enum_choice_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectImport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_id', models.CharField(max_length=32)),
+                ('records', models.IntegerField(default=0)),
+                ('members', models.IntegerField(default=0)),
+                ('tickets', models.IntegerField(default=0)),
+                ('user_map', models.JSONField(default=dict)),
+                ('done', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='Users.projects')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
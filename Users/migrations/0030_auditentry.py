@@ -0,0 +1,36 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:08
+
+import Users.fields
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0029_projectimport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('project_id', models.IntegerField()),
+                ('target', Users.fields.EnumField(choices=[('ticket', 'ticket'), ('member', 'member')])),
+                ('object_id', models.IntegerField()),
+                ('action', Users.fields.EnumField(choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted')])),
+                ('actor_id', models.IntegerField(blank=True, null=True)),
+                ('changes', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='auditentry',
+            index=models.Index(fields=['project_id', 'target', 'object_id', 'id'], name='Users_audit_project_815adb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditentry',
+            index=models.Index(fields=['project_id', 'id'], name='Users_audit_project_f4da93_idx'),
+        ),
+    ]
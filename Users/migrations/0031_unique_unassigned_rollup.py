@@ -0,0 +1,31 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    # unassigned rows inserted twice for one key were all incremented by every later write, so their counts
+    # can not be added up: they are replaced by one row with the count of the tickets
+    Tickets = apps.get_model('Users', 'Tickets')
+    TicketRollup = apps.get_model('Users', 'TicketRollup')
+    duplicates = TicketRollup.objects.filter(users__isnull=True).order_by() \
+        .values('project_id', 'priority', 'status', 'type').annotate(rows=models.Count('id')).filter(rows__gt=1)
+    for key in list(duplicates):
+        key = {field: key[field] for field in ('project_id', 'priority', 'status', 'type')}
+        TicketRollup.objects.filter(users__isnull=True, **key).delete()
+        TicketRollup.objects.create(count=Tickets.objects.filter(users__isnull=True, **key).count(), **key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0030_auditentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ticketrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(users__isnull=True), fields=('project', 'priority', 'status', 'type'), name='unique_unassigned_rollup'),
+        ),
+    ]
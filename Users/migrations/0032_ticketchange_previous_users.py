@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0031_unique_unassigned_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketchange',
+            name='previous_users_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0032_ticketchange_previous_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='coalesce',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0033_job_coalesce'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectimport',
+            name='with_members',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .fields import EnumField
 
 # Create your models here.
 
@@ -25,6 +29,14 @@ class Projects(models.Model):
         return str(self.id)
 
 
+# Change counter of a project, bumped on every write to the project or its tickets.
+# Drives the ETag/Last-Modified headers of project and ticket reads (see conditional.py).
+class ProjectVersion(models.Model):
+    project = models.OneToOneField(Projects, on_delete=models.CASCADE, primary_key=True, related_name='version')
+    version = models.PositiveIntegerField(default=0)
+    modified_at = models.DateTimeField(default=timezone.now)
+
+
 class Tickets(models.Model):
     PRIORITY_CHOICES = (
         ('Low', 'Low'),
@@ -45,12 +57,78 @@ class Tickets(models.Model):
     title = models.CharField(max_length=100)    # not null
     description = models.TextField(max_length=500, null=True, blank=True)
     # submitter = models.CharField(max_length=100, blank=True)     # user who registered the error
-    priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, blank=True, null=True)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, blank=True, null=True)
-    type = models.CharField(max_length=20, choices=TICKET_TYPE_CHOICES, blank=True, null=True)
+    # stored as small integers in the order of their choices, strings in Python (see fields.py)
+    priority = EnumField(choices=PRIORITY_CHOICES, blank=True, null=True)
+    status = EnumField(choices=STATUS_CHOICES, blank=True, null=True)
+    type = EnumField(choices=TICKET_TYPE_CHOICES, blank=True, null=True)
     CreatedDate = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     project = models.ForeignKey(Projects, on_delete=models.CASCADE)  # cannot be null (should belong to a project)
     users = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)  # can be null (no developer assigned)
+    # public reports (see intake.py): identical reports are collapsed into one ticket, counting occurrences
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    occurrences = models.IntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # admin ticket list filtered/grouped by status and priority
+            models.Index(fields=['project', 'status', 'priority']),
+            # developer ticket list and developer ticket counts
+            models.Index(fields=['project', 'users']),
+            # cursor pagination order
+            models.Index(fields=['project', 'CreatedDate', 'id']),
+            # ticket lists ordered by last update
+            models.Index(fields=['project', 'updated_at', 'id']),
+            # ticket lists ordered by priority
+            models.Index(fields=['project', 'priority', 'CreatedDate', 'id']),
+            # duplicate public reports
+            models.Index(fields=['project', 'content_hash']),
+        ]
+
+    # fields whose value at load time is remembered, so signal handlers can see what an update changed
+    # (rollup counters, audit log)
+    TRACKED_FIELDS = ('project_id', 'priority', 'status', 'type', 'users_id', 'title', 'description')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {name: getattr(instance, name) for name in cls.TRACKED_FIELDS
+                                   if name in instance.__dict__}
+        return instance
+
+    def save(self, *args, **kwargs):
+        # the post_save handlers (counters, change log...) write in the same transaction as the ticket
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+# label -> choice value lookups of the API, built once
+PRIORITIES = {label: value for value, label in Tickets.PRIORITY_CHOICES}
+STATUSES = {label: value for value, label in Tickets.STATUS_CHOICES}
+TICKET_TYPES = {label: value for value, label in Tickets.TICKET_TYPE_CHOICES}
+
+
+# Cached ticket counts per (project, assigned developer, priority, status, type)
+# kept up to date by the signal handlers in signals.py, in the transaction of the ticket write,
+# so counting does not need to scan Tickets. `manage.py rebuild_ticket_rollup` repairs drift.
+class TicketRollup(models.Model):
+    project = models.ForeignKey(Projects, on_delete=models.CASCADE)
+    priority = EnumField(choices=Tickets.PRIORITY_CHOICES, blank=True, null=True)
+    status = EnumField(choices=Tickets.STATUS_CHOICES, blank=True, null=True)
+    type = EnumField(choices=Tickets.TICKET_TYPE_CHOICES, blank=True, null=True)
+    # assigned developer, no foreign key constraint: the counts of a deleted user are moved by unassign_rollup()
+    users = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['project', 'users', 'priority', 'status', 'type']]
+        constraints = [
+            # NULLs are distinct in unique_together, so the unassigned rows need their own constraint, or two
+            # first writes of a key at the same time could both insert a row (and every update then counts twice)
+            models.UniqueConstraint(fields=['project', 'priority', 'status', 'type'], condition=Q(users__isnull=True),
+                                    name='unique_unassigned_rollup'),
+        ]
 
 
 class ProjectUserRelation(models.Model):
@@ -65,7 +143,158 @@ class ProjectUserRelation(models.Model):
 
     class Meta:
         unique_together = [['user_id', 'project_id']]
+        indexes = [models.Index(fields=['user_id', 'user_role'])]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # the role at load time, for the audit log of role changes
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_role = instance.__dict__.get('user_role')
+        return instance
 
     def __str__(self):
         return str(self.user_id)+" " + str(self.project_id)
 
+
+
+# Inverted index used for ticket search on databases without SQLite FTS5 (see search.py)
+class TicketSearchTerm(models.Model):
+    project = models.ForeignKey(Projects, on_delete=models.CASCADE)
+    ticket = models.ForeignKey(Tickets, on_delete=models.CASCADE)
+    term = models.CharField(max_length=64)
+    weight = models.IntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=['project', 'term'])]
+
+
+# LSH band keys of the tickets' MinHash signatures, for near duplicate lookups (see similar.py)
+class TicketSimilarityKey(models.Model):
+    project = models.ForeignKey(Projects, on_delete=models.CASCADE)
+    ticket = models.ForeignKey(Tickets, on_delete=models.CASCADE)
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['project', 'key'])]
+
+
+# Append only log of ticket writes, read by the delta sync endpoint (TicketChangesView).
+# No foreign keys, so the log also keeps deletes of tickets and projects.
+# Rows older than TICKET_CHANGES_RETENTION_DAYS are deleted by the prune_ticket_changes command.
+class TicketChange(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (CREATED, 'created'),
+        (UPDATED, 'updated'),
+        (DELETED, 'deleted')
+    )
+
+    id = models.BigAutoField(primary_key=True)    # the sync cursor
+    project_id = models.IntegerField()
+    ticket_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    previous_users_id = models.IntegerField(null=True, blank=True)     # the assignee before the change
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['project_id', 'id'])]
+
+
+class TicketEvent(models.Model):
+    # events waiting to be delivered by Users.events.DatabaseBroker, kept for TICKET_EVENTS_RETENTION seconds
+    id = models.BigAutoField(primary_key=True)
+    project_id = models.IntegerField()
+    payload = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['project_id', 'id'])]
+
+
+# Background work queued by Users.jobs.enqueue and run by `python manage.py run_jobs`
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'queued'),
+        (RUNNING, 'running'),
+        (DONE, 'done'),
+        (FAILED, 'failed')
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)     # idempotency key
+    coalesce = models.BooleanField(default=False)   # the key is released when a worker starts the job
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)   # a running job past this is picked up again
+    last_error = models.TextField(blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    user_id = models.IntegerField(null=True, blank=True)   # who queued it, can see its status
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'])]
+
+
+# Checkpoint of a project import (see archive.py). Every chunk of the archive is written in one transaction
+# together with the number of records done, so an interrupted import resumes after its last written chunk.
+class ProjectImport(models.Model):
+    export_id = models.CharField(max_length=32)     # of the archive, a resumed import must read the same one
+    project = models.ForeignKey(Projects, null=True, on_delete=models.SET_NULL)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)   # who started it
+    records = models.IntegerField(default=0)   # archive records (after the header) written
+    members = models.IntegerField(default=0)
+    tickets = models.IntegerField(default=0)
+    user_map = models.JSONField(default=dict)   # user id in the archive -> user id here
+    with_members = models.BooleanField(default=False)   # the member records are imported, see import_project
+    done = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+# Append only audit log of ticket and membership writes (see audit.py): one row per write holding only the
+# fields it changed. No foreign keys, so entries outlive the tickets, users and projects they are about.
+# Kept for AUDIT_LOG_RETENTION_DAYS and compacted by `python manage.py compact_audit_log`.
+class AuditEntry(models.Model):
+    TICKET = 'ticket'
+    MEMBER = 'member'
+    TARGET_CHOICES = (
+        (TICKET, 'ticket'),
+        (MEMBER, 'member')
+    )
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (CREATED, 'created'),
+        (UPDATED, 'updated'),
+        (DELETED, 'deleted')
+    )
+
+    id = models.BigAutoField(primary_key=True)    # the pagination cursor
+    project_id = models.IntegerField()
+    target = EnumField(choices=TARGET_CHOICES)
+    object_id = models.IntegerField()     # ticket id, or user id of a membership
+    action = EnumField(choices=ACTION_CHOICES)
+    actor_id = models.IntegerField(null=True, blank=True)     # user who made the change, None for anonymous/system
+    changes = models.JSONField(default=dict)    # {field: [old, new]} of the changed fields only
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            # timeline of a ticket or membership
+            models.Index(fields=['project_id', 'target', 'object_id', 'id']),
+            # activity feed of a project
+            models.Index(fields=['project_id', 'id']),
+        ]
@@ -0,0 +1,109 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    # cursor is just the ordering values of the last row, made opaque for the client
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def get_page_size(request, default=None, maximum=None):
+    default = default or settings.TICKETS_PAGE_SIZE
+    maximum = maximum or settings.TICKETS_MAX_PAGE_SIZE
+    try:
+        page_size = int(request.query_params.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def keyset_filter(ordering, values):
+    # builds (a > x) OR (a = x AND b > y) OR ... for the given ordering,
+    # '-field' compares with lt instead of gt
+    if len(ordering) != len(values):
+        raise InvalidCursor("Invalid cursor")
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        q = Q(**{'%s__%s' % (name, lookup): values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            q &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= q
+    return condition
+
+
+def to_python(model, field, value):
+    # cursor values are client input, the field validates them before they reach a query
+    try:
+        return model._meta.get_field(field.lstrip('-')).to_python(value)
+    except FieldDoesNotExist:
+        return value
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=100, value=None):
+    """
+    Returns (rows, next_cursor) for one page of queryset ordered by ordering.
+    The last entry of ordering must be unique (normally 'id').
+    value(row, field) gives the ordering values of the last row, for fields the rows do not hold.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            if len(values) == len(ordering):
+                values = [to_python(queryset.model, field, value) for field, value in zip(ordering, values)]
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        except (ValueError, TypeError, ValidationError):
+            # values of the wrong type for their field
+            raise InvalidCursor("Invalid cursor")
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        # rows are model instances or dicts from values()
+        if value is not None:
+            next_cursor = encode_cursor([value(last, field.lstrip('-')) for field in ordering])
+        elif isinstance(last, dict):
+            next_cursor = encode_cursor([last[field.lstrip('-')] for field in ordering])
+        else:
+            next_cursor = encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
+    return rows, next_cursor
+
+
+def stream_ndjson(queryset, serialize, chunk_size=None):
+    # yields newline delimited json, one chunk of rows at a time, without loading the whole queryset
+    chunk_size = chunk_size or settings.TICKETS_STREAM_CHUNK_SIZE
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(json.dumps(serialize(obj), cls=JSONEncoder))
+        if len(chunk) >= chunk_size:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
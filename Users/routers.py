@@ -0,0 +1,89 @@
+import contextvars
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import is_shared_cache
+
+# Read replicas (settings.DATABASE_REPLICAS). Reads go to a random replica only inside requests that
+# ReplicaMiddleware (or the async read API) marked as replica reads: GET/HEAD requests of clients that
+# did not write in the last REPLICA_STICKY_SECONDS. Everything else, all writes, and reads outside of
+# requests (jobs, commands, signals of a write) use the primary.
+# The writes are remembered in REPLICA_STICKY_CACHE, which every process has to share: with a process
+# local cache only anonymous requests read from the replicas.
+
+reads_from_replica = contextvars.ContextVar('reads_from_replica', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reads_from_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+
+def sticky_cache():
+    return caches[settings.REPLICA_STICKY_CACHE]
+
+
+def client_key(authorization, session):
+    # the client is identified by its credentials (hashed, they are secrets) or its session cookie
+    credentials = authorization or session
+    if not credentials:
+        return None
+    return 'replica-sticky:' + hashlib.sha256(credentials.encode('utf-8')).hexdigest()
+
+
+def use_replica(method, key):
+    if not settings.DATABASE_REPLICAS or method not in SAFE_METHODS:
+        return False
+    if key is None:
+        return True
+    # another process may have handled the client's last write if the sticky cache is not shared
+    return is_shared_cache(settings.REPLICA_STICKY_CACHE) and sticky_cache().get(key, 0) < time.time()
+
+
+def stick_to_primary(key):
+    # reads of this client go to the primary until the replicas caught up with its write
+    if key is not None and settings.DATABASE_REPLICAS:
+        sticky_cache().set(key, time.time() + settings.REPLICA_STICKY_SECONDS, settings.REPLICA_STICKY_SECONDS)
+
+
+def check_sticky_cache(app_configs, **kwargs):
+    if settings.DATABASE_REPLICAS and not is_shared_cache(settings.REPLICA_STICKY_CACHE):
+        return [checks.Warning(
+            'REPLICA_STICKY_CACHE (%r) is not shared by the processes' % settings.REPLICA_STICKY_CACHE,
+            hint='Use a database, memcached or redis cache, until then authenticated reads use the primary.',
+            id='Users.W001')]
+    return []
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = client_key(request.META.get('HTTP_AUTHORIZATION'),
+                         request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        token = reads_from_replica.set(use_replica(request.method, key))
+        try:
+            response = self.get_response(request)
+        finally:
+            reads_from_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            stick_to_primary(key)
+        return response
@@ -0,0 +1,204 @@
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Sum, Value, When
+from django.utils.html import escape
+
+from .models import Tickets, TicketSearchTerm
+
+FTS_TABLE = 'Users_ticket_fts'
+TITLE_WEIGHT = 3
+SNIPPET_WORDS = 12
+MAX_QUERY_TERMS = 10
+# private use characters FTS5 puts around the matches, replaced by <b></b> once the snippet is escaped
+MATCH_START, MATCH_END = '\ue000', '\ue001'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token[:64] for token in TOKEN_RE.findall((text or '').lower()) if len(token) > 1]
+
+
+# database name -> whether it has the FTS5 table
+fts5_tables = {}
+
+
+def use_fts5():
+    # SQLite FTS5 when the virtual table exists (created by the migration), the term table otherwise
+    if settings.TICKET_SEARCH_BACKEND == 'terms' or connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in fts5_tables:
+        fts5_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return fts5_tables[name]
+
+
+def highlight(text, terms, words=SNIPPET_WORDS):
+    # a few words of text around the first matching term, HTML escaped, matches wrapped in <b></b>
+    parts = (text or '').split()
+    if not parts:
+        return ''
+    normalized = [' '.join(tokenize(part)) for part in parts]
+    first = next((i for i, part in enumerate(normalized) if any(t in part.split() for t in terms)), 0)
+    start = max(0, first - words // 3)
+    window = parts[start:start + words]
+    snippet = ' '.join('<b>%s</b>' % escape(part) if any(t in tokenize(part) for t in terms) else escape(part)
+                       for part in window)
+    if start > 0:
+        snippet = '...' + snippet
+    if start + words < len(parts):
+        snippet += '...'
+    return snippet
+
+
+def escape_snippet(snippet):
+    # the ticket text of an FTS5 snippet is escaped, then its match markers become <b></b>
+    snippet = escape(snippet or '')
+    return snippet.replace(MATCH_START, '<b>').replace(MATCH_END, '</b>')
+
+
+# Index maintenance
+
+def fts_text(text):
+    # the match markers are kept out of the indexed text, so only FTS5 can put them in a snippet
+    return (text or '').replace(MATCH_START, '').replace(MATCH_END, '')
+
+
+def ticket_terms(ticket):
+    weights = Counter()
+    for term in tokenize(ticket.title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(ticket.description):
+        weights[term] += 1
+    return weights
+
+
+def index_tickets(tickets):
+    tickets = [ticket for ticket in tickets if ticket.id is not None]
+    if not tickets:
+        return
+    ids = [ticket.id for ticket in tickets]
+    with transaction.atomic():
+        if use_fts5():
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (FTS_TABLE, ', '.join(['%s'] * len(ids))), ids)
+                cursor.executemany(
+                    'INSERT INTO %s (rowid, title, description, project_id) VALUES (%%s, %%s, %%s, %%s)' % FTS_TABLE,
+                    [(t.id, fts_text(t.title), fts_text(t.description), t.project_id) for t in tickets])
+        else:
+            TicketSearchTerm.objects.filter(ticket_id__in=ids).delete()
+            TicketSearchTerm.objects.bulk_create([
+                TicketSearchTerm(project_id=ticket.project_id, ticket_id=ticket.id, term=term, weight=weight)
+                for ticket in tickets for term, weight in ticket_terms(ticket).items()
+            ], batch_size=1000)
+
+
+def unindex_tickets(ids):
+    if not ids:
+        return
+    if use_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (FTS_TABLE, ', '.join(['%s'] * len(ids))), ids)
+    else:
+        TicketSearchTerm.objects.filter(ticket_id__in=ids).delete()
+
+
+def rebuild_index(project_id=None, chunk_size=1000):
+    tickets = Tickets.objects.order_by('id').only('id', 'title', 'description', 'project_id')
+    if project_id is not None:
+        tickets = tickets.filter(project_id=project_id)
+
+    with transaction.atomic():
+        if use_fts5():
+            with connection.cursor() as cursor:
+                if project_id is None:
+                    cursor.execute('DELETE FROM %s' % FTS_TABLE)
+                else:
+                    cursor.execute('DELETE FROM %s WHERE project_id = %%s' % FTS_TABLE, [project_id])
+        else:
+            terms = TicketSearchTerm.objects.all()
+            if project_id is not None:
+                terms = terms.filter(project_id=project_id)
+            terms.delete()
+
+        count, chunk = 0, []
+        for ticket in tickets.iterator(chunk_size=chunk_size):
+            chunk.append(ticket)
+            if len(chunk) >= chunk_size:
+                index_tickets(chunk)
+                count += len(chunk)
+                chunk = []
+        index_tickets(chunk)
+    return count + len(chunk)
+
+
+# Searching
+
+def search_tickets(project_id, query, user_id=None, offset=0, limit=20):
+    """
+    Ranked tickets of the project matching every word of query.
+    With user_id only the tickets assigned to that user are searched.
+    Returns a list of (ticket id, score, snippet), best match first.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    if use_fts5():
+        return search_fts5(project_id, terms, user_id, offset, limit)
+    return search_terms(project_id, terms, user_id, offset, limit)
+
+
+def search_fts5(project_id, terms, user_id, offset, limit):
+    # every term quoted, so user input can not use the FTS5 query syntax
+    match = ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+    user_filter = ' AND Users_tickets.users_id = %s' if user_id is not None else ''
+    sql = (
+        'SELECT {fts}.rowid, -bm25({fts}, %s, 1.0) AS score, snippet({fts}, -1, %s, %s, %s, %s) '
+        'FROM {fts} JOIN Users_tickets ON Users_tickets.id = {fts}.rowid '
+        'WHERE {fts} MATCH %s AND Users_tickets.project_id = %s' + user_filter + ' '
+        'ORDER BY score DESC, {fts}.rowid LIMIT %s OFFSET %s'
+    ).format(fts=FTS_TABLE)
+    params = [TITLE_WEIGHT, MATCH_START, MATCH_END, '...', SNIPPET_WORDS, match, project_id]
+    if user_id is not None:
+        params.append(user_id)
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], row[1], escape_snippet(row[2])) for row in cursor.fetchall()]
+
+
+def search_terms(project_id, terms, user_id, offset, limit):
+    # tf-idf over TicketSearchTerm, works on every database
+    rows = TicketSearchTerm.objects.filter(project_id=project_id, term__in=terms)
+    if user_id is not None:
+        rows = rows.filter(ticket__users=user_id)
+
+    document_count = Tickets.objects.filter(project_id=project_id).count() or 1
+    frequencies = dict(rows.order_by().values_list('term').annotate(count=Count('ticket_id', distinct=True)))
+    if len(frequencies) < len(terms):
+        return []
+    idf = {term: math.log(1 + document_count / frequencies[term]) for term in terms}
+
+    score = Sum(Case(*[When(term=term, then=ExpressionWrapper(F('weight') * Value(idf[term]),
+                                                               output_field=FloatField()))
+                       for term in terms], output_field=FloatField()))
+    hits = list(rows.order_by().values('ticket_id')
+                .annotate(matched=Count('term', distinct=True), score=score)
+                .filter(matched=len(terms))
+                .order_by('-score', 'ticket_id')[offset:offset + limit])
+
+    texts = dict((t.id, t) for t in Tickets.objects.filter(id__in=[hit['ticket_id'] for hit in hits])
+                 .only('id', 'title', 'description'))
+    results = []
+    for hit in hits:
+        ticket = texts[hit['ticket_id']]
+        if any(term in tokenize(ticket.description) for term in terms):
+            snippet = highlight(ticket.description, terms)
+        else:
+            snippet = highlight(ticket.title, terms)
+        results.append((hit['ticket_id'], hit['score'], snippet))
+    return results
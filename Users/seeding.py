@@ -0,0 +1,112 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .models import Projects, ProjectUserRelation, ProjectVersion, Tickets
+from .search import rebuild_index
+from .similar import rebuild_signatures
+from .stats import rebuild_rollup
+
+# roughly what a real tracker looks like: mostly low priority, mostly closed, mostly bugs
+PRIORITY_WEIGHTS = {'Low': 5, 'Medium': 3, 'High': 1, None: 1}
+STATUS_WEIGHTS = {'Open': 3, 'Closed': 7, None: 0.2}
+TYPE_WEIGHTS = {'Bug/Error': 6, 'Feature/Request': 3, 'Others': 1, None: 0.5}
+
+WORDS = ('login page crash error timeout export import button dashboard report user project ticket email '
+         'password search filter sort slow blank screen mobile layout broken missing update delete save '
+         'upload download notification settings permission admin developer api response').split()
+
+BATCH_SIZE = 2000
+SEED_PASSWORD = 'password'
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def seed_data(users=100, projects=10, members=5, tickets=10000, seed=0, stdout=None):
+    """
+    Inserts a reproducible synthetic data set (same arguments -> same rows) with bulk inserts.
+    Project sizes follow a power law, every project has one Admin and up to <members> Developers.
+    Every user gets a token and the password 'password'.
+    Returns a dict with the ids of what was created.
+    """
+    rng = random.Random(seed)
+    prefix = 'seed%d_' % seed
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    with transaction.atomic():
+        # hashing once, every seeded user shares the same password
+        password = make_password(SEED_PASSWORD)
+        User.objects.bulk_create([
+            User(username='%suser%d' % (prefix, i), email='%suser%d@example.com' % (prefix, i),
+                 first_name='User', last_name=str(i), password=password)
+            for i in range(users)
+        ], batch_size=BATCH_SIZE)
+        user_ids = list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+        Token.objects.bulk_create([Token(user_id=user_id, key='%040x' % rng.getrandbits(160))
+                                   for user_id in user_ids], batch_size=BATCH_SIZE)
+        log('Created %d users' % len(user_ids))
+
+        Projects.objects.bulk_create([
+            Projects(name='%sproject %d' % (prefix, i), description=sentence(rng, 5, 15),
+                     ticket_form_key='%010x' % rng.getrandbits(40))
+            for i in range(projects)
+        ], batch_size=BATCH_SIZE)
+        project_ids = list(Projects.objects.filter(name__startswith=prefix).order_by('id')
+                           .values_list('id', flat=True))
+        ProjectVersion.objects.bulk_create([ProjectVersion(project_id=project_id) for project_id in project_ids],
+                                           batch_size=BATCH_SIZE)
+
+        relations, admins, developers = [], {}, {}
+        for project_id in project_ids:
+            team = rng.sample(user_ids, min(len(user_ids), members + 1))
+            admins[project_id] = team[0]
+            developers[project_id] = team[1:]
+            relations.append(ProjectUserRelation(user_id_id=team[0], project_id_id=project_id, user_role='Admin'))
+            relations += [ProjectUserRelation(user_id_id=user_id, project_id_id=project_id, user_role='Developer')
+                          for user_id in team[1:]]
+        ProjectUserRelation.objects.bulk_create(relations, batch_size=BATCH_SIZE)
+        log('Created %d projects with %d memberships' % (len(project_ids), len(relations)))
+
+        # power law project sizes: a few huge projects, many small ones
+        sizes = [1.0 / (rank + 1) for rank in range(len(project_ids))]
+        batch, created = [], 0
+        for i in range(tickets):
+            project_id = rng.choices(project_ids, sizes)[0]
+            batch.append(Tickets(
+                title=sentence(rng, 2, 8)[:100],
+                description=sentence(rng, 0, 60)[:500] or None,
+                priority=weighted(rng, PRIORITY_WEIGHTS),
+                status=weighted(rng, STATUS_WEIGHTS),
+                type=weighted(rng, TYPE_WEIGHTS),
+                project_id=project_id,
+                users_id=rng.choice(developers[project_id]) if developers[project_id] and rng.random() < 0.7
+                else None,
+            ))
+            if len(batch) >= BATCH_SIZE:
+                Tickets.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        Tickets.objects.bulk_create(batch)
+        created += len(batch)
+        log('Created %d tickets' % created)
+
+    # bulk inserts do not send signals, so the derived tables are rebuilt
+    for project_id in project_ids:
+        rebuild_rollup(project_id)
+        rebuild_index(project_id)
+        rebuild_signatures(project_id)
+    log('Rebuilt ticket rollup, search index and near duplicate keys')
+
+    return {'users': user_ids, 'projects': project_ids, 'admins': admins, 'developers': developers}
@@ -1,10 +1,37 @@
+import json
+
 from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.utils import encoders
 from .models import Projects, Tickets
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
+from .metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Serializers below record the time spent building .data in the request metrics (see metrics.py)
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(max_length=200)
     password = serializers.CharField(max_length=100, write_only=True)
     email = serializers.EmailField(max_length=255)
@@ -14,10 +41,10 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'first_name', 'last_name', 'email', 'password']
+        list_serializer_class = TimedListSerializer
 
     def validate(self, attrs):
         if User.objects.filter(email=attrs['email']).exists():
-            print("email exists")
             raise serializers.ValidationError({'email', 'Email is already in use'})
         return super().validate(attrs)
 
@@ -27,15 +54,103 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Projects
         fields = ['id', 'name', 'description', 'ticket_form_key']
+        list_serializer_class = TimedListSerializer
+
 
+# Project as seen by one of its users, built from the annotations made in UserProjects.get
+class UserProjectSerializer(ProjectSerializer):
+    user_role = serializers.CharField(read_only=True)
+    open_tickets = serializers.IntegerField(read_only=True)
 
-class TicketSerializer(serializers.ModelSerializer):
+    class Meta(ProjectSerializer.Meta):
+        fields = ProjectSerializer.Meta.fields + ['user_role', 'open_tickets']
+
+
+class TicketSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tickets
-        fields = '__all__'
+        exclude = ['content_hash']
+        list_serializer_class = TimedListSerializer
+
+
+# Read-only fast path for ticket lists: rows come from values() and only the fields that need it
+# are converted, with functions picked once from TicketSerializer's own fields, instead of building a
+# model instance and running every DRF field for every row. Same output as TicketSerializer(many=True).data.
+TICKET_FIELDS = list(TicketSerializer().fields)
+
+
+def ticket_values(queryset):
+    # 'project' and 'users' come out as ids, like the PrimaryKeyRelatedFields of TicketSerializer
+    return queryset.values(*TICKET_FIELDS)
+
+
+# User summaries of the admin user listing, the user lookup and the assignees side-loaded into ticket lists,
+# read with values() so the password hash and the rest of the row are not loaded
+USER_SUMMARY_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email')
+
+
+def user_values(queryset):
+    return queryset.values(*USER_SUMMARY_FIELDS)
+
+
+def user_summaries(ids):
+    # the users with these ids in one query, in the order of ids; unknown ids are left out
+    users = {row['id']: row for row in user_values(User.objects.filter(id__in=set(ids)))}
+    return [users[user_id] for user_id in dict.fromkeys(ids) if user_id in users]
+
+
+def ticket_converters():
+    converters = []
+    current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+    for name, field in TicketSerializer().fields.items():
+        if isinstance(field, serializers.DateTimeField):
+            if getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601 and current_timezone is not None:
+                converters.append((name, iso_datetime(current_timezone)))
+            else:
+                converters.append((name, field.to_representation))
+        elif isinstance(field, serializers.ChoiceField):
+            # stored values are returned as they are unless a choice is not a string
+            if not all(isinstance(choice, str) for choice in field.choices):
+                converters.append((name, field.to_representation))
+        elif not isinstance(field, (serializers.CharField, serializers.IntegerField,
+                                    serializers.PrimaryKeyRelatedField)):
+            converters.append((name, field.to_representation))
+    return converters
+
+
+def iso_datetime(current_timezone):
+    # DateTimeField.to_representation for aware datetimes and the ISO 8601 format
+    def convert(value):
+        value = value.astimezone(current_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def serialize_ticket_values(rows):
+    converters = ticket_converters()
+    data = []
+    with timed_serialization():
+        for row in rows:
+            for name, convert in converters:
+                value = row[name]
+                if value is not None:
+                    row[name] = convert(value)
+            data.append(row)
+    return data
+
+
+def render_json(data):
+    # same bytes as DRF's JSONRenderer, with orjson when it is installed
+    with timed_serialization():
+        if orjson is not None:
+            content = orjson.dumps(data)
+        else:
+            content = json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False,
+                                 separators=(',', ':')).encode('utf-8')
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,164 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .audit import member_changes, record_audit, ticket_changes
+from .authentication import invalidate_token
+from .conditional import bump_project_version
+from .events import publish_ticket_events, ticket_event
+from .intake import form_keys
+from .jobs import enqueue
+from .membership import invalidate_memberships, memberships_cache
+from .models import AuditEntry, Projects, ProjectUserRelation, ProjectVersion, TicketChange, Tickets
+from .search import unindex_tickets
+from .stats import apply_rollup_delta, rollup_key, unassign_rollup
+from .sync import record_changes
+
+
+# fields read by the search index and the near duplicate keys
+INDEXED_FIELDS = ('title', 'description', 'project_id')
+
+
+def loaded_values(ticket):
+    return getattr(ticket, '_loaded_values', {})
+
+
+@receiver(post_save, sender=Tickets)
+def ticket_saved(sender, instance, created, **kwargs):
+    old = loaded_values(instance)
+    new = {field: getattr(instance, field) for field in Tickets.TRACKED_FIELDS}
+    if not created and old:
+        old_key, new_key = rollup_key(old), rollup_key(new)
+        if old_key != new_key or old['project_id'] != new['project_id']:
+            apply_rollup_delta(old['project_id'], old_key, -1)
+            apply_rollup_delta(new['project_id'], new_key, 1)
+    elif created:
+        apply_rollup_delta(instance.project_id, rollup_key(new), 1)
+    if created or old:
+        record_audit(instance.project_id, AuditEntry.TICKET, AuditEntry.CREATED if created else AuditEntry.UPDATED,
+                     [(instance.id, ticket_changes({} if created else old, new))])
+    instance._loaded_values = new
+    # the search index and the near duplicate keys are updated by a background job, when their fields changed;
+    # saves made before the job starts share it
+    if created or not old or any(old[field] != new[field] for field in INDEXED_FIELDS):
+        enqueue('index_tickets', [instance.id], key='index_tickets:%d' % instance.id, coalesce=True)
+    previous_users = {instance.id: old['users_id']} if not created and old else None
+    if not created and old and old['project_id'] != instance.project_id:
+        record_changes(old['project_id'], [instance.id], TicketChange.DELETED, previous_users)
+        record_changes(instance.project_id, [instance.id], TicketChange.CREATED)
+    else:
+        record_changes(instance.project_id, [instance.id], TicketChange.CREATED if created else TicketChange.UPDATED,
+                       previous_users)
+    bump_project_version(*{instance.project_id, old.get('project_id', instance.project_id)})
+    publish_saved_ticket(instance, created, old)
+
+
+def publish_saved_ticket(instance, created, old):
+    if created or not old:
+        publish_ticket_events(instance.project_id, lambda: [ticket_event('created' if created else 'updated', instance)])
+        return
+    if old['project_id'] != instance.project_id:
+        publish_ticket_events(old['project_id'], lambda: [dict(ticket_event('deleted', instance),
+                                                               project=old['project_id'])])
+        publish_ticket_events(instance.project_id, lambda: [ticket_event('created', instance)])
+        return
+
+    def make_events():
+        events = [ticket_event('updated', instance, previous_users=old['users_id'])]
+        if old['users_id'] != instance.users_id:
+            events.append(ticket_event('assigned', instance, previous_users=old['users_id']))
+        return events
+    publish_ticket_events(instance.project_id, make_events)
+
+
+@receiver(post_delete, sender=Tickets)
+def ticket_deleted(sender, instance, **kwargs):
+    values = {field: getattr(instance, field) for field in Tickets.TRACKED_FIELDS}
+    apply_rollup_delta(instance.project_id, rollup_key(values), -1)
+    record_audit(instance.project_id, AuditEntry.TICKET, AuditEntry.DELETED,
+                 [(instance.id, ticket_changes(values, {}))])
+    unindex_tickets([instance.id])
+    record_changes(instance.project_id, [instance.id], TicketChange.DELETED, {instance.id: instance.users_id})
+    bump_project_version(instance.project_id)
+    publish_ticket_events(instance.project_id, lambda: [ticket_event('deleted', instance)])
+
+
+@receiver(post_save, sender=Projects)
+def project_saved(sender, instance, created, **kwargs):
+    # the version row of the ETags of the project, bumped by every later write
+    if created:
+        ProjectVersion.objects.create(project=instance)
+
+
+@receiver(post_save, sender=Projects)
+@receiver(post_delete, sender=Projects)
+def project_changed(sender, instance, **kwargs):
+    # the intake resolves form keys through a cache
+    form_keys.delete(instance.ticket_form_key)
+
+
+@receiver(post_save, sender=ProjectUserRelation)
+@receiver(post_delete, sender=ProjectUserRelation)
+def relation_changed(sender, instance, **kwargs):
+    invalidate_memberships(instance.user_id_id)
+
+
+def audit_relation(instance, action, old_role, new_role):
+    if instance.project_id_id is not None and instance.user_id_id is not None:
+        record_audit(instance.project_id_id, AuditEntry.MEMBER, action,
+                     [(instance.user_id_id, member_changes(old_role, new_role))])
+
+
+@receiver(post_save, sender=ProjectUserRelation)
+def relation_saved(sender, instance, created, **kwargs):
+    if created:
+        audit_relation(instance, AuditEntry.CREATED, None, instance.user_role)
+    elif hasattr(instance, '_loaded_role'):
+        audit_relation(instance, AuditEntry.UPDATED, instance._loaded_role, instance.user_role)
+    instance._loaded_role = instance.user_role
+
+
+@receiver(post_delete, sender=ProjectUserRelation)
+def relation_deleted(sender, instance, **kwargs):
+    audit_relation(instance, AuditEntry.DELETED, instance.user_role, None)
+
+
+@receiver(m2m_changed, sender=Projects.project_users.through)
+def project_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # project.project_users.add(...) bulk inserts relations without sending post_save
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        invalidate_memberships(instance.pk)
+    elif pk_set:
+        invalidate_memberships(*pk_set)
+    else:
+        # clear() does not tell which users were removed
+        memberships_cache.clear()
+
+
+# cached tokens (see authentication.py) are dropped on login/logout and when their user changes
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+            invalidate_token(key)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # runs in the transaction of the delete, before SET_NULL unassigns the user's tickets without signals
+    unassign_rollup(instance.id)
+    unassigned = {}
+    for project_id, ticket_id in Tickets.objects.filter(users=instance).values_list('project_id', 'id'):
+        unassigned.setdefault(project_id, []).append(ticket_id)
+    for project_id, ticket_ids in unassigned.items():
+        record_changes(project_id, ticket_ids, TicketChange.UPDATED, dict.fromkeys(ticket_ids, instance.id))
+    bump_project_version(*unassigned)
@@ -0,0 +1,116 @@
+import hashlib
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import TicketSimilarityKey, Tickets
+from .search import tokenize
+
+# Near duplicate tickets with MinHash and locality sensitive hashing.
+# The words and word pairs of a ticket's title and description are its shingles. MINHASH_BANDS * MINHASH_ROWS
+# min hashes of the shingles are split in bands, and each band is stored as one TicketSimilarityKey row.
+# Tickets sharing a band key are candidates (likely when their shingles overlap by half or more), the
+# candidates are then ranked by the exact Jaccard similarity of their shingles. A lookup is a handful of
+# indexed equality matches, whatever the size of the project.
+
+MINHASH_BANDS = 12
+MINHASH_ROWS = 3
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def make_permutations(count, seed=0):
+    # seeded, so the stored keys stay valid across processes
+    rng = random.Random(seed)
+    return [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME)) for _ in range(count)]
+
+
+permutations = make_permutations(MINHASH_BANDS * MINHASH_ROWS)
+
+
+def hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def shingles(title, description):
+    words = tokenize(title) + tokenize(description)
+    return set(words) | {a + ' ' + b for a, b in zip(words, words[1:])}
+
+
+def band_keys(shingle_set):
+    if not shingle_set:
+        return []
+    hashes = [hash64(shingle) & MERSENNE_PRIME for shingle in shingle_set]
+    signature = [min((a * x + b) % MERSENNE_PRIME for x in hashes) for a, b in permutations]
+    return [hash64('%d:%s' % (band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))
+            for band in range(MINHASH_BANDS)]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+# Index maintenance
+
+def index_signatures(tickets):
+    tickets = [ticket for ticket in tickets if ticket.id is not None]
+    if not tickets:
+        return
+    with transaction.atomic():
+        TicketSimilarityKey.objects.filter(ticket_id__in=[ticket.id for ticket in tickets]).delete()
+        TicketSimilarityKey.objects.bulk_create([
+            TicketSimilarityKey(project_id=ticket.project_id, ticket_id=ticket.id, key=key)
+            for ticket in tickets for key in band_keys(shingles(ticket.title, ticket.description))
+        ], batch_size=1000)
+
+
+def rebuild_signatures(project_id=None, chunk_size=1000):
+    tickets = Tickets.objects.order_by('id').only('id', 'title', 'description', 'project_id')
+    keys = TicketSimilarityKey.objects.all()
+    if project_id is not None:
+        tickets = tickets.filter(project_id=project_id)
+        keys = keys.filter(project_id=project_id)
+
+    with transaction.atomic():
+        keys.delete()
+        count, chunk = 0, []
+        for ticket in tickets.iterator(chunk_size=chunk_size):
+            chunk.append(ticket)
+            if len(chunk) >= chunk_size:
+                index_signatures(chunk)
+                count += len(chunk)
+                chunk = []
+        index_signatures(chunk)
+    return count + len(chunk)
+
+
+# Lookups
+
+def similar_tickets(project_id, title, description, exclude=None, user_id=None, limit=5):
+    """
+    Tickets of the project that look like a duplicate of title/description, as a list of
+    (ticket id, similarity) with a similarity of at least SIMILAR_TICKETS_THRESHOLD, most similar first.
+    With user_id only the tickets assigned to that user are returned.
+    """
+    shingle_set = shingles(title, description)
+    keys = band_keys(shingle_set)
+    if not keys:
+        return []
+    rows = TicketSimilarityKey.objects.filter(project_id=project_id, key__in=keys)
+    if exclude is not None:
+        rows = rows.exclude(ticket_id=exclude)
+    if user_id is not None:
+        rows = rows.filter(ticket__users=user_id)
+    # the tickets sharing the most bands are the most likely duplicates
+    candidates = [row['ticket_id'] for row in rows.order_by().values('ticket_id').annotate(bands=Count('key'))
+                  .order_by('-bands', 'ticket_id')[:settings.SIMILAR_TICKETS_MAX_CANDIDATES]]
+
+    similar = []
+    for ticket_id, candidate_title, candidate_description in Tickets.objects.filter(id__in=candidates) \
+            .values_list('id', 'title', 'description'):
+        similarity = jaccard(shingle_set, shingles(candidate_title, candidate_description))
+        if similarity >= settings.SIMILAR_TICKETS_THRESHOLD:
+            similar.append((ticket_id, round(similarity, 3)))
+    similar.sort(key=lambda hit: (-hit[1], hit[0]))
+    return similar[:limit]
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from .authentication import CachedTokenAuthentication
+from .events import TooManySubscribers, get_broker
+from .membership import get_role
+from .sync import changes_cursor, latest_change_id
+
+EVENTS_PATH = re.compile(r'^/api/user/project/(?P<project_id>\d+)/events/$')
+
+
+def authorize(headers, query_string, project_id):
+    # (user_id, role, error), the token comes from the Authorization header or ?token=
+    # (browsers' EventSource can not send headers)
+    key = None
+    authorization = headers.get(b'authorization', b'').decode('latin-1').split()
+    if len(authorization) == 2 and authorization[0].lower() == 'token':
+        key = authorization[1]
+    if key is None:
+        key = parse_qs(query_string.decode('latin-1')).get('token', [None])[0]
+    if not key:
+        return None, None, (401, 'Authentication credentials were not provided.')
+    close_old_connections()
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+        role = get_role(user.id, project_id)
+        if role is None:
+            return None, None, (404, 'Project Does not Exist')
+        return user.id, role, None
+    except AuthenticationFailed as e:
+        return None, None, (401, str(e.detail))
+    finally:
+        close_old_connections()
+
+
+def current_role(user_id, project_id):
+    close_old_connections()
+    try:
+        return get_role(user_id, project_id)
+    finally:
+        close_old_connections()
+
+
+def current_cursor(project_id):
+    close_old_connections()
+    try:
+        since = timezone.now()
+        return changes_cursor(latest_change_id(project_id), since)
+    finally:
+        close_old_connections()
+
+
+def format_event(name, data):
+    return ('event: %s\ndata: %s\n\n' % (name, json.dumps(data, cls=JSONEncoder))).encode()
+
+
+async def send_error(send, status, message):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': message}).encode()})
+
+
+async def ticket_events(scope, receive, send, project_id):
+    """
+    Server-sent events of the tickets of a project: created, updated, assigned and deleted.
+    The first event, 'ready', carries a changes cursor; a client that reconnects or gets an
+    'overflow' event catches up with /ticket/changes/?cursor=... and subscribes again.
+    The role of the user is checked again every TICKET_EVENTS_ROLE_CHECK_INTERVAL seconds, a user who
+    left the project gets a 'revoked' event and the stream ends.
+    """
+    headers = dict(scope['headers'])
+    user_id, role, error = await sync_to_async(authorize)(headers, scope['query_string'], project_id)
+    if error:
+        await send_error(send, *error)
+        return
+
+    broker = get_broker()
+    try:
+        subscription = broker.subscribe(project_id, user_id, admin=role == 'Admin')
+    except TooManySubscribers:
+        await send_error(send, 503, 'Too many subscribers, try again later')
+        return
+
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        # subscribed before reading the cursor, so no change falls in between
+        cursor = await sync_to_async(current_cursor)(project_id)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': format_event('ready', {'cursor': cursor}),
+                    'more_body': True})
+
+        loop = asyncio.get_running_loop()
+        checked_at = loop.time()
+        while True:
+            check_in = checked_at + settings.TICKET_EVENTS_ROLE_CHECK_INTERVAL - loop.time()
+            next_events = asyncio.ensure_future(subscription.next_events())
+            done, _ = await asyncio.wait({next_events, disconnected},
+                                         timeout=max(0, min(settings.TICKET_EVENTS_KEEPALIVE, check_in)),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                if disconnected.result()['type'] == 'http.disconnect':
+                    next_events.cancel()
+                    return
+                disconnected = asyncio.ensure_future(receive())
+            if loop.time() - checked_at >= settings.TICKET_EVENTS_ROLE_CHECK_INTERVAL:
+                # before sending anything more: removed developers and demoted admins lose their events
+                checked_at = loop.time()
+                role = await sync_to_async(current_role)(user_id, project_id)
+                if role is None:
+                    next_events.cancel()
+                    await send({'type': 'http.response.body',
+                                'body': format_event('revoked', {'detail': 'No longer a member of the project'})})
+                    return
+                subscription.admin = role == 'Admin'
+            if next_events not in done:
+                next_events.cancel()
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+
+            body = b''.join(format_event(event['type'], event) for event in next_events.result())
+            if subscription.overflowed:
+                body += format_event('overflow', {'detail': 'Too many pending events, resync with the cursor'})
+                await send({'type': 'http.response.body', 'body': body})
+                return
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
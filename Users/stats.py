@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Tickets, TicketRollup
+
+# ticket counts are kept per project and per assigned developer (users_id, None when unassigned)
+ROLLUP_KEY = ('priority', 'status', 'type', 'users_id')
+
+
+def rollup_enabled():
+    return getattr(settings, 'TICKET_ROLLUP_ENABLED', True)
+
+
+def count_tickets(tickets, by):
+    # single GROUP BY over the given queryset
+    return list(tickets.order_by().values(*by).annotate(count=Count('id')).order_by(*by))
+
+
+def count_project_tickets(project_id, by, user_id=None):
+    # same result as count_tickets(Tickets.objects.filter(project=project_id), by), read from the rollup table.
+    # With user_id only the tickets assigned to that user are counted.
+    rows = TicketRollup.objects.filter(project_id=project_id, count__gt=0)
+    if user_id is not None:
+        rows = rows.filter(users_id=user_id)
+    return list(rows.values(*by).annotate(count=Sum('count')).order_by(*by))
+
+
+def project_stats(project_id, user_id=None):
+    """
+    Ticket counts of a project for dashboards: the total, {value: count} by status, priority and type,
+    and the total and open tickets of every developer (user None for the unassigned tickets).
+    With user_id only the tickets assigned to that user are counted.
+    """
+    if rollup_enabled():
+        rows = count_project_tickets(project_id, ROLLUP_KEY, user_id=user_id)
+    else:
+        tickets = Tickets.objects.filter(project_id=project_id)
+        if user_id is not None:
+            tickets = tickets.filter(users=user_id)
+        rows = count_tickets(tickets, ROLLUP_KEY)
+
+    stats = {'total': 0, 'status': {}, 'priority': {}, 'type': {}}
+    developers = {}
+    for row in rows:
+        stats['total'] += row['count']
+        for field in ('status', 'priority', 'type'):
+            stats[field][row[field]] = stats[field].get(row[field], 0) + row['count']
+        developer = developers.setdefault(row['users_id'], {'user': row['users_id'], 'total': 0, 'open': 0})
+        developer['total'] += row['count']
+        if row['status'] == 'Open':
+            developer['open'] += row['count']
+    stats['developers'] = sorted(developers.values(), key=lambda developer: (developer['user'] is None,
+                                                                             developer['user'] or 0))
+    return stats
+
+
+def open_tickets_count():
+    # annotation of a Projects queryset with the number of open tickets of every project
+    if not rollup_enabled():
+        return Count('tickets', filter=Q(tickets__status='Open'))
+    totals = TicketRollup.objects.filter(project=OuterRef('pk'), status='Open').order_by() \
+        .values('project').annotate(total=Sum('count')).values('total')
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def assigned_users(project_id, user_ids):
+    # the users of user_ids who have at least one ticket of the project assigned
+    if rollup_enabled():
+        rows = TicketRollup.objects.filter(project_id=project_id, users_id__in=user_ids, count__gt=0)
+    else:
+        rows = Tickets.objects.filter(project_id=project_id, users__in=user_ids)
+    return set(rows.order_by().values_list('users_id', flat=True).distinct())
+
+
+def rollup_key(values):
+    return tuple(values.get(field) for field in ROLLUP_KEY)
+
+
+def apply_rollup_delta(project_id, key, delta):
+    if not delta or not rollup_enabled():
+        return
+    lookup = dict(zip(ROLLUP_KEY, key))
+    with transaction.atomic():
+        updated = TicketRollup.objects.filter(project_id=project_id, **lookup).update(count=F('count') + delta)
+        # nothing to decrement (e.g. the project and its rollup rows are being deleted)
+        if not updated and delta > 0:
+            # the unique constraints make a concurrent insert of the same key fail, get_or_create then reads
+            # the row the other transaction inserted
+            row, _ = TicketRollup.objects.get_or_create(project_id=project_id, defaults={'count': 0}, **lookup)
+            TicketRollup.objects.filter(id=row.id).update(count=F('count') + delta)
+
+
+def unassign_rollup(user_id):
+    # the tickets of a deleted user are unassigned by SET_NULL, which sends no signal, so their counts
+    # are moved to the unassigned rows here
+    for row in TicketRollup.objects.filter(users_id=user_id, count__gt=0):
+        apply_rollup_delta(row.project_id, (row.priority, row.status, row.type, None), row.count)
+    TicketRollup.objects.filter(users_id=user_id).delete()
+
+
+def rebuild_rollup(project_id=None, dry_run=False):
+    """
+    Recounts the rollup table from Tickets, for one project or all of them, and repairs the rows that
+    drifted (nothing is written with dry_run). Returns the drifted rows as
+    (project_id, priority, status, type, users_id, stored count, actual count).
+    """
+    tickets = Tickets.objects.all()
+    rollups = TicketRollup.objects.all()
+    if project_id is not None:
+        tickets = tickets.filter(project_id=project_id)
+        rollups = rollups.filter(project_id=project_id)
+    fields = ('project_id',) + ROLLUP_KEY
+
+    with transaction.atomic():
+        actual = {tuple(row[field] for field in fields): row['count'] for row in count_tickets(tickets, fields)}
+        # key -> (row ids, total count), several rows of one key are merged
+        stored = {}
+        for row in rollups.select_for_update().values('id', 'count', *fields):
+            ids, count = stored.get(tuple(row[field] for field in fields), ([], 0))
+            stored[tuple(row[field] for field in fields)] = (ids + [row['id']], count + row['count'])
+
+        drift = []
+        for key in set(actual) | set(stored):
+            ids, count = stored.get(key, ([], 0))
+            if count != actual.get(key, 0):
+                drift.append((key, ids, count, actual.get(key, 0)))
+        if drift and not dry_run:
+            TicketRollup.objects.filter(id__in=[row_id for _, ids, _, _ in drift for row_id in ids]).delete()
+            TicketRollup.objects.bulk_create([TicketRollup(count=count, **dict(zip(fields, key)))
+                                              for key, _, _, count in drift if count], batch_size=500)
+    return sorted((key + (stored_count, count) for key, _, stored_count, count in drift), key=str)
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import TicketChange
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def record_changes(project_id, ticket_ids, action, previous_users=None):
+    # previous_users is {ticket id: assignee before the change}, for the tickets whose assignee is known
+    previous_users = previous_users or {}
+    TicketChange.objects.bulk_create([
+        TicketChange(project_id=project_id, ticket_id=ticket_id, action=action,
+                     previous_users_id=previous_users.get(ticket_id))
+        for ticket_id in ticket_ids
+    ], batch_size=1000)
+
+
+def latest_change_id(project_id):
+    return TicketChange.objects.filter(project_id=project_id).aggregate(last=Max('id'))['last'] or 0
+
+
+def changes_since(project_id, after_id, limit):
+    """
+    Changes of the project after the change id after_id, at most limit of them.
+    Several changes of the same ticket are collapsed into the last one.
+    Returns ({ticket_id: action}, {ticket_id: assignees before the changes}, id of the last change read,
+    time from which on the changes not read yet were made, whether there are more changes).
+    """
+    changes = list(TicketChange.objects.filter(project_id=project_id, id__gt=after_id)
+                   .order_by('id').values_list('id', 'ticket_id', 'action', 'previous_users_id',
+                                               'created_at')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest, previous_users = {}, {}
+    for change_id, ticket_id, action, previous_user_id, created_at in changes:
+        previous_users.setdefault(ticket_id, set()).add(previous_user_id)
+        if action != TicketChange.DELETED and latest.get(ticket_id) == TicketChange.CREATED:
+            # created and then updated within the window is still a create for the client
+            continue
+        latest[ticket_id] = action
+    last_id, since = (changes[-1][0], changes[-1][4]) if changes else (after_id, timezone.now())
+    return latest, previous_users, last_id, since, has_more
+
+
+# Sync cursors are [last change id, since] or, while the snapshot of the tickets is paged,
+# [last change id, since, last ticket id]. since (a UNIX time) is when the changes after the cursor start,
+# a cursor older than the retention of the change log may have missed pruned changes.
+
+def changes_cursor(last_id, since, after_ticket_id=None):
+    values = [last_id, int(since.timestamp())]
+    if after_ticket_id is not None:
+        values.append(after_ticket_id)
+    return encode_cursor(values)
+
+
+def read_changes_cursor(cursor):
+    # (last change id, since, last ticket id of the snapshot or None)
+    values = decode_cursor(cursor)
+    if len(values) not in (2, 3) or not all(isinstance(value, int) for value in values):
+        raise InvalidCursor("Invalid cursor")
+    since = datetime.fromtimestamp(values[1], timezone.utc)
+    return values[0], since, values[2] if len(values) == 3 else None
+
+
+def cursor_expired(since):
+    days = settings.TICKET_CHANGES_RETENTION_DAYS
+    return days is not None and since < timezone.now() - timedelta(days=days)
+
+
+def prune_changes(retention_days=None, batch_size=1000):
+    """
+    Deletes the changes older than retention_days (TICKET_CHANGES_RETENTION_DAYS by default, None keeps
+    everything). Returns the number of changes deleted.
+    """
+    retention_days = settings.TICKET_CHANGES_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days is None:
+        return 0
+    expired = TicketChange.objects.filter(created_at__lt=timezone.now() - timedelta(days=retention_days))
+    deleted = 0
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += TicketChange.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,23 @@
+from .bulk import release_developers
+from .jobs import job
+from .models import Tickets
+from .search import index_tickets
+from .similar import index_signatures
+
+
+# Jobs run by `python manage.py run_jobs`, queued with Users.jobs.enqueue('<name>', ...)
+
+@job('release_developers')
+def release_developers_job(project_id, user_ids):
+    # developers who no longer have a ticket in the project stop being members of it
+    release_developers(project_id, user_ids)
+
+
+@job('index_tickets')
+def index_tickets_job(ticket_ids):
+    # search index and near duplicate keys; tickets deleted in the meantime are skipped,
+    # their index rows went with the delete
+    tickets = list(Tickets.objects.filter(id__in=ticket_ids).only('id', 'title', 'description', 'project_id'))
+    index_tickets(tickets)
+    index_signatures(tickets)
+    return len(ticket_ids)
@@ -1,7 +1,1122 @@
-from django.test import TestCase, Client
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from BugTracker import asgi
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, connection, connections, router, \
+    transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
 
-user1 = Client()
-user1.post('/signup', {''})
+from .archive import InvalidArchive, import_project
+from .audit import acting_as, compact_audit_log
+from .authentication import local_tokens, shared_cache_ttl
+from .bulk import insert_tickets
+from .membership import get_role, memberships_cache
+from .metrics import registry
+from .routers import ReplicaMiddleware, check_sticky_cache, reads_from_replica
+from .sse import ticket_events
+from .async_api import match_route, read_api
+from .events import get_broker
+from .intake import IntakeBuffer, client_ip, form_keys, ip_limiter, key_limiter, write_reports
+from .jobs import claim_jobs, enqueue, job, run_job
+from .models import AuditEntry, Job, Projects, ProjectUserRelation, ProjectVersion, TicketChange, TicketRollup, \
+    Tickets
+from .pagination import encode_cursor
+from .serializers import TicketSerializer, render_json, serialize_ticket_values, ticket_values
+from .stats import apply_rollup_delta, rebuild_rollup
 
+
+def create_user(username):
+    user = User.objects.create_user(username=username, email=username + '@example.com', password='password')
+    token = Token.objects.create(user=user)
+    return user, token
+
+
+def create_project(user, name, role='Admin'):
+    project = Projects.objects.create(name=name, description=name)
+    ProjectUserRelation.objects.create(user_id=user, project_id=project, user_role=role)
+    return project
+
+
+class BaseTestCase(APITestCase):
+    def setUp(self):
+        # rolled back rows do not send signals, so drop anything cached by a previous test
+        memberships_cache.clear()
+        local_tokens.clear()
+        cache.clear()
+
+
+class UserProjectsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, token = create_user('member')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/user/project')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_role_and_open_ticket_count(self):
+        project = create_project(self.user, 'first', role='Developer')
+        Tickets.objects.create(title='a', project=project, status='Open')
+        Tickets.objects.create(title='b', project=project, status='Open')
+        Tickets.objects.create(title='c', project=project, status='Closed')
+        other, _ = create_user('other')
+        create_project(other, 'not mine')
+
+        _, data = self.count_queries()
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], project.id)
+        self.assertEqual(data[0]['user_role'], 'Developer')
+        self.assertEqual(data[0]['open_tickets'], 2)
+
+    def test_query_count_does_not_grow_with_membership(self):
+        create_project(self.user, 'project 0')
+        # first request also authenticates the token
+        self.count_queries()
+        few, data = self.count_queries()
+        self.assertEqual(len(data), 1)
+
+        for i in range(1, 30):
+            project = create_project(self.user, 'project %d' % i)
+            Tickets.objects.create(title='ticket', project=project, status='Open')
+        many, data = self.count_queries()
+        self.assertEqual(len(data), 30)
+        self.assertEqual(few, many)
+
+
+class ConditionalRequestTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.url = '/api/user/project/%d/ticket/' % self.project.id
+
+    def test_version_is_created_with_the_project(self):
+        self.assertEqual(ProjectVersion.objects.get(project=self.project).version, 0)
+        response = self.client.post('/api/user/project', {'name': 'new', 'description': 'new'})
+        self.assertTrue(ProjectVersion.objects.filter(project_id=response.json()['id']).exists())
+
+    def test_not_modified_until_a_ticket_changes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(self.url, {'title': 'new', 'priority': 'Low', 'status': 'Open', 'type': 'Bug/Error'})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class UserLookupTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.developers = [create_user('developer%d' % i)[0] for i in range(3)]
+
+    def test_lookup_in_one_query(self):
+        ids = [self.developers[2].id, 999, self.developers[0].id]
+        self.client.get('/api/user/lookup/', {'ids': '1'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/user/lookup/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([user['username'] for user in response.json()['results']], ['developer2', 'developer0'])
+        self.assertEqual(self.client.get('/api/user/lookup/', {'ids': '1,x'}).status_code, 400)
+
+    def test_admin_listing_pages(self):
+        self.assertEqual(self.client.get('/api/user').status_code, 403)
+        self.admin.is_superuser = True
+        self.admin.save()
+        page = self.client.get('/api/user', {'page_size': 3}).json()
+        rest = self.client.get('/api/user', {'page_size': 3, 'cursor': page['next']}).json()
+        self.assertEqual([user['username'] for user in page['results'] + rest['results']],
+                         ['admin', 'developer0', 'developer1', 'developer2'])
+        self.assertIsNone(rest['next'])
+        self.assertEqual(self.client.get('/api/user').json(), page['results'] + rest['results'])
+
+    def test_tickets_side_load_assignees(self):
+        project = create_project(self.admin, 'project')
+        for developer in self.developers[:2] + [None]:
+            Tickets.objects.create(title='ticket', project=project, users=developer)
+        url = '/api/user/project/%d/ticket/' % project.id
+        data = self.client.get(url, {'page_size': 10, 'include': 'assignees'}).json()
+        self.assertEqual([user['id'] for user in data['assignees']], [user.id for user in self.developers[:2]])
+        self.assertEqual(len(self.client.get(url, {'include': 'assignees'}).json()['results']), 3)
+        self.assertEqual(self.client.get(url, {'include': 'projects'}).status_code, 400)
+
+
+class TokenCacheTest(BaseTestCase):
+    def token(self):
+        response = self.client.post('/api/auth', {'username': 'member', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['token']
+
+    def get_projects(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        return self.client.get('/api/user/project').status_code
+
+    def test_logged_out_token_is_rejected(self):
+        create_user('member')
+        token = self.token()
+        self.assertEqual(self.get_projects(token), 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_projects(token), 200)
+        self.assertFalse([q for q in queries.captured_queries if 'authtoken' in q['sql']])
+
+        self.assertEqual(self.client.get('/api/logout').status_code, 200)
+        self.assertEqual(self.get_projects(token), 401)
+        self.client.credentials()
+        fresh = self.token()
+        self.assertNotEqual(fresh, token)
+        self.assertEqual(self.get_projects(fresh), 200)
+
+    def test_process_local_cache_expires_with_the_local_cache(self):
+        self.assertEqual(shared_cache_ttl(), settings.AUTH_TOKEN_LOCAL_CACHE_TTL)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(shared_cache_ttl(), settings.AUTH_TOKEN_CACHE_TTL)
+
+
+class MembershipCacheTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.developer, _ = create_user('developer')
+        self.ticket = Tickets.objects.create(title='ticket', project=self.project)
+
+    def test_permission_checks_use_cache(self):
+        url = '/api/user/project/%d/ticket/%d/' % (self.project.id, self.ticket.id)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if 'projectuserrelation' in q['sql'].lower()])
+
+    def test_reassignment_invalidates_cache(self):
+        url = '/api/user/project/%d/ticket/%d/' % (self.project.id, self.ticket.id)
+        self.client.force_authenticate(self.developer)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.put(url, {'title': 'ticket', 'users': self.developer.id})
+        self.assertEqual(response.status_code, 201)
+
+        self.client.force_authenticate(self.developer)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProjectStatsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.developer, _ = create_user('developer')
+        self.url = '/api/user/project/%d/stats/' % self.project.id
+
+    def test_counters_follow_ticket_writes(self):
+        first = Tickets.objects.create(title='a', project=self.project, status='Open', priority='High',
+                                       users=self.developer)
+        Tickets.objects.create(title='b', project=self.project, status='Open', priority='Low', users=self.developer)
+        Tickets.objects.create(title='c', project=self.project, status='Closed', priority='Low')
+        first.users = None
+        first.save()
+        stats = self.client.get(self.url).json()
+        self.assertEqual((stats['total'], stats['status'], stats['priority']),
+                         (3, {'Open': 2, 'Closed': 1}, {'High': 1, 'Low': 2}))
+        self.assertEqual(stats['developers'], [{'user': self.developer.id, 'total': 1, 'open': 1},
+                                               {'user': None, 'total': 2, 'open': 1}])
+
+        self.developer.delete()
+        self.assertEqual(self.client.get(self.url).json()['developers'], [{'user': None, 'total': 3, 'open': 2}])
+        self.assertEqual(rebuild_rollup(self.project.id), [])
+
+    def test_rebuild_repairs_drift(self):
+        Tickets.objects.create(title='a', project=self.project, status='Open')
+        TicketRollup.objects.filter(project=self.project).update(count=5)
+        drift = [(self.project.id, None, 'Open', None, None, 5, 1)]
+        self.assertEqual(rebuild_rollup(self.project.id, dry_run=True), drift)
+        self.assertEqual(rebuild_rollup(self.project.id), drift)
+        self.assertEqual(rebuild_rollup(self.project.id), [])
+        self.assertEqual(self.client.get(self.url).json()['total'], 1)
+
+    def grouped_counts(self, client_user=None):
+        if client_user is not None:
+            self.client.force_authenticate(client_user)
+        response = self.client.get('/api/user/project/%d/ticket/' % self.project.id,
+                                   {'count': 'true', 'by': 'status,priority'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_grouped_counts(self):
+        ProjectUserRelation.objects.create(user_id=self.developer, project_id=self.project, user_role='Developer')
+        for priority, status, users in [('High', 'Open', None), ('High', 'Open', self.developer),
+                                        ('Low', 'Open', None), ('Low', 'Closed', self.developer), (None, 'Open', None)]:
+            Tickets.objects.create(title='t', project=self.project, priority=priority, status=status, users=users)
+        expected = {'by': ['status', 'priority'], 'total': 5, 'groups': [
+            {'status': 'Open', 'priority': None, 'count': 1}, {'status': 'Open', 'priority': 'Low', 'count': 1},
+            {'status': 'Open', 'priority': 'High', 'count': 2}, {'status': 'Closed', 'priority': 'Low', 'count': 1}]}
+        self.assertEqual(self.grouped_counts(), expected)
+        with override_settings(TICKET_ROLLUP_ENABLED=False):
+            self.assertEqual(self.grouped_counts(), expected)
+        self.assertEqual(self.grouped_counts(self.developer)['groups'], [
+            {'status': 'Open', 'priority': 'High', 'count': 1}, {'status': 'Closed', 'priority': 'Low', 'count': 1}])
+        self.assertEqual(self.client.get('/api/user/project/%d/ticket/' % self.project.id,
+                                         {'count': 'true', 'by': 'title'}).status_code, 400)
+
+    def test_unassigned_rows_are_unique(self):
+        Tickets.objects.create(title='a', project=self.project, status='Open')
+        # what a concurrent first write of the same key would insert
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TicketRollup.objects.create(project=self.project, status='Open', count=1)
+        apply_rollup_delta(self.project.id, (None, 'Open', None, None), 1)
+        self.assertEqual(TicketRollup.objects.get(project=self.project, users=None).count, 2)
+
+
+class AuditLogTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.developer, _ = create_user('developer')
+        self.url = '/api/user/project/%d/' % self.project.id
+
+    def test_failed_assignment_writes_nothing(self):
+        ticket = Tickets.objects.create(title='ticket', project=self.project)
+        entries = AuditEntry.objects.count()
+        with mock.patch.object(Tickets, 'save', side_effect=DatabaseError('locked')):
+            with self.assertRaises(DatabaseError):
+                self.client.put(self.url + 'ticket/%d/' % ticket.id, {'title': 'ticket', 'users': self.developer.id})
+        self.assertFalse(ProjectUserRelation.objects.filter(user_id=self.developer, project_id=self.project).exists())
+        self.assertEqual(AuditEntry.objects.count(), entries)
+
+    def test_ticket_timeline_and_activity(self):
+        ticket = self.client.post(self.url + 'ticket/', {'title': 'a', 'description': 'b', 'priority': 'Low',
+                                                        'status': 'Open', 'type': 'Others'}).json()['id']
+        self.client.put(self.url + 'ticket/%d/' % ticket, {'title': 'a', 'description': 'b', 'priority': 'High',
+                                                          'status': 'Open', 'type': 'Others',
+                                                          'users': self.developer.id})
+        history = self.url + 'ticket/%d/history/' % ticket
+        page = self.client.get(history, {'page_size': 1}).json()
+        self.assertEqual([(entry['action'], entry['actor'], entry['changes']) for entry in page['results']],
+                         [('updated', self.admin.id,
+                           {'priority': ['Low', 'High'], 'users': [None, self.developer.id]})])
+        created = self.client.get(history, {'page_size': 1, 'cursor': page['next']}).json()
+        self.assertEqual(created['results'][0]['changes'], {'title': [None, 'a'], 'description': [None, 'b'],
+                                                            'priority': [None, 'Low'], 'status': [None, 'Open'],
+                                                            'type': [None, 'Others']})
+        self.assertIsNone(created['next'])
+
+        activity = self.client.get(self.url + 'activity/').json()['results']
+        self.assertEqual([(entry['target'], entry['object'], entry['action']) for entry in activity[:2]],
+                         [('ticket', ticket, 'updated'), ('member', self.developer.id, 'created')])
+        self.client.force_authenticate(self.developer)
+        self.assertEqual(self.client.get(history).status_code, 200)
+        self.assertEqual(self.client.get(self.url + 'activity/').status_code, 403)
+
+    def test_compaction(self):
+        ticket = Tickets.objects.create(title='a', project=self.project, status='Open')
+        with acting_as(self.admin.id):
+            for status in ('Closed', 'Open', 'Closed'):
+                ticket.status = status
+                ticket.save()
+            ticket.status = 'Open'
+            ticket.save()
+            ticket.priority = 'High'
+            ticket.save()
+        entries = AuditEntry.objects.filter(target=AuditEntry.TICKET, object_id=ticket.id)
+        self.assertEqual(entries.count(), 6)
+        # compaction pages through the log, runs go across pages
+        self.assertEqual(compact_audit_log(compact_after_days=0, batch_size=2), (0, 4))
+        self.assertEqual([(entry.action, entry.actor_id, entry.changes) for entry in entries.order_by('id')],
+                         [('created', None, {'title': [None, 'a'], 'status': [None, 'Open']}),
+                          ('updated', self.admin.id, {'priority': [None, 'High']})])
+
+        entries.filter(action=AuditEntry.CREATED).update(created_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(compact_audit_log(retention_days=365), (1, 0))
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True)
+class BulkTicketTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.developer, _ = create_user('developer')
+        self.url = '/api/user/project/%d/ticket/bulk/' % self.project.id
+
+    def test_create_update_delete(self):
+        creates = [{'title': 'ticket %d' % i, 'priority': 'Low', 'status': 'Open'} for i in range(20)]
+        creates[0]['users'] = self.developer.id
+        response = self.client.post(self.url, {'create': creates}, format='json')
+        self.assertEqual(response.status_code, 200)
+        ids = [result['id'] for result in response.json()['create']]
+        self.assertEqual(Tickets.objects.filter(project=self.project, id__in=ids).count(), 20)
+        self.assertTrue(ProjectUserRelation.objects.filter(user_id=self.developer, project_id=self.project).exists())
+
+        response = self.client.post(self.url, {
+            'update': [{'id': ids[0], 'users': None, 'status': 'Closed'}],
+            'delete': ids[1:5]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Tickets.objects.filter(project=self.project).count(), 16)
+        self.assertFalse(ProjectUserRelation.objects.filter(user_id=self.developer, project_id=self.project).exists())
+        rollup = {row.status: row.count for row in TicketRollup.objects.filter(project=self.project)}
+        self.assertEqual(rollup, {'Open': 15, 'Closed': 1})
+
+    def test_created_ids_match_tickets(self):
+        other = create_project(self.admin, 'other')
+        Tickets.objects.create(project=other, title='other')
+        creates = [{'title': 'ticket %d' % i} for i in range(3)]
+        response = self.client.post(self.url, {'create': creates}, format='json')
+        ids = [result['id'] for result in response.json()['create']]
+        titles = dict(Tickets.objects.filter(id__in=ids).values_list('id', 'title'))
+        self.assertEqual([titles[id] for id in ids], ['ticket 0', 'ticket 1', 'ticket 2'])
+        self.assertEqual(insert_tickets([Tickets(project=other, title='next')])[0].id, max(ids) + 1)
+
+    def test_invalid_item_rejects_batch(self):
+        response = self.client.post(self.url, {
+            'create': [{'title': 'valid'}, {'title': 'invalid', 'priority': 'Urgent'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['create']], [424, 400])
+        self.assertFalse(Tickets.objects.exists())
+
+    def test_invalid_ids_are_rejected(self):
+        ticket = Tickets.objects.create(title='ticket', project=self.project)
+        response = self.client.post(self.url, {
+            'update': [{'id': [ticket.id], 'title': 'list'}, {'id': {'id': ticket.id}, 'title': 'object'},
+                       {'id': True, 'title': 'bool'}],
+            'delete': [[ticket.id], {}, True]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        results = response.json()
+        for result in results['update'] + results['delete']:
+            self.assertEqual((result['status'], result['errors']), (400, {'id': ['Invalid id']}))
+        self.assertEqual(Tickets.objects.get().title, 'ticket')
+
+
+flaky_calls = []
+
+
+@job('test_flaky', max_attempts=2)
+def flaky(value):
+    flaky_calls.append(value)
+    if len(flaky_calls) == 1:
+        raise ValueError('first attempt fails')
+    return value * 2
+
+
+class JobQueueTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        flaky_calls.clear()
+
+    def run_due_jobs(self):
+        for claimed in claim_jobs(10):
+            run_job(claimed)
+
+    @override_settings(JOBS_RETRY_DELAY=0)
+    def test_retry_and_idempotency_key(self):
+        first = enqueue('test_flaky', 21, key='answer', user_id=self.admin.id)
+        self.assertEqual(enqueue('test_flaky', 21, key='answer').id, first.id)
+
+        with self.assertLogs('Users.jobs', 'WARNING'):
+            self.run_due_jobs()
+        self.assertEqual(Job.objects.get(id=first.id).status, Job.QUEUED)
+        self.run_due_jobs()
+        response = self.client.get('/api/jobs/%d/' % first.id).json()
+        self.assertEqual((response['status'], response['attempts'], response['result']), ('done', 2, 42))
+
+    def test_timed_out_job_fails_after_its_last_attempt(self):
+        job = enqueue('test_flaky', 1)
+        expired = timezone.now() - timedelta(seconds=1)
+        for attempt in (1, 2):
+            self.assertEqual([claimed.id for claimed in claim_jobs(10)], [job.id])
+            # the worker dies without finishing the job
+            Job.objects.filter(id=job.id).update(locked_until=expired)
+        self.assertEqual(claim_jobs(10), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_until), (Job.FAILED, 2, None))
+        self.assertEqual(flaky_calls, [])
+
+    def test_saves_share_the_queued_index_job(self):
+        ticket = Tickets.objects.create(title='ticket', project=self.project)
+        for title in ('renamed', 'renamed again'):
+            ticket.title = title
+            ticket.save()
+        self.assertEqual(Job.objects.filter(name='index_tickets').count(), 1)
+        self.assertEqual(len(claim_jobs(10)), 1)
+        # once started the job may have read the old title, a later save queues another one
+        ticket.title = 'started'
+        ticket.save()
+        self.assertEqual(list(Job.objects.filter(name='index_tickets').values_list('status', flat=True)
+                              .order_by('id')), [Job.RUNNING, Job.QUEUED])
+
+    def test_finished_jobs_are_pruned(self):
+        done, failed, queued, recent = (enqueue('test_flaky', i, key='job %d' % i) for i in range(4))
+        Job.objects.filter(id=done.id).update(status=Job.DONE)
+        Job.objects.filter(id__in=[failed.id, recent.id]).update(status=Job.FAILED)
+        Job.objects.exclude(id=recent.id).update(updated_at=timezone.now() - timedelta(days=8))
+        with override_settings(JOBS_RETENTION_DAYS=None):
+            call_command('prune_jobs', stdout=io.StringIO())
+        self.assertEqual(Job.objects.count(), 4)
+        call_command('prune_jobs', stdout=io.StringIO())
+        self.assertEqual(set(Job.objects.values_list('id', flat=True)), {queued.id, recent.id})
+        # the key of a deleted job can be used again
+        self.assertNotEqual(enqueue('test_flaky', 0, key='job 0').id, done.id)
+
+    def test_reassignment_releases_old_developer_in_background(self):
+        developer, _ = create_user('developer')
+        ProjectUserRelation.objects.create(user_id=developer, project_id=self.project, user_role='Developer')
+        ticket = Tickets.objects.create(title='ticket', project=self.project, users=developer)
+
+        response = self.client.put('/api/user/project/%d/ticket/%d/' % (self.project.id, ticket.id),
+                                   {'title': 'ticket', 'users': self.admin.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(ProjectUserRelation.objects.filter(user_id=developer, project_id=self.project).exists())
+        self.run_due_jobs()
+        self.assertFalse(ProjectUserRelation.objects.filter(user_id=developer, project_id=self.project).exists())
+
+
+class TicketListPaginationTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.url = '/api/user/project/%d/ticket/' % self.project.id
+        self.tickets = [Tickets.objects.create(title='ticket %d' % i, project=self.project).id for i in range(5)]
+        # same creation date: the id breaks the tie, pages must neither skip nor repeat tickets
+        Tickets.objects.filter(id__in=self.tickets[1:4]).update(CreatedDate=timezone.make_aware(datetime(2020, 1, 1)))
+        self.ordered = self.tickets[1:4] + [self.tickets[0], self.tickets[4]]
+
+    def test_cursor_pages_in_default_ordering(self):
+        ids, cursor, pages = [], None, 0
+        while True:
+            params = {'page_size': 2}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.client.get(self.url, params).json()
+            ids += [ticket['id'] for ticket in page['results']]
+            pages += 1
+            cursor = page['next']
+            if cursor is None:
+                break
+            # a ticket created after the first page comes last, it does not shift the pages
+            if pages == 1:
+                self.ordered.append(Tickets.objects.create(title='late', project=self.project).id)
+        self.assertEqual(ids, self.ordered)
+        self.assertEqual(pages, 3)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not a cursor'}).status_code, 400)
+        # well formed cursors with values of the wrong type for their field
+        for values in (['abc', 1], [{}, 1], ['2020-01-01T00:00:00', 'abc']):
+            self.assertEqual(self.client.get(self.url, {'cursor': encode_cursor(values)}).status_code, 400)
+
+    def test_stream_is_ndjson(self):
+        response = self.client.get(self.url, {'stream': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.ordered)
+
+
+class TicketListSerializationTest(BaseTestCase):
+    def test_fast_path_matches_ticket_serializer(self):
+        admin, token = create_user('admin')
+        project = create_project(admin, 'project')
+        Tickets.objects.create(title='unassigned', project=project)
+        Tickets.objects.create(title='n\u00e4me \u2028 "quoted"', description='d', priority='High', status='Open',
+                               type='Others', project=project, users=admin)
+        tickets = Tickets.objects.filter(project=project).order_by('id')
+
+        expected = TicketSerializer(tickets, many=True).data
+        self.assertEqual(serialize_ticket_values(ticket_values(tickets)), expected)
+        self.assertEqual(render_json(serialize_ticket_values(ticket_values(tickets))), JSONRenderer().render(expected))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        response = self.client.get('/api/user/project/%d/ticket/' % project.id)
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+
+class TicketFilterTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.url = '/api/user/project/%d/ticket/' % self.project.id
+        for title, priority, status in [('a', 'Low', 'Open'), ('b', 'High', 'Open'), ('c', 'Medium', 'Open'),
+                                        ('d', None, 'Open'), ('e', 'High', 'Closed'), ('f', 'Medium', 'Open')]:
+            Tickets.objects.create(title=title, priority=priority, status=status, project=self.project,
+                                   users=self.admin if title in 'ab' else None)
+
+    def titles(self, query):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return [ticket['title'] for ticket in response.json()]
+
+    def test_filters_and_rank_ordering(self):
+        self.assertEqual(self.titles('?status=Open&ordering=-priority'), ['b', 'c', 'f', 'a', 'd'])
+        self.assertEqual(self.titles('?priority=High,none&ordering=priority,-id'), ['d', 'e', 'b'])
+        self.assertEqual(self.titles('?assignee=none&status=Open&ordering=id'), ['c', 'd', 'f'])
+        self.assertEqual(self.titles('?created_before=2000-01-01'), [])
+        self.assertEqual(self.client.get(self.url + '?status=Open&count=true&by=priority').json()['total'], 5)
+        self.assertEqual(self.client.get(self.url + '?priority=Urgent').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?created_after=2020-02-30').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?updated_before=2020-13-45T10:00:00').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?ordering=title').status_code, 400)
+
+    def test_pages_follow_the_ordering(self):
+        titles, cursor = [], ''
+        while cursor is not None:
+            page = self.client.get(self.url + '?ordering=-priority&page_size=2&cursor=' + cursor).json()
+            titles += [ticket['title'] for ticket in page['results']]
+            cursor = page['next']
+        self.assertEqual(titles, ['b', 'e', 'c', 'f', 'a', 'd'])
+
+    def test_choices_are_stored_as_codes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT title, priority, status FROM Users_tickets WHERE title IN (%s, %s) ORDER BY title',
+                           ['a', 'd'])
+            self.assertEqual(cursor.fetchall(), [('a', 1, 1), ('d', 0, 1)])
+        tickets = Tickets.objects.filter(project=self.project)
+        self.assertEqual(tickets.get(priority=None).title, 'd')
+        self.assertEqual(tickets.get(priority__isnull=True, status='Open').title, 'd')
+        self.assertEqual(tickets.exclude(priority__isnull=True).count(), 5)
+        self.assertEqual(tickets.get(title='e').priority, 'High')
+
+
+class TicketChangesTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.url = '/api/user/project/%d/ticket/changes/' % self.project.id
+
+    def test_only_changes_since_cursor(self):
+        kept = Tickets.objects.create(title='kept', project=self.project)
+        updated = Tickets.objects.create(title='updated', project=self.project)
+        deleted = Tickets.objects.create(title='deleted', project=self.project)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['changed']), 3)
+        cursor = response.json()['cursor']
+
+        updated.status = 'Closed'
+        updated.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        created = Tickets.objects.create(title='created', project=self.project)
+        response = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertEqual([ticket['id'] for ticket in response['changed']], [updated.id, created.id])
+        self.assertEqual(response['deleted'], [deleted_id])
+        self.assertNotIn(kept.id, [ticket['id'] for ticket in response['changed']])
+
+        response = self.client.get(self.url, {'cursor': response['cursor']}).json()
+        self.assertEqual((response['changed'], response['deleted']), ([], []))
+
+    def test_snapshot_is_paged(self):
+        ids = [Tickets.objects.create(title='ticket %d' % i, project=self.project).id for i in range(5)]
+        pages, params = [], {'page_size': 2}
+        while True:
+            response = self.client.get(self.url, params).json()
+            pages.append([ticket['id'] for ticket in response['changed']])
+            params['cursor'] = response['cursor']
+            if not response['has_more']:
+                break
+        self.assertEqual(pages, [ids[:2], ids[2:4], ids[4:]])
+
+        Tickets.objects.filter(id=ids[0]).delete()
+        response = self.client.get(self.url, params).json()
+        self.assertEqual((response['changed'], response['deleted'], response['has_more']), ([], [ids[0]], False))
+
+    def test_developer_only_sees_own_deletes(self):
+        developer, token = create_user('developer')
+        other, _ = create_user('other')
+        ProjectUserRelation.objects.create(user_id=developer, project_id=self.project, user_role='Developer')
+        mine = Tickets.objects.create(title='mine', project=self.project, users=developer)
+        theirs = Tickets.objects.create(title='theirs', project=self.project, users=other)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        response = self.client.get(self.url).json()
+        self.assertEqual([ticket['id'] for ticket in response['changed']], [mine.id])
+
+        mine.users = other
+        mine.save()
+        theirs.status = 'Closed'
+        theirs.save()
+        theirs.delete()
+        response = self.client.get(self.url, {'cursor': response['cursor']}).json()
+        self.assertEqual((response['changed'], response['deleted']), ([], [mine.id]))
+
+    def test_pruned_cursor_expires(self):
+        response = self.client.get(self.url).json()
+        Tickets.objects.create(title='old', project=self.project)
+        expired = timezone.now() - timedelta(days=settings.TICKET_CHANGES_RETENTION_DAYS + 1)
+        TicketChange.objects.update(created_at=expired)
+        Tickets.objects.create(title='new', project=self.project)
+        call_command('prune_ticket_changes', stdout=io.StringIO())
+        self.assertEqual(list(TicketChange.objects.values_list('action', flat=True)), [TicketChange.CREATED])
+
+        self.assertEqual(self.client.get(self.url, {'cursor': response['cursor']}).status_code, 200)
+        with override_settings(TICKET_CHANGES_RETENTION_DAYS=0):
+            self.assertEqual(self.client.get(self.url, {'cursor': response['cursor']}).status_code, 410)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not a cursor'}).status_code, 400)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+class MetricsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.user, self.token = create_user('member')
+
+    def metrics(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return self.client.get('/metrics', **headers)
+
+    def test_requests_are_recorded(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(self.client.get('/api/user/project').status_code, 200)
+        self.client.credentials()
+        response = self.metrics('Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('bugtracker_requests_total{view="UserProjects",method="GET",status="200"} 1', text)
+        self.assertIn('bugtracker_request_sql_queries_count{view="UserProjects",method="GET"} 1', text)
+        # /metrics itself is not recorded
+        self.assertNotIn('view="metrics"', self.metrics('Bearer secret').content.decode())
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_requests_are_logged(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with self.assertLogs('Users.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/user/project')
+        self.assertIn('Slow request GET /api/user/project (UserProjects)', logs.output[0])
+
+    def test_token_is_required(self):
+        self.assertEqual(self.metrics().status_code, 403)
+        self.assertEqual(self.metrics('Bearer wrong').status_code, 403)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.metrics().status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.metrics().status_code, 200)
+
+
+@override_settings(INTAKE_BUFFERED=False, JOBS_ALWAYS_EAGER=True)
+class TicketIntakeTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        form_keys.clear()
+        key_limiter.clear()
+        ip_limiter.clear()
+        admin, _ = create_user('admin')
+        self.project = create_project(admin, 'project')
+        Projects.objects.filter(id=self.project.id).update(ticket_form_key='formkey')
+        self.url = '/api/intake/formkey/'
+
+    def test_identical_reports_are_collapsed(self):
+        for title in ['Crash on save', '  crash ON save ']:
+            response = self.client.post(self.url, {'title': title, 'description': 'stack trace'})
+            self.assertEqual(response.status_code, 202)
+        self.client.post(self.url, {'title': 'spam', 'website': 'http://spam.example.com'})
+        self.assertEqual(list(Tickets.objects.values_list('title', 'occurrences')), [('Crash on save', 2)])
+
+        self.assertEqual(write_reports([(self.project.id, 'Crash on save', 'stack trace'),
+                                        (self.project.id, 'Other', None), (self.project.id, 'other', '')]), (1, 1))
+        self.assertEqual(Tickets.objects.get(title='Other').occurrences, 2)
+        self.assertEqual(self.client.post('/api/intake/unknown/', {'title': 'x'}).status_code, 404)
+
+    def test_rate_limit_per_client(self):
+        responses = [self.client.post(self.url, {'title': 'report %d' % i}, REMOTE_ADDR='10.0.0.1')
+                     for i in range(ip_limiter.burst + 1)]
+        self.assertEqual(responses[-2].status_code, 202)
+        self.assertEqual(responses[-1].status_code, 429)
+        self.assertIn('Retry-After', responses[-1])
+        response = self.client.post(self.url, {'title': 'report'}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 202)
+
+    def test_anonymous_tickets_are_rate_limited(self):
+        url = '/api/user/project/%d/ticket/' % self.project.id
+        responses = [self.client.post(url, {'title': 'ticket %d' % i}, REMOTE_ADDR='10.0.0.1')
+                     for i in range(ip_limiter.burst + 1)]
+        self.assertEqual([response.status_code for response in responses[-2:]], [201, 429])
+        # the project's public intake has the same budget
+        self.assertEqual(self.client.post(self.url, {'title': 'report'}, REMOTE_ADDR='10.0.0.1').status_code, 429)
+        self.assertEqual(self.client.post(url, {'title': 'ticket'}, REMOTE_ADDR='10.0.0.2').status_code, 201)
+
+    def test_client_ip_behind_proxies(self):
+        request = RequestFactory().post(self.url, REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2')
+        for proxies, ip in [(0, '10.0.0.1'), (1, '2.2.2.2'), (2, '1.1.1.1'), (3, '1.1.1.1')]:
+            with override_settings(INTAKE_TRUSTED_PROXIES=proxies):
+                self.assertEqual(client_ip(request), ip)
+
+    def test_failed_batch_is_kept(self):
+        buffer = IntakeBuffer()
+        buffer.reports = [(self.project.id, 'report %d' % i, None) for i in range(3)]
+        with override_settings(INTAKE_BATCH_SIZE=2), mock.patch('Users.intake.write_reports',
+                                                                side_effect=[(2, 0), DatabaseError('locked')]):
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        self.assertEqual(buffer.reports, [(self.project.id, 'report 2', None)])
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(list(Tickets.objects.values_list('title', flat=True)), ['report 2'])
+
+        with override_settings(INTAKE_MAX_BUFFERED=2), self.assertLogs('Users.intake', 'ERROR'):
+            buffer.requeue([(self.project.id, 'report %d' % i, None) for i in range(3)])
+        self.assertEqual([title for _, title, _ in buffer.reports], ['report 1', 'report 2'])
+
+
+class ProjectArchiveTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.developer, _ = create_user('developer')
+        ProjectUserRelation.objects.create(user_id=self.developer, project_id=self.project, user_role='Developer')
+        for i in range(5):
+            Tickets.objects.create(title='ticket %d' % i, project=self.project, priority='High' if i % 2 else None,
+                                   status='Open', users=self.developer if i < 2 else None)
+        Tickets.objects.filter(title='ticket 0').update(CreatedDate=timezone.make_aware(datetime(2020, 1, 1)))
+
+    def export(self):
+        response = self.client.get('/api/user/project/%d/export/' % self.project.id)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def tickets(self, project_id):
+        return list(Tickets.objects.filter(project=project_id).order_by('id')
+                    .values_list('title', 'priority', 'status', 'users', 'CreatedDate', 'updated_at'))
+
+    def test_export_import_round_trip(self):
+        archive = SimpleUploadedFile('project.ndjson.gz', self.export())
+        response = self.client.post('/api/user/project/import/', {'archive': archive, 'members': 'true'})
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(id=self.admin.id).update(is_superuser=True)
+        local_tokens.clear()
+        cache.clear()
+        archive.seek(0)
+        response = self.client.post('/api/user/project/import/', {'archive': archive, 'members': 'true'})
+        self.assertEqual(response.status_code, 201)
+        imported = response.json()
+        self.assertEqual((imported['members'], imported['tickets']), (1, 5))
+        self.assertEqual(self.tickets(imported['project']), self.tickets(self.project.id))
+        self.assertEqual(get_role(self.developer.id, imported['project']), 'Developer')
+        self.assertEqual(rebuild_rollup(imported['project']), [])
+
+    def test_members_are_only_imported_on_request(self):
+        archive = SimpleUploadedFile('project.ndjson.gz', self.export())
+        response = self.client.post('/api/user/project/import/', {'archive': archive})
+        self.assertEqual(response.status_code, 201)
+        imported = response.json()
+        self.assertEqual((imported['members'], imported['tickets']), (0, 5))
+        self.assertIsNone(get_role(self.developer.id, imported['project']))
+        self.assertEqual(get_role(self.admin.id, imported['project']), 'Admin')
+        self.assertFalse(Tickets.objects.filter(project=imported['project'], users__isnull=False).exists())
+
+    def archive_with(self, record):
+        header = gzip.decompress(self.export()).splitlines(keepends=True)[0]
+        return io.BytesIO(gzip.compress(header + json.dumps(record).encode() + b'\n'))
+
+    def test_malformed_records_are_rejected(self):
+        for record in ({'record': 'member', 'user': 1, 'email': ['admin@example.com'], 'role': 'Developer'},
+                       {'record': 'member', 'user': 1, 'email': 'admin@example.com', 'role': ['Admin']},
+                       {'record': 'ticket', 'id': 1, 'title': 'ticket', 'priority': ['High']}):
+            with self.assertRaises(InvalidArchive):
+                import_project(self.archive_with(record), members=True)
+
+        # values the database rejects are reported like any invalid record
+        archive = SimpleUploadedFile('project.ndjson.gz', self.archive_with(
+            {'record': 'ticket', 'id': 1, 'title': 'ticket'}).getvalue())
+        with mock.patch('Users.archive.insert_tickets', side_effect=IntegrityError('rejected')):
+            response = self.client.post('/api/user/project/import/', {'archive': archive})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rejected', response.json()['msg'])
+
+    def test_interrupted_import_resumes(self):
+        lines = gzip.decompress(self.export()).splitlines(keepends=True)
+        # header, 2 members and 2 tickets, then a broken line
+        with self.assertRaises(InvalidArchive) as failed:
+            import_project(io.BytesIO(gzip.compress(b''.join(lines[:5]) + b'{broken\n')), chunk_size=2,
+                           members=True)
+        self.assertEqual((failed.exception.checkpoint.records, failed.exception.checkpoint.tickets), (4, 2))
+
+        checkpoint = import_project(io.BytesIO(gzip.compress(b''.join(lines))),
+                                    resume=failed.exception.checkpoint.id, chunk_size=2)
+        self.assertTrue(checkpoint.done)
+        self.assertEqual(self.tickets(checkpoint.project_id), self.tickets(self.project.id))
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True)
+class TicketSearchTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.url = '/api/user/project/%d/ticket/search/' % self.project.id
+        self.crash = Tickets.objects.create(title='<i>Login</i> crash', project=self.project,
+                                            description='<script>alert(1)</script> crash after submit')
+        Tickets.objects.create(title='Dark mode', description='Users want a dark theme', project=self.project)
+
+    def search(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(hit['ticket']['id'], hit['snippet']) for hit in response.json()['results']]
+
+    def assertEscapedHit(self, hits):
+        self.assertEqual([ticket_id for ticket_id, snippet in hits], [self.crash.id])
+        self.assertIn('&lt;', hits[0][1])
+        self.assertIn('<b>crash</b>', hits[0][1])
+        self.assertNotIn('<', hits[0][1].replace('<b>', '').replace('</b>', ''))
+
+    def test_search_escapes_snippets(self):
+        self.assertEscapedHit(self.search('crash'))
+        self.assertEqual(self.search('crash theme'), [])
+
+    @override_settings(TICKET_SEARCH_BACKEND='terms')
+    def test_term_table_search(self):
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEscapedHit(self.search('crash'))
+        self.assertEqual([ticket_id for ticket_id, snippet in self.search('dark')], [self.crash.id + 1])
+
+    def test_rebuild_search_index(self):
+        Tickets.objects.filter(id=self.crash.id).update(title='Renamed', description='nothing to see')
+        self.assertEqual(len(self.search('crash')), 1)
+        call_command('rebuild_search_index', '--project', str(self.project.id), stdout=io.StringIO())
+        self.assertEqual(self.search('crash'), [])
+        self.assertEqual(len(self.search('renamed')), 1)
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True)
+class SimilarTicketsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin, token = create_user('admin')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.project = create_project(self.admin, 'project')
+        self.url = '/api/user/project/%d/ticket/' % self.project.id
+        self.original = Tickets.objects.create(title='Login page crashes', project=self.project,
+                                               description='The login page crashes with a 500 error after submit')
+        Tickets.objects.create(title='Add dark mode', description='Users want a dark theme', project=self.project)
+
+    def test_duplicates_are_suggested(self):
+        response = self.client.post(self.url, {'title': 'login page crashes',
+                                               'description': 'the login page crashes with 500 error after submit',
+                                               'priority': 'High', 'status': 'Open', 'type': 'Bug/Error'})
+        self.assertEqual([hit['id'] for hit in response.json()['similar']], [self.original.id])
+
+        response = self.client.get(self.url + '%d/similar/' % response.json()['id']).json()
+        self.assertEqual([hit['ticket']['id'] for hit in response['results']], [self.original.id])
+        self.assertGreaterEqual(response['results'][0]['similarity'], 0.5)
+
+    def test_bulk_created_tickets_are_indexed(self):
+        response = self.client.post(self.url + 'bulk/', {'create': [{
+            'title': 'Login page crashes', 'description': 'The login page crashes with a 500 error after submit'
+        }]}, format='json')
+        created = response.json()['create'][0]['id']
+        response = self.client.get(self.url + '%d/similar/' % self.original.id).json()
+        self.assertEqual([(hit['ticket']['id'], hit['similarity']) for hit in response['results']], [(created, 1.0)])
+
+
+class ReplicaRoutingTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # the replica is a second SQLite file, the sticky cache a file cache both "processes" share
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases['replica_test'] = dict(connections.databases[DEFAULT_DB_ALIAS], TEST={},
+                                                      NAME=os.path.join(directory.name, 'replica.sqlite3'))
+        self.addCleanup(connections.databases.pop, 'replica_test')
+        self.addCleanup(connections.__delitem__, 'replica_test')
+        self.addCleanup(connections['replica_test'].close)
+        with connections['replica_test'].schema_editor() as editor:
+            editor.create_model(Projects)
+        Projects.objects.using('replica_test').bulk_create([Projects(name='replica', description='only there')])
+        Projects.objects.create(name='primary', description='only there')
+        sticky_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                        'LOCATION': os.path.join(directory.name, 'cache')}
+        shared = override_settings(DATABASE_REPLICAS=['replica_test'], REPLICA_STICKY_CACHE='sticky',
+                                   CACHES=dict(settings.CACHES, sticky=sticky_cache))
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def read(self, request):
+        # the projects a request reads
+        middleware = ReplicaMiddleware(lambda request: HttpResponse(','.join(Projects.objects.values_list('name',
+                                                                                                         flat=True))))
+        return middleware(request).content.decode()
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        factory = RequestFactory()
+        self.assertEqual(self.read(factory.get('/', HTTP_AUTHORIZATION='Token a')), 'replica')
+        self.assertEqual(self.read(factory.post('/', HTTP_AUTHORIZATION='Token a')), 'primary')
+        self.assertEqual(self.read(factory.get('/', HTTP_AUTHORIZATION='Token a')), 'primary')
+        self.assertEqual(self.read(factory.get('/', HTTP_AUTHORIZATION='Token b')), 'replica')
+        self.assertFalse(reads_from_replica.get())
+        self.assertEqual(router.db_for_write(Tickets), 'default')
+
+    def test_process_local_sticky_cache_keeps_clients_on_the_primary(self):
+        factory = RequestFactory()
+        with override_settings(REPLICA_STICKY_CACHE='default'):
+            self.assertEqual(self.read(factory.get('/', HTTP_AUTHORIZATION='Token a')), 'primary')
+            self.assertEqual(self.read(factory.get('/')), 'replica')
+            self.assertEqual([warning.id for warning in check_sticky_cache(None)], ['Users.W001'])
+        self.assertEqual(check_sticky_cache(None), [])
+
+
+class TicketEventsTest(APITransactionTestCase):
+    # events are published on commit, so this needs real transactions
+    def setUp(self):
+        memberships_cache.clear()
+        local_tokens.clear()
+        cache.clear()
+        self.admin, self.token = create_user('admin')
+        self.project = create_project(self.admin, 'project')
+
+    def connect(self, token):
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/user/project/%d/events/' % self.project.id,
+                 'headers': [(b'authorization', b'Token ' + token.encode())], 'query_string': b''}
+
+        async def application(scope, receive, send):
+            await ticket_events(scope, receive, send, self.project.id)
+        return ApplicationCommunicator(application, scope)
+
+    def test_stream_receives_ticket_events(self):
+        @async_to_sync
+        async def run():
+            communicator = self.connect(self.token.key)
+            start = await communicator.receive_output(timeout=5)
+            ready = await communicator.receive_output(timeout=5)
+            self.assertEqual(start['status'], 200)
+            self.assertTrue(ready['body'].startswith(b'event: ready'))
+
+            await sync_to_async(Tickets.objects.create)(title='pushed', project=self.project)
+            message = await communicator.receive_output(timeout=5)
+            self.assertTrue(message['body'].startswith(b'event: created'))
+            self.assertIn(b'"pushed"', message['body'])
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(timeout=5)
+            self.assertFalse(get_broker().has_subscribers(self.project.id))
+        run()
+
+    @override_settings(TICKET_EVENTS_ROLE_CHECK_INTERVAL=0.05)
+    def test_stream_ends_when_membership_is_revoked(self):
+        developer, token = create_user('developer')
+        relation = ProjectUserRelation.objects.create(user_id=developer, project_id=self.project,
+                                                      user_role='Developer')
+
+        @async_to_sync
+        async def run():
+            communicator = self.connect(token.key)
+            self.assertEqual((await communicator.receive_output(timeout=5))['status'], 200)
+            self.assertTrue((await communicator.receive_output(timeout=5))['body'].startswith(b'event: ready'))
+
+            await sync_to_async(relation.delete)()
+            while True:
+                message = await communicator.receive_output(timeout=5)
+                if message['body'] != b': keepalive\n\n':
+                    break
+            self.assertTrue(message['body'].startswith(b'event: revoked'))
+            self.assertFalse(message.get('more_body'))
+            await communicator.wait(timeout=5)
+            self.assertFalse(get_broker().has_subscribers(self.project.id))
+        run()
+
+    def test_invalid_token_is_rejected(self):
+        @async_to_sync
+        async def run():
+            communicator = self.connect('invalid')
+            self.assertEqual((await communicator.receive_output(timeout=5))['status'], 401)
+        run()
+
+
+class AsyncReadApiTest(APITransactionTestCase):
+    # the async handlers run the ORM in other threads, so the rows have to be committed
+    def setUp(self):
+        memberships_cache.clear()
+        local_tokens.clear()
+        cache.clear()
+        self.admin, self.token = create_user('admin')
+        self.project = create_project(self.admin, 'project')
+        self.ticket = Tickets.objects.create(title='ticket', project=self.project, status='Open')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def async_get(self, path, query_string=b'', application=None):
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+                 'headers': [(b'authorization', b'Token ' + self.token.key.encode())]}
+
+        async def read(scope, receive, send):
+            self.assertTrue(await read_api(scope, receive, send, match_route(scope)))
+        application = application or read
+
+        @async_to_sync
+        async def get():
+            communicator = ApplicationCommunicator(application, scope)
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(timeout=5)
+            body = await communicator.receive_output(timeout=5)
+            return start['status'], body['body']
+        return get()
+
+    def test_same_responses_as_sync_views(self):
+        paths = ['/api/user/project', '/api/user/project/%d/' % self.project.id,
+                 '/api/user/project/%d/ticket/' % self.project.id,
+                 '/api/user/project/%d/ticket/%d/' % (self.project.id, self.ticket.id)]
+        for path in paths:
+            expected = self.client.get(path)
+            status_code, body = self.async_get(path)
+            self.assertEqual(status_code, expected.status_code, path)
+            self.assertEqual(json.loads(body), expected.json(), path)
+
+        expected = self.client.get(paths[2], {'count': 'true', 'by': 'status'})
+        status_code, body = self.async_get(paths[2], b'count=true&by=status')
+        self.assertEqual(json.loads(body), expected.json())
+
+        status_code, body = self.async_get(paths[2], b'cursor=' + encode_cursor(['abc', 1]).encode())
+        self.assertEqual(status_code, 400)
+
+    def test_served_by_the_asgi_application(self):
+        # the web process runs BugTracker.asgi, which answers the hot reads itself and passes the rest to Django
+        path = '/api/user/project/%d/ticket/' % self.project.id
+        with mock.patch('BugTracker.asgi.read_api', wraps=read_api) as served:
+            status_code, body = self.async_get(path, application=asgi.application)
+        self.assertEqual(served.call_count, 1)
+        self.assertEqual((status_code, json.loads(body)), (200, self.client.get(path).json()))
+
+        with mock.patch('BugTracker.asgi.read_api', wraps=read_api) as served:
+            status_code, body = self.async_get('/api/user/%d/' % self.admin.id, application=asgi.application)
+        self.assertEqual((served.call_count, status_code), (0, 200))
@@ -1,21 +1,40 @@
 from django.urls import path, include
 from django.conf.urls import url
-from .api import SignUP, Login, UserProjects, UserProjectID, TicketView, ListTicketView, LogOut, UsersView, UserView
+from .api import SignUP, Login, UserProjects, UserProjectID, TicketView, ListTicketView, LogOut, UsersView, UserView, \
+    BulkTicketView, TicketSearchView, TicketChangesView, JobView, TicketIntakeView, SimilarTicketsView, \
+    ProjectStatsView, ProjectExportView, ProjectImportView, TicketHistoryView, ProjectActivityView, UserLookupView
 from rest_framework.authtoken.views import obtain_auth_token
-from .views import TicketForm
+from .views import TicketForm, metrics
 
 urlpatterns = [
     # path('', TicketForm),
     url(r'^reportError/(?P<ticket_form_key>\w+)/$', TicketForm, name='ticket_form'),
+    path('metrics', metrics, name='metrics'),
     path('api/user', UsersView.as_view(), name='all_users'),     # Just for testing purpose
+    path('api/user/lookup/', UserLookupView.as_view(), name='lookup_users'),
     url(r'^api/user/(?P<user_id>\d+)/$', UserView.as_view(), name='user_details'),   # Done
     path('api/signup', SignUP.as_view(), name='create_user'),   # Done
     path('api/login', Login.as_view(), name='login_user'),  # Done
     path('api/logout', LogOut.as_view(), name='logout_user'),   # Done
     path('api/auth', obtain_auth_token, name='obtain_token'),   # Done
+    url(r'^api/intake/(?P<ticket_form_key>\w+)/$', TicketIntakeView.as_view(), name='ticket_intake'),
+    url(r'^api/jobs/(?P<job_id>\d+)/$', JobView.as_view(), name='job_status'),
     path('api/user/project', UserProjects.as_view(), name='get_projects'),  # Done
+    path('api/user/project/import/', ProjectImportView.as_view(), name='import_project'),
     url(r'^api/user/project/(?P<project_id>\d+)/$', UserProjectID.as_view(), name='get_project_with_id'),   # Done
+    url(r'^api/user/project/(?P<project_id>\d+)/stats/$', ProjectStatsView.as_view(), name='project_stats'),
+    url(r'^api/user/project/(?P<project_id>\d+)/export/$', ProjectExportView.as_view(), name='export_project'),
+    url(r'^api/user/project/(?P<project_id>\d+)/activity/$', ProjectActivityView.as_view(), name='project_activity'),
     url(r'^api/user/project/(?P<project_id>\d+)/ticket/$', TicketView.as_view(), name='get_project_tickets'),   # Done
+    url(r'^api/user/project/(?P<project_id>\d+)/ticket/bulk/$', BulkTicketView.as_view(), name='bulk_project_tickets'),
+    url(r'^api/user/project/(?P<project_id>\d+)/ticket/search/$', TicketSearchView.as_view(),
+        name='search_project_tickets'),
+    url(r'^api/user/project/(?P<project_id>\d+)/ticket/changes/$', TicketChangesView.as_view(),
+        name='project_ticket_changes'),
     url(r'^api/user/project/(?P<project_id>\d+)/ticket/(?P<ticket_id>\d+)/$', ListTicketView.as_view(),
         name='get_project_ticket_with_id'),
+    url(r'^api/user/project/(?P<project_id>\d+)/ticket/(?P<ticket_id>\d+)/similar/$', SimilarTicketsView.as_view(),
+        name='similar_project_tickets'),
+    url(r'^api/user/project/(?P<project_id>\d+)/ticket/(?P<ticket_id>\d+)/history/$', TicketHistoryView.as_view(),
+        name='project_ticket_history'),
 ]
\ No newline at end of file
@@ -1,4 +1,8 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from .metrics import registry
 from .models import Projects
 
 # Create your views here.
@@ -11,3 +15,15 @@ def TicketForm(request, ticket_form_key):
         return render(request, 'error.html')
     return render(request, 'ticket_form.html', context={'ticket_form_key': ticket_form_key,
                                                         'project_id': project.id})
+
+
+# /metrics
+# request metrics of this process in the Prometheus text format, needs METRICS_TOKEN unless DEBUG is on
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
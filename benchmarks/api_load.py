@@ -0,0 +1,281 @@
+"""
+Drives every route of Users/urls.py through the Django test client against a seeded
+throwaway database and reports latency percentiles, throughput and SQL query counts
+per endpoint as JSON, so results can be diffed between releases.
+
+    python benchmarks/api_load.py --tickets 20000 --requests 200 --output api.json
+"""
+import argparse
+import time
+
+from common import benchmark_database, setup_django, summarize, write_report
+
+
+class Scenario:
+    """
+    One endpoint call. make(i) returns (client, method, path, data) for the i-th request,
+    prepare(i), if given, runs before each request and is not timed.
+    Request bodies are form encoded like the web client sends them, unless format='json'.
+    With status, any other response status stops the run: the scenario would time the wrong path.
+    """
+
+    def __init__(self, name, route, make, prepare=None, format='multipart', status=None):
+        self.name = name
+        self.route = route
+        self.make = make
+        self.prepare = prepare
+        self.format = format
+        self.status = status
+
+
+def build_scenarios(data):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from Users.archive import export_project
+    from Users.models import Projects, ProjectUserRelation, TicketChange, Tickets
+    from Users.intake import ip_limiter, key_limiter
+    from Users.jobs import enqueue
+    from django.utils import timezone
+    from Users.seeding import SEED_PASSWORD
+    from Users.sync import changes_cursor
+
+    def client_for(user_id):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user_id=user_id).key)
+        return client
+
+    project_id = data['projects'][0]
+    admin_id = data['admins'][project_id]
+    developer_id = data['developers'][project_id][0]
+    admin = client_for(admin_id)
+    developer = client_for(developer_id)
+    anonymous = APIClient()
+    scraper = APIClient()
+    scraper.credentials(HTTP_AUTHORIZATION='Bearer ' + settings.METRICS_TOKEN)
+
+    superuser = User.objects.get(id=data['users'][-1])
+    superuser.is_superuser = True
+    superuser.save()
+    root = client_for(superuser.id)
+
+    project = Projects.objects.get(id=project_id)
+    ticket_ids = list(Tickets.objects.filter(project=project_id).order_by('id').values_list('id', flat=True)[:1000])
+    developer_ticket = Tickets.objects.filter(project=project_id, users=developer_id).values_list('id', flat=True)[0]
+    admin_email = User.objects.get(id=admin_id).email
+    tickets_url = '/api/user/project/%d/ticket/' % project_id
+    intake_url = '/api/intake/%s/' % project.ticket_form_key
+
+    # throwaway rows for the endpoints that delete things
+    deletable = {}
+
+    def new_ticket(i):
+        deletable['ticket'] = Tickets.objects.create(title='to delete', project=project).id
+
+    def new_project(i):
+        throwaway = Projects.objects.create(name='to delete', description='')
+        ProjectUserRelation.objects.create(user_id_id=admin_id, project_id=throwaway, user_role='Admin')
+        deletable['project'] = throwaway.id
+
+    def new_session(i):
+        user = User.objects.create_user('logout%d' % i, 'logout%d@example.com' % i, SEED_PASSWORD)
+        deletable['session'] = client_for_new(user)
+
+    def client_for_new(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        return client
+
+    # a sync cursor followed by 100 ticket changes (seeded rows are bulk inserted, without a change log
+    # or audit log)
+    sync_cursor = changes_cursor(TicketChange.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+                                 timezone.now())
+    for changed in Tickets.objects.filter(id__in=ticket_ids[:100]):
+        changed.save()
+
+    # the intake is timed without its rate limits, every request comes from the same client
+    key_limiter.burst = ip_limiter.burst = 10 ** 9
+
+    # the import scenario re-imports the archive of the last (smallest) project
+    archive = b''.join(export_project(data['projects'][-1]))
+
+    status_job = enqueue('index_tickets', ticket_ids[:10], user_id=admin_id)
+
+    ticket = {'title': 'benchmark', 'description': 'created by the benchmark', 'priority': 'High',
+              'status': 'Open', 'type': 'Bug/Error'}
+
+    return [
+        Scenario('ticket_form', 'ticket_form',
+                 lambda i: (anonymous, 'get', '/reportError/%s/' % project.ticket_form_key, None)),
+        Scenario('metrics', 'metrics', lambda i: (scraper, 'get', '/metrics', None), status=200),
+        Scenario('list_users', 'all_users', lambda i: (root, 'get', '/api/user', None)),
+        Scenario('list_users_page', 'all_users', lambda i: (root, 'get', '/api/user', {'page_size': 100})),
+        Scenario('lookup_users', 'lookup_users', lambda i: (admin, 'get', '/api/user/lookup/', {
+            'ids': ','.join(str(user_id) for user_id in data['users'][:50])})),
+        Scenario('user_details', 'user_details',
+                 lambda i: (admin, 'get', '/api/user/%d/' % data['users'][i % len(data['users'])], None)),
+        Scenario('signup', 'create_user', lambda i: (anonymous, 'post', '/api/signup', {
+            'email': 'signup%d@example.com' % i, 'password': 'password', 'first_name': 'a', 'last_name': 'b'})),
+        Scenario('login', 'login_user',
+                 lambda i: (anonymous, 'post', '/api/login', {'email': admin_email, 'password': SEED_PASSWORD})),
+        Scenario('logout', 'logout_user', lambda i: (deletable['session'], 'get', '/api/logout', None),
+                 prepare=new_session),
+        Scenario('obtain_token', 'obtain_token', lambda i: (anonymous, 'post', '/api/auth', {
+            'username': User.objects.get(id=admin_id).username, 'password': SEED_PASSWORD})),
+        Scenario('list_projects', 'get_projects', lambda i: (admin, 'get', '/api/user/project', None)),
+        Scenario('create_project', 'get_projects',
+                 lambda i: (admin, 'post', '/api/user/project', {'name': 'project %d' % i, 'description': 'x'})),
+        Scenario('get_project', 'get_project_with_id',
+                 lambda i: (admin, 'get', '/api/user/project/%d/' % project_id, None)),
+        Scenario('update_project', 'get_project_with_id',
+                 lambda i: (admin, 'put', '/api/user/project/%d/' % project_id, {'description': 'v%d' % i})),
+        Scenario('delete_project', 'get_project_with_id',
+                 lambda i: (admin, 'delete', '/api/user/project/%d/' % deletable['project'], None),
+                 prepare=new_project),
+        Scenario('project_stats', 'project_stats',
+                 lambda i: (admin, 'get', '/api/user/project/%d/stats/' % project_id, None)),
+        Scenario('developer_project_stats', 'project_stats',
+                 lambda i: (developer, 'get', '/api/user/project/%d/stats/' % project_id, None)),
+        Scenario('export_project', 'export_project',
+                 lambda i: (admin, 'get', '/api/user/project/%d/export/' % project_id, None)),
+        Scenario('import_project', 'import_project', lambda i: (admin, 'post', '/api/user/project/import/', {
+            'archive': SimpleUploadedFile('project.ndjson.gz', archive)})),
+        Scenario('admin_ticket_list', 'get_project_tickets', lambda i: (admin, 'get', tickets_url, None)),
+        Scenario('admin_ticket_page', 'get_project_tickets',
+                 lambda i: (admin, 'get', tickets_url, {'page_size': 100})),
+        Scenario('admin_ticket_page_assignees', 'get_project_tickets',
+                 lambda i: (admin, 'get', tickets_url, {'page_size': 100, 'include': 'assignees'})),
+        Scenario('filtered_ticket_page', 'get_project_tickets',
+                 lambda i: (admin, 'get', tickets_url, {'status': 'Open', 'priority': 'High,Medium',
+                                                        'ordering': '-created', 'page_size': 100})),
+        Scenario('sorted_ticket_page', 'get_project_tickets',
+                 lambda i: (admin, 'get', tickets_url, {'ordering': '-priority,-created', 'page_size': 100})),
+        Scenario('developer_ticket_list', 'get_project_tickets', lambda i: (developer, 'get', tickets_url, None)),
+        Scenario('ticket_counts', 'get_project_tickets',
+                 lambda i: (admin, 'get', tickets_url, {'count': 'true', 'by': 'priority,status'})),
+        Scenario('developer_ticket_counts', 'get_project_tickets',
+                 lambda i: (developer, 'get', tickets_url, {'count': 'true', 'by': 'priority,status'})),
+        Scenario('create_ticket', 'get_project_tickets', lambda i: (admin, 'post', tickets_url, ticket)),
+        Scenario('public_ticket', 'get_project_tickets',
+                 lambda i: (anonymous, 'post', tickets_url, {'title': 'public %d' % i, 'description': 'x'})),
+        Scenario('intake_report', 'ticket_intake',
+                 lambda i: (anonymous, 'post', intake_url, {'title': 'intake %d' % i, 'description': 'x'})),
+        Scenario('intake_duplicate', 'ticket_intake',
+                 lambda i: (anonymous, 'post', intake_url, {'title': 'same error', 'description': 'x'})),
+        Scenario('bulk_create_100', 'bulk_project_tickets',
+                 lambda i: (admin, 'post', tickets_url + 'bulk/', {'create': [ticket] * 100}), format='json'),
+        Scenario('job_status', 'job_status', lambda i: (admin, 'get', '/api/jobs/%d/' % status_job.id, None)),
+        Scenario('search', 'search_project_tickets',
+                 lambda i: (admin, 'get', tickets_url + 'search/', {'q': 'login crash'})),
+        Scenario('similar_tickets', 'similar_project_tickets',
+                 lambda i: (admin, 'get', tickets_url + '%d/similar/' % ticket_ids[i % len(ticket_ids)], None)),
+        Scenario('ticket_changes', 'project_ticket_changes',
+                 lambda i: (admin, 'get', tickets_url + 'changes/', {'cursor': sync_cursor})),
+        Scenario('ticket_changes_snapshot', 'project_ticket_changes',
+                 lambda i: (admin, 'get', tickets_url + 'changes/', None)),
+        Scenario('ticket_history', 'project_ticket_history',
+                 lambda i: (admin, 'get', tickets_url + '%d/history/' % ticket_ids[i % 100], None)),
+        Scenario('project_activity', 'project_activity',
+                 lambda i: (admin, 'get', '/api/user/project/%d/activity/' % project_id, {'page_size': 100})),
+        Scenario('admin_get_ticket', 'get_project_ticket_with_id',
+                 lambda i: (admin, 'get', tickets_url + '%d/' % ticket_ids[i % len(ticket_ids)], None)),
+        Scenario('developer_get_ticket', 'get_project_ticket_with_id',
+                 lambda i: (developer, 'get', tickets_url + '%d/' % developer_ticket, None)),
+        Scenario('update_ticket', 'get_project_ticket_with_id',
+                 lambda i: (admin, 'put', tickets_url + '%d/' % ticket_ids[i % len(ticket_ids)], ticket)),
+        Scenario('delete_ticket', 'get_project_ticket_with_id',
+                 lambda i: (admin, 'delete', tickets_url + '%d/' % deletable['ticket'], None),
+                 prepare=new_ticket),
+    ]
+
+
+def run_scenario(scenario, requests, warmup):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings, queries, statuses, sizes = [], [], {}, []
+    elapsed = 0.0
+    for i in range(warmup + requests):
+        if scenario.prepare:
+            scenario.prepare(i)
+        client, method, path, data = scenario.make(i)
+        kwargs = {'format': scenario.format} if method != 'get' else {}
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, **kwargs)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            took = time.perf_counter() - start
+        if scenario.status is not None and response.status_code != scenario.status:
+            raise AssertionError('%s answered %d instead of %d' % (scenario.name, response.status_code,
+                                                                  scenario.status))
+        if i < warmup:
+            continue
+        elapsed += took
+        timings.append(took * 1000)
+        queries.append(len(captured.captured_queries))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        sizes.append(len(content))
+
+    result = summarize(timings)
+    result.update({
+        'route': scenario.route,
+        'requests': requests,
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else None,
+        'queries_median': sorted(queries)[len(queries) // 2],
+        'queries_max': max(queries),
+        'response_bytes_median': sorted(sizes)[len(sizes) // 2],
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--tickets', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=100, help='timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', nargs='*', help='run only these scenarios')
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from Users.intake import intake_buffer
+    from Users.seeding import seed_data
+    from Users.urls import urlpatterns
+
+    setup_test_environment()
+    settings.DEBUG = False
+    # /metrics is timed like a scraper calls it, with its token
+    settings.METRICS_TOKEN = 'benchmark'
+
+    with benchmark_database():
+        data = seed_data(args.users, args.projects, args.members, args.tickets, args.seed)
+        scenarios = build_scenarios(data)
+        if args.only:
+            scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+        results = {scenario.name: run_scenario(scenario, args.requests, args.warmup) for scenario in scenarios}
+        # buffered intake reports are written before the database goes away
+        intake_buffer.flush()
+
+    routes = {pattern.name for pattern in urlpatterns if pattern.name}
+    report = {
+        'dataset': {'users': args.users, 'projects': args.projects, 'members': args.members,
+                    'tickets': args.tickets, 'seed': args.seed},
+        'vendor': connection.vendor,
+        'endpoints': results,
+        'uncovered_routes': sorted(routes - {result['route'] for result in results.values()}),
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Compares the read endpoints served by the sync WSGI application (--threads worker threads,
+like gunicorn --threads) with BugTracker/asgi.py (one event loop, Users/async_api.py) under
+concurrent clients, against a seeded throwaway database.
+
+--db-latency-ms adds a delay to every SQL query to stand in for a database over the network.
+
+    python benchmarks/async_reads.py --clients 1 8 32 --db-latency-ms 2 --output async.json
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from common import benchmark_database, setup_django, summarize, write_report
+
+
+def build_requests(data):
+    from rest_framework.authtoken.models import Token
+    from Users.models import Tickets
+
+    project_id = data['projects'][0]
+    admin_id = data['admins'][project_id]
+    ticket_ids = list(Tickets.objects.filter(project=project_id).order_by('id').values_list('id', flat=True)[:100])
+    token = Token.objects.get(user_id=admin_id).key
+    tickets_url = '/api/user/project/%d/ticket/' % project_id
+
+    requests = {
+        'list_projects': lambda i: ('/api/user/project', {}),
+        'get_project': lambda i: ('/api/user/project/%d/' % project_id, {}),
+        'ticket_page': lambda i: (tickets_url, {'page_size': 100}),
+        'ticket_counts': lambda i: (tickets_url, {'count': 'true', 'by': 'priority,status'}),
+        'get_ticket': lambda i: (tickets_url + '%d/' % ticket_ids[i % len(ticket_ids)], {}),
+    }
+    return token, requests
+
+
+def run_wsgi(make, token, clients, count, threads):
+    from django.test import Client
+
+    local = threading.local()
+
+    def request(i):
+        # one client per worker thread
+        if not hasattr(local, 'client'):
+            local.client = Client(HTTP_AUTHORIZATION='Token ' + token)
+        path, params = make(i)
+        start = time.perf_counter()
+        response = local.client.get(path, params)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    # clients beyond the worker threads wait in the queue, like requests queued by gunicorn
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(clients, threads)) as pool:
+        results = list(pool.map(request, range(count)))
+    return results, time.perf_counter() - start
+
+
+def run_asgi(make, token, clients, count):
+    from BugTracker.asgi import application
+
+    async def request(i):
+        path, params = make(i)
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+                 'query_string': urlencode(params).encode(), 'server': ('testserver', 80),
+                 'client': ('127.0.0.1', 0),
+                 'headers': [(b'host', b'testserver'), (b'authorization', ('Token ' + token).encode())]}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        start = time.perf_counter()
+        await application(scope, receive, send)
+        return (time.perf_counter() - start) * 1000, messages[0]['status']
+
+    async def main():
+        # <clients> concurrent clients, each sending its share of the requests one after another
+        async def client(offset):
+            return [await request(i) for i in range(offset, count, clients)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*[client(offset) for offset in range(clients)])
+        return [result for chunk in results for result in chunk], time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def report(results, elapsed):
+    statuses = {}
+    for took, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    result = summarize([took for took, status in results])
+    result.update({'throughput_rps': round(len(results) / elapsed, 1), 'status_codes': statuses})
+    return result
+
+
+def add_latency(delay):
+    # every connection, including the ones opened later by worker threads, sleeps before each query
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    def slow(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(slow)
+    connection_created.connect(install, weak=False)
+    connection.execute_wrappers.append(slow)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--tickets', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32], help='concurrent clients')
+    parser.add_argument('--threads', type=int, default=4, help='worker threads of the WSGI server')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and concurrency level')
+    parser.add_argument('--db-latency-ms', type=float, default=0)
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+    from Users.seeding import seed_data
+
+    setup_test_environment()
+    settings.DEBUG = False
+
+    results = {}
+    with benchmark_database():
+        data = seed_data(args.users, args.projects, args.members, args.tickets, args.seed)
+        token, requests = build_requests(data)
+        if args.db_latency_ms:
+            add_latency(args.db_latency_ms / 1000.0)
+        for name, make in requests.items():
+            results[name] = {}
+            for clients in args.clients:
+                # warm up the caches of both paths first
+                run_wsgi(make, token, clients, clients, args.threads)
+                run_asgi(make, token, clients, clients)
+                results[name][clients] = {
+                    'wsgi': report(*run_wsgi(make, token, clients, args.requests, args.threads)),
+                    'asgi': report(*run_asgi(make, token, clients, args.requests)),
+                }
+
+    write_report({
+        'dataset': {'users': args.users, 'projects': args.projects, 'members': args.members,
+                    'tickets': args.tickets, 'seed': args.seed},
+        'db_latency_ms': args.db_latency_ms,
+        'wsgi_threads': args.threads,
+        'endpoints': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Storage and query timings of the ticket priority/status/type columns stored as strings
+(migration 0027) and as small integer codes (migration 0028, see Users/fields.py), on the same
+seeded tickets. The queries are the SQL of the ticket list endpoints, run as raw SQL so both
+schemas run the same statements; ordering strings by rank needs a CASE expression.
+
+    python benchmarks/ticket_enums.py --tickets 200000 --output enums.json
+"""
+import argparse
+
+from common import benchmark_database, measure, setup_django, write_report
+
+# stored value of the choices in each schema
+STRINGS = {'Open': 'Open', 'High': 'High', 'Medium': 'Medium'}
+CODES = {'Open': 1, 'High': 3, 'Medium': 2}
+PRIORITY_RANK = {
+    'strings': "CASE priority WHEN 'Low' THEN 1 WHEN 'Medium' THEN 2 WHEN 'High' THEN 3 ELSE 0 END",
+    'codes': 'priority',
+}
+
+
+def queries(schema, project_id):
+    values = STRINGS if schema == 'strings' else CODES
+    rank = PRIORITY_RANK[schema]
+    return {
+        'open_high_count': (
+            'SELECT COUNT(*) FROM "Users_tickets" WHERE project_id = %s AND status = %s AND priority = %s',
+            [project_id, values['Open'], values['High']]),
+        'count_by_status_priority': (
+            'SELECT status, priority, COUNT(*) FROM "Users_tickets" WHERE project_id = %s '
+            'GROUP BY status, priority',
+            [project_id]),
+        'filtered_page': (
+            'SELECT id FROM "Users_tickets" WHERE project_id = %s AND status = %s AND priority IN (%s, %s) '
+            'ORDER BY "CreatedDate" DESC, id DESC LIMIT 100',
+            [project_id, values['Open'], values['High'], values['Medium']]),
+        'priority_page': (
+            'SELECT id FROM "Users_tickets" WHERE project_id = %s '
+            'ORDER BY ' + rank + ' DESC, "CreatedDate" DESC, id DESC LIMIT 100',
+            [project_id]),
+    }
+
+
+def storage(table):
+    # bytes of the table and of its indexes
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [table])
+            indexes = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')
+            sizes = dict(cursor.fetchall())
+            return {'table_bytes': sizes.get(table, 0), 'index_bytes': sum(sizes.get(name, 0) for name in indexes)}
+        cursor.execute('SELECT pg_relation_size(%s), pg_indexes_size(%s)', ['"%s"' % table, '"%s"' % table])
+        table_bytes, index_bytes = cursor.fetchone()
+        return {'table_bytes': table_bytes, 'index_bytes': index_bytes}
+
+
+def run(schema, project_id, repeat):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    def execute(sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            cursor.fetchall()
+
+    return {
+        'storage': {table: storage(table) for table in ('Users_tickets', 'Users_ticketrollup')},
+        'queries': {name: measure(lambda: execute(sql, params), repeat)
+                    for name, (sql, params) in queries(schema, project_id).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--tickets', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+    from Users.seeding import seed_data
+
+    with benchmark_database():
+        data = seed_data(args.users, args.projects, args.members, args.tickets, args.seed)
+        # the first project is the biggest one
+        project_id = data['projects'][0]
+
+        # both schemas are measured right after their migration rewrote the table
+        call_command('migrate', 'Users', '0027', verbosity=0)
+        strings = run('strings', project_id, args.repeat)
+        call_command('migrate', 'Users', '0028', verbosity=0)
+        codes = run('codes', project_id, args.repeat)
+
+    report = {
+        'dataset': {'projects': args.projects, 'users': args.users, 'members': args.members,
+                    'tickets': args.tickets, 'seed': args.seed},
+        'vendor': connection.vendor,
+        'storage': {
+            table: {
+                'strings': strings['storage'][table],
+                'codes': codes['storage'][table],
+                'saved_bytes': sum(strings['storage'][table].values()) - sum(codes['storage'][table].values()),
+            } for table in strings['storage']
+        },
+        'queries': {
+            name: {
+                'strings': strings['queries'][name],
+                'codes': codes['queries'][name],
+                'speedup': round(strings['queries'][name]['median_ms'] / max(codes['queries'][name]['median_ms'],
+                                                                             0.001), 2),
+            } for name in strings['queries']
+        },
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
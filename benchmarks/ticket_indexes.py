@@ -0,0 +1,104 @@
+"""
+Query plans and timings of the ticket queries used by the API, with and without
+the composite indexes declared on Tickets and ProjectUserRelation.
+
+    python benchmarks/ticket_indexes.py --tickets 200000 --output indexes.json
+"""
+import argparse
+
+from common import benchmark_database, measure, setup_django, write_report
+
+
+def queries(project_id, developer_id):
+    from django.db.models import Count
+    from Users.models import ProjectUserRelation, Tickets
+
+    tickets = Tickets.objects.filter(project=project_id)
+    return {
+        'admin_page': lambda: list(tickets.order_by('CreatedDate', 'id')[:100]),
+        'developer_list': lambda: list(tickets.filter(users=developer_id)),
+        'developer_count': lambda: tickets.filter(users=developer_id).count(),
+        'count_by_status_priority': lambda: list(
+            tickets.order_by().values('status', 'priority').annotate(count=Count('id'))),
+        'open_high_priority': lambda: tickets.filter(status='Open', priority='High').count(),
+        'admin_memberships': lambda: list(
+            ProjectUserRelation.objects.filter(user_id=developer_id, user_role='Admin').values_list('project_id')),
+    }
+
+
+def explain(function):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as captured:
+        function()
+    sql = captured.captured_queries[-1]['sql']
+    with connection.cursor() as cursor:
+        cursor.execute(('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN ') + sql)
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+def run(project_id, developer_id, repeat):
+    return {
+        name: dict(measure(function, repeat), plan=explain(function))
+        for name, function in queries(project_id, developer_id).items()
+    }
+
+
+def composite_indexes():
+    from Users.models import ProjectUserRelation, Tickets
+    return [(model, index) for model in (Tickets, ProjectUserRelation) for index in model._meta.indexes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--tickets', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from Users.seeding import seed_data
+
+    with benchmark_database():
+        data = seed_data(args.users, args.projects, args.members, args.tickets, args.seed)
+        # the first project is the biggest one
+        project_id = data['projects'][0]
+        developer_id = data['developers'][project_id][0]
+
+        with connection.schema_editor() as editor:
+            for model, index in composite_indexes():
+                editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        before = run(project_id, developer_id, args.repeat)
+
+        with connection.schema_editor() as editor:
+            for model, index in composite_indexes():
+                editor.add_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        after = run(project_id, developer_id, args.repeat)
+
+    report = {
+        'dataset': {'projects': args.projects, 'users': args.users, 'members': args.members,
+                    'tickets': args.tickets, 'seed': args.seed},
+        'vendor': connection.vendor,
+        'queries': {
+            name: {
+                'without_indexes': before[name],
+                'with_indexes': after[name],
+                'speedup': round(before[name]['median_ms'] / max(after[name]['median_ms'], 0.001), 2),
+            } for name in before
+        },
+    }
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
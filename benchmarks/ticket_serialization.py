@@ -0,0 +1,50 @@
+"""
+Times rendering a ticket list as JSON with TicketSerializer + DRF's JSONRenderer against the
+values() fast path of Users/serializers.py, at several list sizes, on a throwaway database.
+
+    python benchmarks/ticket_serialization.py --sizes 1000 10000 100000 --output serialization.json
+"""
+import argparse
+
+from common import benchmark_database, measure, setup_django, write_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from Users import serializers
+    from Users.models import Tickets
+    from Users.seeding import seed_data
+    from Users.serializers import TicketSerializer, render_json, serialize_ticket_values, ticket_values
+
+    results = {}
+    with benchmark_database():
+        # a single project holding all the tickets
+        data = seed_data(users=20, projects=1, members=10, tickets=max(args.sizes), seed=args.seed)
+        project_id = data['projects'][0]
+        for size in sorted(args.sizes):
+            tickets = Tickets.objects.filter(project=project_id).order_by('id')[:size]
+
+            def serializer():
+                return JSONRenderer().render(TicketSerializer(tickets.all(), many=True).data)
+
+            def fast_path():
+                return render_json(serialize_ticket_values(ticket_values(tickets.all())))
+
+            assert serializer() == fast_path()
+            result = {'serializer': measure(serializer, args.repeat), 'fast_path': measure(fast_path, args.repeat)}
+            result['speedup'] = round(result['serializer']['median_ms'] / result['fast_path']['median_ms'], 2)
+            results[size] = result
+
+    write_report({'orjson': serializers.orjson is not None, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()